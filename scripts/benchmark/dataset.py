@@ -0,0 +1,43 @@
+"""Synthetic downloads directories for benchmarks
+
+Files are sparse where the filesystem allows it, so a 100k-file library
+with realistic sizes costs little actual disk.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import List
+import os
+import random
+
+EXTENSIONS = [".mp4", ".mp4", ".mp4", ".webm", ".mkv", ".m4v"]
+# A few real (non-sparse) files of this size serve the streaming scenario
+STREAM_FILE_BYTES = 32 * 1024 * 1024
+
+
+def _size(rnd: random.Random) -> int:
+    # Log-uniform between 1 MiB and 4 GiB, like a mix of clips and films
+    return int(2 ** rnd.uniform(20, 32))
+
+
+def make_library(directory: Path, count: int, seed: int = 1234, stream_files: int = 4) -> List[str]:
+    """Populate ``directory`` with ``count`` video files; returns the streamable ones"""
+    directory.mkdir(parents=True, exist_ok=True)
+    rnd = random.Random(seed)
+    for i in range(count):
+        ext = rnd.choice(EXTENSIONS)
+        path = directory / f"Synthetic video {i:06d} [{i:011x}] [18]{ext}"
+        with open(path, "wb") as f:
+            f.truncate(_size(rnd))
+        # Spread mtimes so sorting by date has work to do
+        mtime = 1_600_000_000 + rnd.randint(0, 100_000_000)
+        os.utime(path, (mtime, mtime))
+
+    streamable = []
+    block = os.urandom(1024 * 1024)
+    for i in range(stream_files):
+        name = f"Stream sample {i}.mp4"
+        with open(directory / name, "wb") as f:
+            for _ in range(STREAM_FILE_BYTES // len(block)):
+                f.write(block)
+        streamable.append(name)
+    return streamable
@@ -0,0 +1,183 @@
+"""Offline stand-in for yt_dlp.YoutubeDL used by the benchmark harness
+
+Implements the slice of the YoutubeDL API playYT relies on (extract_info,
+process_ie_result, hooks, context manager) with deterministic, synthetic
+payloads and configurable latency, so benchmarks never touch the network.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional
+import hashlib
+import os
+import random
+import re
+import time
+
+# Seconds of simulated upstream latency per call, plus up to ``jitter`` extra
+CONFIG: Dict[str, Any] = {
+    "search_latency": 0.8,
+    "extract_latency": 1.5,
+    "jitter": 0.2,
+    "formats": 24,
+    "description_bytes": 2000,
+    "download_bytes": 2 * 1024 * 1024,
+    "seed": 1234,
+}
+
+_OUTTMPL_RE = re.compile(r"%\((\w+)\)(?:\.\d+B)?s")
+
+
+def configure(**kwargs: Any) -> None:
+    unknown = set(kwargs) - set(CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown fake yt-dlp settings: {sorted(unknown)}")
+    CONFIG.update(kwargs)
+
+
+def install(**kwargs: Any) -> None:
+    """Make playyt.services.youtube use FakeYoutubeDL instead of importing yt-dlp"""
+    from playyt.services import youtube
+
+    configure(**kwargs)
+    youtube.YoutubeDL = FakeYoutubeDL
+
+
+def _sleep(base: float, key: str) -> None:
+    if base <= 0:
+        return
+    # Jitter is derived from the key so repeated runs see the same delays
+    rnd = random.Random(f"{CONFIG['seed']}:{key}")
+    time.sleep(base + rnd.random() * CONFIG["jitter"])
+
+
+def _video_id(n: int) -> str:
+    return hashlib.sha1(f"{CONFIG['seed']}:{n}".encode()).hexdigest()[:11]
+
+
+def _formats(video_id: str) -> List[Dict[str, Any]]:
+    formats = []
+    heights = [144, 240, 360, 480, 720, 1080, 1440, 2160]
+    for i in range(CONFIG["formats"]):
+        height = heights[i % len(heights)]
+        audio_only = i % 4 == 3
+        formats.append({
+            "format_id": str(100 + i),
+            "ext": "m4a" if audio_only else ("mp4" if i % 2 else "webm"),
+            "format_note": "audio" if audio_only else f"{height}p",
+            "vcodec": "none" if audio_only else ("avc1.640028" if i % 2 else "vp9"),
+            "acodec": "mp4a.40.2" if audio_only or i % 3 == 0 else "none",
+            "width": None if audio_only else height * 16 // 9,
+            "height": None if audio_only else height,
+            "resolution": "audio only" if audio_only else f"{height * 16 // 9}x{height}",
+            "fps": None if audio_only else 30,
+            "tbr": 128.0 if audio_only else height * 2.5,
+            "filesize": (height if not audio_only else 40) * 50_000,
+            "url": f"https://fake.invalid/{video_id}/{100 + i}",
+        })
+    return formats
+
+
+def _video_info(video_id: str) -> Dict[str, Any]:
+    rnd = random.Random(f"{CONFIG['seed']}:{video_id}")
+    words = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet"]
+    title = " ".join(rnd.choice(words) for _ in range(5)).title()
+    return {
+        "id": video_id,
+        "title": f"{title} {video_id[:4]}",
+        "uploader": f"Channel {rnd.randint(1, 500)}",
+        "channel_id": f"UC{video_id}",
+        "duration": rnd.randint(30, 7200),
+        "description": ("lorem ipsum " * (CONFIG["description_bytes"] // 12 + 1))[:CONFIG["description_bytes"]],
+        "upload_date": "20240101",
+        "webpage_url": f"https://www.youtube.com/watch?v={video_id}",
+        "thumbnail": f"https://fake.invalid/vi/{video_id}/hqdefault.jpg",
+        "extractor": "youtube",
+        "extractor_key": "Youtube",
+        "formats": _formats(video_id),
+    }
+
+
+class FakeYoutubeDL:
+    def __init__(self, params: Optional[Dict[str, Any]] = None):
+        self.params = params or {}
+        self.closed = False
+
+    def __enter__(self) -> "FakeYoutubeDL":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.closed = True
+
+    def extract_info(self, url: str, download: bool = False, process: bool = True, **kwargs: Any) -> Dict[str, Any]:
+        if url.startswith("ytsearch"):
+            _sleep(CONFIG["search_latency"], url)
+            return self._search(url)
+        _sleep(CONFIG["extract_latency"], url)
+        video_id = url.rsplit("=", 1)[-1].rsplit("/", 1)[-1]
+        return _video_info(video_id)
+
+    def _search(self, url: str) -> Dict[str, Any]:
+        count_part, query = url[len("ytsearch"):].split(":", 1)
+        count = int(count_part or 1)
+        start = int(self.params.get("playliststart") or 1)
+        end = int(self.params.get("playlistend") or count)
+        flat = bool(self.params.get("extract_flat"))
+        base = int(hashlib.sha1(query.encode()).hexdigest()[:6], 16)
+        entries = []
+        for n in range(start - 1, min(end, count)):
+            info = _video_info(_video_id(base + n))
+            if flat:
+                info = {
+                    "_type": "url",
+                    "ie_key": "Youtube",
+                    "id": info["id"],
+                    "title": info["title"],
+                    "url": info["webpage_url"],
+                    "channel": info["uploader"],
+                    "duration": info["duration"],
+                }
+            entries.append(info)
+        return {"_type": "playlist", "id": query, "title": query, "entries": entries}
+
+    def _hooks(self, name: str) -> List[Callable[[Dict[str, Any]], None]]:
+        return list(self.params.get(name) or [])
+
+    def process_ie_result(self, info: Dict[str, Any], download: bool = True, **kwargs: Any) -> Dict[str, Any]:
+        fmt = next((f for f in reversed(info.get("formats") or []) if f["vcodec"] != "none"), {"format_id": "0", "ext": "mp4"})
+        result = dict(info, format_id=fmt["format_id"], ext=fmt["ext"], resolution=fmt.get("resolution"))
+        outtmpl = self.params.get("outtmpl") or "%(title)s.%(ext)s"
+        if isinstance(outtmpl, dict):
+            outtmpl = outtmpl.get("default")
+        path = _OUTTMPL_RE.sub(lambda m: str(result.get(m.group(1), "NA")), outtmpl)
+        if download:
+            self._download(path, result)
+        result["requested_downloads"] = [{"filepath": path}]
+        return result
+
+    def _download(self, path: str, info: Dict[str, Any]) -> None:
+        total = int(CONFIG["download_bytes"])
+        hooks = self._hooks("progress_hooks")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        chunk = b"\0" * 65536
+        written = 0
+        started = time.monotonic()
+        with open(path + ".part", "wb") as f:
+            while written < total:
+                n = min(len(chunk), total - written)
+                f.write(chunk[:n])
+                written += n
+                elapsed = max(time.monotonic() - started, 1e-6)
+                for hook in hooks:
+                    hook({
+                        "status": "downloading",
+                        "downloaded_bytes": written,
+                        "total_bytes": total,
+                        "speed": written / elapsed,
+                        "eta": 0,
+                        "info_dict": info,
+                    })
+        os.replace(path + ".part", path)
+        for hook in hooks:
+            hook({"status": "finished", "total_bytes": total, "filename": path, "info_dict": info})
@@ -0,0 +1,267 @@
+"""Load benchmark for the playYT web app against an offline yt-dlp stand-in
+
+Builds a synthetic downloads directory, serves the app with uvicorn on a
+local port and drives concurrent requests at each scenario. Results are
+written as JSON; pass ``--compare`` with an earlier file to flag
+regressions (exit status 1).
+
+    python scripts/benchmark/run.py --files 10000 --concurrency 32 --output bench.json
+    python scripts/benchmark/run.py --compare bench.json
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = Path(__file__).resolve().parent
+REPO = HERE.parents[1]
+sys.path.insert(0, str(REPO / "src"))
+sys.path.insert(0, str(HERE))
+
+import httpx  # noqa: E402
+
+import dataset  # noqa: E402
+import fake_ytdlp  # noqa: E402
+
+SCENARIOS = ("search", "video", "downloads", "stream")
+STREAM_RANGE_BYTES = 1024 * 1024
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float, nbytes: int) -> Dict[str, Any]:
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000.0, 3)  # noqa: E731
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "elapsed": round(elapsed, 3),
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "throughput_mib_s": round(nbytes / elapsed / 1048576, 2) if elapsed and nbytes else None,
+        "p50_ms": ms(percentile(values, 50)),
+        "p90_ms": ms(percentile(values, 90)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]) if values else 0.0,
+        "mean_ms": ms(sum(values) / len(values)) if values else 0.0,
+    }
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    make_request: Callable[[random.Random], Dict[str, Any]],
+    total: int,
+    concurrency: int,
+    seed: int,
+) -> Dict[str, Any]:
+    """Send ``total`` requests from ``concurrency`` workers and time each one"""
+    latencies: List[float] = []
+    errors = 0
+    nbytes = 0
+    remaining = total
+
+    async def worker(n: int) -> None:
+        nonlocal remaining, errors, nbytes
+        rnd = random.Random(seed * 1000 + n)
+        while remaining > 0:
+            remaining -= 1
+            spec = make_request(rnd)
+            started = time.perf_counter()
+            try:
+                response = await client.request(spec.get("method", "GET"), spec["url"], headers=spec.get("headers"))
+                body = response.content
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                errors += 1
+                continue
+            latencies.append(elapsed)
+            nbytes += len(body)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started, nbytes)
+
+
+def request_factories(args: argparse.Namespace, streamable: List[str]) -> Dict[str, Callable]:
+    queries = [f"benchmark query {i}" for i in range(args.queries)]
+    video_ids = [fake_ytdlp._video_id(i) for i in range(args.videos)]
+    return {
+        "search": lambda rnd: {"url": f"/api/search?q={rnd.choice(queries).replace(' ', '+')}&limit=12"},
+        "video": lambda rnd: {"url": f"/video/{rnd.choice(video_ids)}"},
+        "downloads": lambda rnd: {
+            "url": "/downloads" if rnd.random() < 0.5 else f"/api/downloads?sort={rnd.choice(['mtime', 'size', 'title'])}&limit=50"
+        },
+        "stream": lambda rnd: _range_request(rnd, streamable),
+    }
+
+
+def _range_request(rnd: random.Random, streamable: List[str]) -> Dict[str, Any]:
+    start = rnd.randrange(0, dataset.STREAM_FILE_BYTES - STREAM_RANGE_BYTES)
+    return {
+        "url": f"/api/stream/{httpx.URL(rnd.choice(streamable)).raw_path.decode()}",
+        "headers": {"Range": f"bytes={start}-{start + STREAM_RANGE_BYTES - 1}"},
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int) -> Any:
+    import uvicorn
+    from playyt.webapp.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, name="bench-server", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if time.monotonic() > deadline or not thread.is_alive():
+            raise RuntimeError("uvicorn did not start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_scenarios(args: argparse.Namespace, base_url: str, streamable: List[str]) -> Dict[str, Any]:
+    factories = request_factories(args, streamable)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results: Dict[str, Any] = {}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        # First library request builds the index from scratch; report it on its own
+        started = time.perf_counter()
+        await client.get("/downloads")
+        results["downloads_cold"] = {"elapsed_ms": round((time.perf_counter() - started) * 1000.0, 3)}
+        for name in args.scenarios:
+            if args.warmup:
+                await drive(client, factories[name], args.warmup, min(args.concurrency, args.warmup), args.seed + 1)
+            results[name] = await drive(client, factories[name], args.requests, args.concurrency, args.seed)
+            print(f"{name:>10}: {results[name]['throughput_rps']:>9} req/s  "
+                  f"p50 {results[name]['p50_ms']:>9} ms  p99 {results[name]['p99_ms']:>9} ms  "
+                  f"errors {results[name]['errors']}", flush=True)
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Scenarios whose throughput fell or p99 rose by more than ``threshold``"""
+    regressions = []
+    for name, now in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before or "throughput_rps" not in now or "throughput_rps" not in before:
+            continue
+        if before["throughput_rps"] and now["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['throughput_rps']} -> {now['throughput_rps']} req/s")
+        if before["p99_ms"] and now["p99_ms"] > before["p99_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p99 {before['p99_ms']} -> {now['p99_ms']} ms")
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=1000, help="synthetic library size (1k-100k)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests before each scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), type=lambda s: [x for x in s.split(",") if x])
+    parser.add_argument("--queries", type=int, default=50, help="distinct search queries (cache hit ratio)")
+    parser.add_argument("--videos", type=int, default=100, help="distinct video ids for /video")
+    parser.add_argument("--search-latency", type=float, default=fake_ytdlp.CONFIG["search_latency"])
+    parser.add_argument("--extract-latency", type=float, default=fake_ytdlp.CONFIG["extract_latency"])
+    parser.add_argument("--jitter", type=float, default=fake_ytdlp.CONFIG["jitter"])
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--workdir", type=Path, help="reuse this directory instead of a temporary one")
+    parser.add_argument("--output", type=Path, default=Path("benchmark-results.json"))
+    parser.add_argument("--compare", type=Path, help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    output = args.output.resolve()
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="playyt-bench-"))
+    downloads = workdir / "downloads"
+    started = time.perf_counter()
+    if args.workdir and downloads.is_dir():
+        streamable = sorted(p.name for p in downloads.glob("Stream sample *.mp4"))
+    else:
+        streamable = dataset.make_library(downloads, args.files, seed=args.seed)
+    print(f"library: {args.files} files in {downloads} ({time.perf_counter() - started:.1f}s)", flush=True)
+
+    # The app resolves downloads/ relative to the working directory
+    os.chdir(workdir)
+    fake_ytdlp.install(
+        search_latency=args.search_latency,
+        extract_latency=args.extract_latency,
+        jitter=args.jitter,
+        seed=args.seed,
+    )
+    port = _free_port()
+    server, thread = start_server(port)
+    try:
+        results = asyncio.run(run_scenarios(args, f"http://127.0.0.1:{port}", streamable))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "params": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        },
+        "results": results,
+    }
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"results written to {output}")
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print("no regressions beyond threshold")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
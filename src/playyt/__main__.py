@@ -0,0 +1,5 @@
+import sys
+
+from playyt.cli import main
+
+sys.exit(main())
@@ -0,0 +1,299 @@
+"""Headless ``playyt`` command: search, metadata export, bulk downloads and library listing
+
+Every command writes one line per result as soon as it is known, tab-separated
+text by default or NDJSON with ``--json``, so output can be piped into other
+tools while a long run is still going. Services are imported per command to
+keep startup fast.
+"""
+from __future__ import annotations
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import argparse
+import json
+import os
+import sys
+import time
+
+# How often running downloads report progress on stderr with -v
+PROGRESS_INTERVAL = 1.0
+
+
+class CommandError(Exception):
+    """Aborts a command with a message on stderr and exit status 1"""
+
+
+def _emit(args: argparse.Namespace, record: Dict[str, Any], *columns: Any) -> None:
+    if args.json:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+    else:
+        line = "\t".join("" if c is None else str(c) for c in columns)
+    sys.stdout.write(line + "\n")
+    # Line-buffered even into a pipe, so consumers see results as they land
+    sys.stdout.flush()
+
+
+def _log(args: argparse.Namespace, message: str, level: int = 0) -> None:
+    if args.verbose - args.quiet >= level:
+        print(message, file=sys.stderr, flush=True)
+
+
+def _read_targets(args: argparse.Namespace) -> Iterator[str]:
+    """Ids and URLs from the arguments, ``--file`` and ``-`` (stdin); blank lines and # comments skipped"""
+    sources: List[Iterable[str]] = []
+    for target in args.targets:
+        sources.append(sys.stdin if target == "-" else [target])
+    if args.file:
+        sources.append(open(args.file, encoding="utf-8"))
+    for source in sources:
+        for line in source:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+def _video_ids(args: argparse.Namespace) -> Iterator[str]:
+    """Video ids, with playlist, channel and watch URLs expanded"""
+    from playyt.services import youtube
+
+    seen = set()
+    for target in _read_targets(args):
+        if "/" in target:
+            try:
+                ids = [e["id"] for e in youtube.expand_playlist(target, youtube.MAX_BATCH_SIZE)]
+            except Exception as e:
+                _log(args, f"playyt: cannot expand {target}: {e}")
+                args.failures += 1
+                continue
+        else:
+            ids = [target]
+        for video_id in ids:
+            if video_id not in seen:
+                seen.add(video_id)
+                yield video_id
+
+
+def _require_yt_dlp() -> None:
+    from playyt.services import youtube
+
+    if not youtube.yt_dlp_available():
+        raise CommandError("yt-dlp is not installed")
+
+
+def cmd_search(args: argparse.Namespace) -> None:
+    from playyt.services import youtube
+
+    _require_yt_dlp()
+    limit = min(args.limit, youtube.MAX_SEARCH_LIMIT)
+    for page in range(args.page, args.page + args.pages):
+        try:
+            results = youtube.youtube_search(args.query, limit=limit, page=page, flat=not args.full)
+        except Exception as e:
+            raise CommandError(f"search failed: {e}")
+        for r in results:
+            _emit(args, r, r.get("id"), r.get("duration"), r.get("channel"), r.get("title"))
+        if len(results) < limit:
+            break
+
+
+def _info(video_id: str, formats: bool) -> Optional[Dict[str, Any]]:
+    from playyt.services import youtube
+
+    video = youtube.get_video(video_id)
+    if video is not None and formats:
+        video["formats"] = youtube.get_video_formats(video_id)
+    return video
+
+
+def cmd_info(args: argparse.Namespace) -> None:
+    _require_yt_dlp()
+    # Extractions are network-bound; results print in completion order
+    with ThreadPoolExecutor(max_workers=args.jobs, thread_name_prefix="playyt-info") as pool:
+        pending = set()
+        for video_id in _video_ids(args):
+            future = pool.submit(_info, video_id, args.json)
+            future.video_id = video_id  # type: ignore[attr-defined]
+            pending.add(future)
+            # Keep the queue short so huge id lists stream instead of piling up
+            if len(pending) >= args.jobs * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _print_info(args, done)
+        _print_info(args, pending)
+
+
+def _print_info(args: argparse.Namespace, futures: Iterable[Any]) -> None:
+    for future in futures:
+        video = future.result()
+        if video is None:
+            args.failures += 1
+            _emit(args, {"id": future.video_id, "error": "not found"}, future.video_id, "error", "not found")
+            continue
+        _emit(args, video, video["id"], video["duration"], video["channel"], video["title"])
+
+
+def cmd_download(args: argparse.Namespace) -> None:
+    from playyt.services.jobs import CANCELLED, FAILED, FINISHED, RUNNING, DownloadJobManager
+    from playyt.services.ratelimit import HostLimiter
+    from playyt.services.shared import shared_store
+
+    _require_yt_dlp()
+    # Same per-host politeness as the server, but sized by -j; with a shared
+    # state database, a running server's downloads of the same files are reused
+    manager = DownloadJobManager(
+        max_workers=args.jobs,
+        host_limiter=HostLimiter(
+            max_per_host=args.jobs,
+            rate=float(os.environ.get("PLAYYT_HOST_RATE", "0.5")),
+            burst=float(os.environ.get("PLAYYT_HOST_BURST", "3")),
+        ),
+        store=shared_store,
+    )
+    jobs = []
+    try:
+        for video_id in _video_ids(args):
+            job = manager.submit(video_id, args.format)
+            jobs.append(job)
+            _log(args, f"queued {video_id}", level=1)
+        pending = set(jobs)
+        last_report = time.monotonic()
+        while pending:
+            for job in [j for j in pending if j.state in (FINISHED, FAILED, CANCELLED)]:
+                pending.discard(job)
+                _print_job(args, job)
+            futures = [j.future for j in pending if j.future is not None]
+            if futures:
+                wait(futures, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+            elif pending:
+                time.sleep(PROGRESS_INTERVAL)
+            for job in pending:
+                if job.remote:
+                    # Claimed by another process; follow its snapshot
+                    current = manager.get(job.id)
+                    if current is not None:
+                        job.update_from(current.to_dict())
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                for job in pending:
+                    if job.state == RUNNING:
+                        _log(args, f"{job.video_id} {job.stage or ''} {job.percent or 0:.1f}%", level=1)
+    except KeyboardInterrupt:
+        for job in jobs:
+            manager.cancel(job.id)
+        raise
+
+
+def _print_job(args: argparse.Namespace, job: Any) -> None:
+    from playyt.services.jobs import FINISHED
+
+    if job.state != FINISHED:
+        args.failures += 1
+    _emit(args, job.to_dict(), job.state, job.video_id, job.filename or job.error or "")
+
+
+def cmd_library_ls(args: argparse.Namespace) -> None:
+    from playyt.services.downloads import query_downloads
+
+    remaining = args.limit or None
+    cursor = None
+    while True:
+        page_size = min(500, remaining) if remaining else 500
+        try:
+            page = query_downloads(
+                sort=args.sort,
+                order=args.order,
+                extensions=args.ext or None,
+                limit=page_size,
+                cursor=cursor,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        for item in page["items"]:
+            mtime = time.strftime("%Y-%m-%d %H:%M", time.localtime(item["mtime"]))
+            _emit(args, item, item["size"], mtime, item["filename"])
+        if remaining:
+            remaining -= len(page["items"])
+        cursor = page["next_cursor"]
+        if not cursor or remaining == 0:
+            break
+
+
+def cmd_library_stats(args: argparse.Namespace) -> None:
+    from playyt.services.downloads import get_downloads_stats
+
+    stats = get_downloads_stats()
+    if args.json:
+        _emit(args, stats)
+        return
+    for key, value in stats.items():
+        _emit(args, stats, key, value)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", help="write NDJSON, one object per line")
+    common.add_argument("-v", "--verbose", action="count", default=0, help="more progress on stderr")
+    common.add_argument("-q", "--quiet", action="count", default=0, help="no messages on stderr")
+
+    targets = argparse.ArgumentParser(add_help=False)
+    targets.add_argument("targets", nargs="*", metavar="ID", help="video ids or URLs; - reads them from stdin")
+    targets.add_argument("--file", help="read ids or URLs from this file, one per line")
+    targets.add_argument("-j", "--jobs", type=int, default=4, help="how many to run in parallel (default: 4)")
+
+    # Options live on the subcommands only; argparse lets subcommand defaults
+    # clobber the same options given before the command name
+    parser = argparse.ArgumentParser(prog="playyt", description=__doc__.splitlines()[0])
+    parser.add_argument("-C", dest="directory", help="run as if started in this directory (holds downloads/)")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND", required=True)
+
+    search = commands.add_parser("search", parents=[common], help="search YouTube")
+    search.add_argument("query")
+    search.add_argument("-n", "--limit", type=int, default=12, help="results per page (default: 12)")
+    search.add_argument("--page", type=int, default=1, help="first page (default: 1)")
+    search.add_argument("--pages", type=int, default=1, help="how many pages to fetch (default: 1)")
+    search.add_argument("--full", action="store_true", help="resolve every result instead of a flat listing")
+    search.set_defaults(func=cmd_search)
+
+    info = commands.add_parser(
+        "info", parents=[common, targets], help="video metadata; with --json includes the format list"
+    )
+    info.set_defaults(func=cmd_info)
+
+    download = commands.add_parser("download", parents=[common, targets], help="download videos into downloads/")
+    download.add_argument("-f", "--format", default="best", help="yt-dlp format selector (default: best)")
+    download.set_defaults(func=cmd_download)
+
+    library = commands.add_parser("library", help="the downloads library")
+    library_commands = library.add_subparsers(dest="library_command", metavar="COMMAND", required=True)
+    ls = library_commands.add_parser("ls", parents=[common], help="list downloaded files")
+    ls.add_argument("--sort", choices=("mtime", "size", "title"), default="mtime")
+    ls.add_argument("--order", choices=("asc", "desc"), default="desc")
+    ls.add_argument("--ext", action="append", help="only this extension; repeatable")
+    ls.add_argument("-n", "--limit", type=int, default=0, help="at most this many files (default: all)")
+    ls.set_defaults(func=cmd_library_ls)
+    stats = library_commands.add_parser("stats", parents=[common], help="library totals")
+    stats.set_defaults(func=cmd_library_stats)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    args.failures = 0
+    if getattr(args, "jobs", 1) < 1:
+        args.jobs = 1
+    if args.directory:
+        os.chdir(args.directory)
+    try:
+        args.func(args)
+    except CommandError as e:
+        print(f"playyt: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # Reader went away (e.g. piped into head); not an error for us
+        sys.stderr.close()
+        return 0
+    return 1 if args.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
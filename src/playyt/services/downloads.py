@@ -1,10 +1,17 @@
 from __future__ import annotations
 from typing import List, Dict, Any, Optional
 from pathlib import Path
+import base64
+import json
 import os
+import struct
 import time
 from datetime import datetime
 
+from playyt.services.cache import TTLCache
+from playyt.services.library import LibraryIndex, get_library_index
+from playyt.services.mp4 import MP4_EXTENSIONS, Mp4Error, container_index, faststart
+
 
 def get_downloads_directory() -> Path:
     """Get the downloads directory path"""
@@ -25,62 +32,213 @@ def format_file_size(size_bytes: int) -> str:
     return f"{size_bytes:.1f} {size_names[i]}"
 
 
-def get_video_info_from_filename(filename: str) -> Dict[str, Any]:
-    """Extract video information from filename"""
-    # Remove extension
-    name_without_ext = Path(filename).stem
-    
-    # Try to extract basic info (this is a simple approach)
-    # In a real app, you might store metadata separately
+def get_video_info_from_filename(filename: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Video information for a file, from its stored metadata when available"""
+    metadata = metadata or {}
+    duration = metadata.get("duration")
     return {
-        "title": name_without_ext,
-        "original_filename": filename
+        "title": metadata.get("title") or Path(filename).stem,
+        "original_filename": filename,
+        "video_id": metadata.get("video_id"),
+        "channel": metadata.get("channel") or "",
+        "duration": duration,
+        "duration_formatted": _fmt_duration(duration),
+        "description": metadata.get("description") or "",
+        "thumbnail": metadata.get("thumbnail"),
+        "webpage_url": metadata.get("webpage_url"),
+        "resolution": metadata.get("resolution"),
+        "format_id": metadata.get("format_id"),
     }
 
 
-def scan_downloads() -> List[Dict[str, Any]]:
-    """Scan downloads directory and return list of video files with metadata"""
-    downloads_dir = get_downloads_directory()
-    
-    if not downloads_dir.exists():
+def _fmt_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return ""
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    if h:
+        return f"{h:d}:{m:02d}:{s:02d}"
+    return f"{m:d}:{s:02d}"
+
+
+def _row_to_file_info(downloads_dir: Path, row: tuple, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    filename, size, mtime, extension = row
+    modified = datetime.fromtimestamp(mtime)
+    file_info = {
+        "filename": filename,
+        "path": str(downloads_dir / filename),
+        "size": size,
+        "size_formatted": format_file_size(size),
+        "modified": modified,
+        "modified_formatted": modified.strftime("%Y-%m-%d %H:%M"),
+        "extension": extension,
+    }
+
+    # Add video info from stored metadata, falling back to the filename
+    file_info.update(get_video_info_from_filename(filename, metadata))
+    return file_info
+
+
+def _library_index(refresh: bool = True) -> Optional[LibraryIndex]:
+    index = get_library_index(get_downloads_directory())
+    if index is not None and refresh:
+        index.refresh()
+    return index
+
+
+def scan_downloads(limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+    """Return downloaded video files with metadata, newest first
+
+    Served from the library index; only ``limit`` rows are materialized.
+    """
+    index = _library_index()
+    if index is None:
         return []
-    
-    video_extensions = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v'}
-    video_files = []
-    
+    downloads_dir = get_downloads_directory()
+    rows = index.page(limit, offset)
+    metadata = index.get_metadata(row[0] for row in rows)
+    return [_row_to_file_info(downloads_dir, row, metadata.get(row[0])) for row in rows]
+
+
+def download_item(row: tuple, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Compact JSON row for a library index row"""
+    filename, size, mtime, extension = row
+    metadata = metadata or {}
+    return {
+        "filename": filename,
+        "title": metadata.get("title") or Path(filename).stem,
+        "channel": metadata.get("channel") or "",
+        "duration": metadata.get("duration"),
+        "video_id": metadata.get("video_id"),
+        "ext": extension,
+        "size": size,
+        "mtime": mtime,
+    }
+
+
+def _encode_cursor(sort: str, order: str, row: tuple) -> str:
+    filename, size, mtime, _ = row
+    value = {"mtime": mtime, "size": size, "title": filename}[sort]
+    raw = json.dumps([sort, order, value, filename], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str, order: str) -> tuple:
     try:
-        for file_path in downloads_dir.iterdir():
-            if file_path.is_file() and file_path.suffix.lower() in video_extensions:
-                try:
-                    stat = file_path.stat()
-                    file_info = {
-                        "filename": file_path.name,
-                        "path": str(file_path),
-                        "size": stat.st_size,
-                        "size_formatted": format_file_size(stat.st_size),
-                        "modified": datetime.fromtimestamp(stat.st_mtime),
-                        "modified_formatted": datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M"),
-                        "extension": file_path.suffix.lower(),
-                    }
-                    
-                    # Add video info extracted from filename
-                    video_info = get_video_info_from_filename(file_path.name)
-                    file_info.update(video_info)
-                    
-                    video_files.append(file_info)
-                    
-                except (OSError, PermissionError):
-                    # Skip files we can't access
-                    continue
-                    
-    except (OSError, PermissionError):
-        # Can't access downloads directory
-        return []
-    
-    # Sort by modification time (newest first)
-    video_files.sort(key=lambda x: x["modified"], reverse=True)
-    
-    return video_files
+        padded = cursor + "=" * (-len(cursor) % 4)
+        c_sort, c_order, value, filename = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if (c_sort, c_order) != (sort, order):
+        raise ValueError("Cursor does not match sort order")
+    return value, filename
+
+
+def query_downloads(
+    sort: str = "mtime",
+    order: str = "desc",
+    extensions: Optional[List[str]] = None,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """One page of compact download rows plus the cursor for the next page
+
+    Raises ValueError for an unknown sort/order or a malformed cursor.
+    """
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Unknown order: {order}")
+    after = _decode_cursor(cursor, sort, order) if cursor else None
+    index = _library_index()
+    if index is None:
+        return {"items": [], "next_cursor": None}
+
+    # Fetch one extra row to learn whether another page exists
+    rows = index.query(
+        sort=sort,
+        descending=order == "desc",
+        extensions=extensions,
+        min_size=min_size,
+        max_size=max_size,
+        since=since,
+        until=until,
+        limit=limit + 1,
+        after=after,
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    metadata = index.get_metadata(row[0] for row in rows)
+    return {
+        "items": [download_item(row, metadata.get(row[0])) for row in rows],
+        "next_cursor": _encode_cursor(sort, order, rows[-1]) if has_more else None,
+    }
+
+
+def get_download_metadata(filename: str) -> Optional[Dict[str, Any]]:
+    """Stored metadata for one downloaded file, if it was captured at download time"""
+    index = _library_index(refresh=False)
+    if index is None:
+        return None
+    return index.get_metadata([filename]).get(filename)
+
+
+# Rewrite MP4 downloads so moov precedes the media data (see prepare_for_streaming)
+FASTSTART = os.environ.get("PLAYYT_FASTSTART", "1").lower() not in ("0", "false", "no")
+
+# Parsed container indexes keyed by (filename, size, mtime_ns); {} marks files
+# that are not indexable so they are not re-parsed on every range request
+_container_cache = TTLCache(max_size=256, ttl=3600)
+
+
+def get_container_index(filename: str) -> Optional[Dict[str, Any]]:
+    """Moov position, duration and keyframe table of an MP4 download, built on first use"""
+    path = get_downloads_directory() / filename
+    if path.suffix.lower() not in MP4_EXTENSIONS:
+        return None
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    key = (filename, st.st_size, st.st_mtime_ns)
+    info = _container_cache.get(key)
+    if info is None:
+        index = _library_index(refresh=False)
+        info = index.get_container(filename, st.st_size, st.st_mtime) if index is not None else None
+        if info is None:
+            try:
+                info = container_index(path)
+            except (Mp4Error, struct.error, OSError, IndexError):
+                info = {}
+            if info and index is not None:
+                index.set_container(filename, st.st_size, st.st_mtime, info)
+        if info:
+            info["keyframe_offsets"] = sorted(k[1] for k in info.get("keyframes") or [])
+        _container_cache.set(key, info)
+    return info or None
+
+
+def prepare_for_streaming(filename: str) -> Optional[Dict[str, Any]]:
+    """Post-download step: faststart an MP4 in place, then index it"""
+    path = get_downloads_directory() / filename
+    if path.suffix.lower() not in MP4_EXTENSIONS:
+        return None
+    if FASTSTART:
+        try:
+            faststart(path)
+        except (Mp4Error, struct.error, OSError, IndexError):
+            # Leave the file as downloaded; it still plays, just starts slower
+            pass
+    return get_container_index(filename)
+
+
+def record_download(filename: str) -> None:
+    """Add a newly finished download to the library index"""
+    index = _library_index(refresh=False)
+    if index is not None and filename:
+        index.add(filename)
 
 
 def delete_download(filename: str) -> Dict[str, Any]:
@@ -98,6 +256,9 @@ def delete_download(filename: str) -> Dict[str, Any]:
         
         if file_path.exists() and file_path.is_file():
             file_path.unlink()
+            index = _library_index(refresh=False)
+            if index is not None:
+                index.remove(file_path.name)
             return {"success": True, "message": f"Deleted {filename}"}
         else:
             return {"success": False, "error": "File not found"}
@@ -108,16 +269,27 @@ def delete_download(filename: str) -> Dict[str, Any]:
         return {"success": False, "error": f"Error deleting file: {str(e)}"}
 
 
+def get_library_version() -> Optional[str]:
+    """Change counter of the downloads library, after picking up disk changes"""
+    index = _library_index()
+    return index.version() if index is not None else None
+
+
 def get_downloads_stats() -> Dict[str, Any]:
     """Get statistics about downloads"""
-    files = scan_downloads()
-    
-    total_files = len(files)
-    total_size = sum(f["size"] for f in files)
-    
+    return library_stats(_library_index())
+
+
+def library_stats(index: Optional[LibraryIndex]) -> Dict[str, Any]:
+    """Download statistics from the index as it is, without checking the directory"""
+    totals = index.totals() if index is not None else {"total_files": 0, "total_size": 0, "latest_mtime": None}
+
+    total_size = totals["total_size"]
+    latest = totals["latest_mtime"]
+
     return {
-        "total_files": total_files,
+        "total_files": totals["total_files"],
         "total_size": total_size,
         "total_size_formatted": format_file_size(total_size),
-        "latest_download": files[0]["modified_formatted"] if files else None
+        "latest_download": datetime.fromtimestamp(latest).strftime("%Y-%m-%d %H:%M") if latest else None
     }
@@ -0,0 +1,203 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import itertools
+import sqlite3
+import threading
+import time
+
+from playyt.services.downloads import get_downloads_directory, library_stats
+from playyt.services.library import LibraryIndex, get_library_index
+from playyt.services.shared import shared_store
+
+# Pending events per subscriber before it is considered too slow; it then
+# gets a single "resync" event telling it to refetch state instead
+MAX_PENDING = 256
+
+# How often other workers' job updates and library changes are picked up
+SHARED_POLL_INTERVAL = 0.5
+
+Merge = Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]
+
+
+class Subscription:
+    """One client's queue of events, coalesced by key
+
+    Owned by an event loop; the bus hands events over thread-safely. A newer
+    event with the same key replaces (or merges into) the queued one, so a
+    slow client receives the latest state rather than every intermediate one.
+    """
+
+    def __init__(self, bus: "EventBus", topics: Iterable[str], loop: asyncio.AbstractEventLoop, max_pending: int = MAX_PENDING):
+        self.bus = bus
+        self.topics = frozenset(topics)
+        self.loop = loop
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[Any, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+        self._wake = asyncio.Event()
+        self.overflowed = False
+        self.delivered = 0
+        self.coalesced = 0
+
+    def _offer(self, key: Any, event: str, data: Dict[str, Any], merge: Optional[Merge]) -> None:
+        # Runs on the subscriber's loop
+        queued = self._pending.get(key)
+        if queued is not None:
+            self.coalesced += 1
+            self._pending[key] = (event, merge(queued[1], data) if merge else data)
+        elif len(self._pending) >= self.max_pending:
+            self.overflowed = True
+            self._pending.clear()
+        else:
+            self._pending[key] = (event, data)
+        self._wake.set()
+
+    async def next_batch(self, timeout: float) -> List[Tuple[str, Dict[str, Any]]]:
+        """Everything queued since the last call, waiting up to ``timeout`` for the first event"""
+        if not self._pending and not self.overflowed:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._wake.clear()
+        if self.overflowed:
+            self.overflowed = False
+            self._pending.clear()
+            return [("resync", {})]
+        batch = list(self._pending.values())
+        self._pending.clear()
+        self.delivered += len(batch)
+        return batch
+
+    def close(self) -> None:
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """Fan-out of job and library events from worker threads to async subscribers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: List[Subscription] = []
+        self._seq = itertools.count()
+        self.published = 0
+
+    def subscribe(self, topics: Iterable[str], max_pending: int = MAX_PENDING) -> Subscription:
+        """Subscribe the running event loop to ``topics``"""
+        sub = Subscription(self, topics, asyncio.get_running_loop(), max_pending)
+        with self._lock:
+            self._subscriptions.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            if sub in self._subscriptions:
+                self._subscriptions.remove(sub)
+
+    def publish(self, topic: str, event: str, data: Dict[str, Any], key: Any = None, merge: Optional[Merge] = None) -> None:
+        """Queue an event for every subscriber of ``topic``; safe from any thread
+
+        Events sharing ``key`` coalesce while queued; without a key they never do.
+        """
+        if key is None:
+            key = ("seq", next(self._seq))
+        with self._lock:
+            targets = [s for s in self._subscriptions if topic in s.topics]
+            self.published += 1
+        for sub in targets:
+            try:
+                sub.loop.call_soon_threadsafe(sub._offer, key, event, data, merge)
+            except RuntimeError:
+                # Loop already closed; its subscription is going away
+                pass
+
+    def has_subscribers(self, topic: str) -> bool:
+        with self._lock:
+            return any(topic in s.topics for s in self._subscriptions)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subs = list(self._subscriptions)
+        return {
+            "subscribers": len(subs),
+            "published": self.published,
+            "delivered": sum(s.delivered for s in subs),
+            "coalesced": sum(s.coalesced for s in subs),
+        }
+
+
+event_bus = EventBus()
+
+
+def _merge_library(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    removed = set(new["removed"])
+    changed = set(new["changed"])
+    return dict(
+        new,
+        changed=sorted((set(old["changed"]) - removed) | changed),
+        removed=sorted((set(old["removed"]) - changed) | removed),
+    )
+
+
+_watched: Optional[LibraryIndex] = None
+_watch_lock = threading.Lock()
+
+
+def watch_library() -> None:
+    """Publish library changes on the "library" topic; idempotent"""
+    global _watched
+    index = get_library_index(get_downloads_directory())
+    if index is None:
+        return
+    with _watch_lock:
+        if _watched is index:
+            return
+        _watched = index
+
+    def on_change(changed: List[str], removed: List[str]) -> None:
+        event_bus.publish(
+            "library",
+            "library",
+            {"changed": changed, "removed": removed, "version": index.version(), "stats": library_stats(index)},
+            key="library",
+            merge=_merge_library,
+        )
+
+    index.add_listener(on_change)
+
+
+_poller: Optional[threading.Thread] = None
+
+
+def watch_shared_state() -> None:
+    """Relay job updates and library changes made by other worker processes
+
+    Does nothing with a single worker, where every event originates locally.
+    """
+    global _poller
+    if shared_store is None:
+        return
+    with _watch_lock:
+        if _poller is not None:
+            return
+        _poller = threading.Thread(target=_poll_shared_state, name="playyt-events-poll", daemon=True)
+        _poller.start()
+
+
+def _poll_shared_state() -> None:
+    since = time.time()
+    while True:
+        time.sleep(SHARED_POLL_INTERVAL)
+        try:
+            if event_bus.has_subscribers("jobs"):
+                for updated, job in shared_store.jobs_updated_since(since):
+                    since = max(since, updated)
+                    event_bus.publish("jobs", "job", job, key=job["job_id"])
+            else:
+                since = time.time()
+            if _watched is not None and event_bus.has_subscribers("library"):
+                _watched.poll_changes()
+        except sqlite3.Error:
+            # Busy or briefly locked database; try again on the next tick
+            pass
@@ -0,0 +1,136 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import math
+import os
+import threading
+import time
+
+
+class ServiceOverloaded(Exception):
+    """Too much extraction work is queued; the caller should retry later"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Service overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ServiceTimeout(Exception):
+    """An extraction did not finish within its deadline"""
+
+
+class BoundedExecutor:
+    """Size-limited thread pool for blocking upstream calls, awaitable from async code
+
+    Admission is based on outstanding work (running + queued). Work that
+    times out keeps counting until its thread actually finishes, so a wedged
+    upstream sheds load instead of piling up threads.
+    """
+
+    def __init__(self, name: str, max_workers: int = 4, max_queue: int = 16, timeout: float = 30.0):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.timeout = float(timeout)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"playyt-{name}")
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._avg_duration = 1.0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.dropped = 0
+
+    @property
+    def outstanding(self) -> int:
+        return self._outstanding
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._outstanding - self.max_workers)
+
+    def _retry_after(self) -> int:
+        # Time for the current backlog to drain at the observed service rate
+        backlog = self._outstanding / self.max_workers
+        return max(1, math.ceil(backlog * self._avg_duration))
+
+    def _run(self, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> Any:
+        started = time.monotonic()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._outstanding -= 1
+                self.completed += 1
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * elapsed
+
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """Run ``fn`` on the pool; raises ServiceOverloaded or ServiceTimeout"""
+        with self._lock:
+            if self._outstanding >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ServiceOverloaded(self._retry_after())
+            self._outstanding += 1
+        try:
+            cf = self._pool.submit(self._run, fn, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self._outstanding -= 1
+            raise
+        try:
+            # shield: a timeout must not cancel the wrapped future behind our back
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(cf)),
+                timeout=self.timeout if timeout is None else timeout,
+            )
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+                if cf.cancel():
+                    # Never started, so _run will not decrement for us
+                    self._outstanding -= 1
+            raise ServiceTimeout(f"{self.name} call timed out")
+
+    def submit_background(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> bool:
+        """Start ``fn`` on an idle worker without waiting for it; False if dropped
+
+        Background work only starts on an idle worker and never waits in the
+        queue; while every worker is busy it is dropped and the caller tries
+        again on a later occasion.
+        """
+        with self._lock:
+            if self._outstanding >= self.max_workers:
+                self.dropped += 1
+                return False
+            self._outstanding += 1
+        try:
+            self._pool.submit(self._run, fn, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self._outstanding -= 1
+            raise
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "outstanding": self._outstanding,
+                "queue_depth": max(0, self._outstanding - self.max_workers),
+                "avg_duration": round(self._avg_duration, 3),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "dropped": self.dropped,
+            }
+
+
+extraction_executor = BoundedExecutor(
+    "extract",
+    max_workers=int(os.environ.get("PLAYYT_EXTRACT_WORKERS", "4")),
+    max_queue=int(os.environ.get("PLAYYT_EXTRACT_QUEUE", "16")),
+    timeout=float(os.environ.get("PLAYYT_EXTRACT_TIMEOUT", "30")),
+)
@@ -0,0 +1,342 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import os
+import shutil
+import threading
+
+from playyt.services.units import parse_size
+
+# Codec families in default preference order: H.264 plays everywhere and
+# lands in MP4, which the faststart post-processor can make seekable
+VIDEO_CODECS = {"avc1": "h264", "h264": "h264", "vp9": "vp9", "vp09": "vp9", "av01": "av1", "hev1": "h265", "hvc1": "h265"}
+AUDIO_CODECS = {"mp4a": "aac", "aac": "aac", "opus": "opus", "vorbis": "vorbis", "ac-3": "ac3", "ec-3": "eac3", "mp3": "mp3"}
+DEFAULT_CODEC_ORDER = ("h264", "vp9", "av1", "h265")
+
+# Video and audio containers yt-dlp merges without remuxing into something else
+MERGEABLE = {"mp4": ("m4a", "mp4"), "webm": ("webm",)}
+
+# Streaming protocols rank below plain HTTPS: fragment overhead and no ranges
+_PROTOCOL_RANK = {"https": 0, "http": 1, "http_dash_segments": 2, "m3u8_native": 3, "m3u8": 3}
+
+AUTO = "auto"
+_SPEC_KEYS = ("height", "size", "codec", "time", "bw")
+
+# What plain "auto" means; e.g. "height=1080,size=2G"
+DEFAULT_AUTO = os.environ.get("PLAYYT_AUTO_FORMAT", "height=1080")
+
+
+def codec_family(codec: Optional[str], table: Dict[str, str]) -> Optional[str]:
+    if not codec or codec == "none":
+        return None
+    return table.get(codec.split(".")[0].lower(), codec.split(".")[0].lower())
+
+
+def protocol(fmt: Dict[str, Any]) -> Optional[str]:
+    """Download protocol; unprocessed info dicts only name it for HLS and DASH formats"""
+    if fmt.get("protocol"):
+        return fmt["protocol"]
+    url = fmt.get("url") or ""
+    if fmt.get("ext") == "m3u8" or ".m3u8" in url or "/hls_playlist/" in url:
+        return "m3u8_native"
+    if fmt.get("fragments"):
+        return "http_dash_segments"
+    return url.partition(":")[0].lower() or None
+
+
+def dynamic_range(fmt: Dict[str, Any]) -> Optional[str]:
+    """SDR or HDR; unprocessed info dicts leave it out, so read the codec profile"""
+    if fmt.get("vcodec") in (None, "none"):
+        return None
+    if fmt.get("dynamic_range"):
+        return fmt["dynamic_range"]
+    parts = fmt["vcodec"].lower().split(".")
+    # vp09.<profile>.<level>.<depth>, av01.<profile>.<level+tier>.<depth>, hvc1.<profile>...
+    if parts[0] == "vp09" and len(parts) > 3:
+        hdr = parts[1] in ("02", "03") or parts[3] not in ("08", "8")
+    elif parts[0] == "av01" and len(parts) > 3:
+        hdr = parts[3] not in ("08", "8")
+    elif parts[0] in ("hev1", "hvc1") and len(parts) > 1:
+        hdr = parts[1] == "2"
+    else:
+        hdr = False
+    return "HDR" if hdr else "SDR"
+
+
+def estimate_size(fmt: Dict[str, Any], duration: Optional[float]) -> Tuple[Optional[int], bool]:
+    """(bytes, estimated) from the reported size, else bitrate × duration"""
+    if fmt.get("filesize"):
+        return int(fmt["filesize"]), False
+    if fmt.get("filesize_approx"):
+        return int(fmt["filesize_approx"]), True
+    kbps = fmt.get("tbr") or (fmt.get("vbr") or 0) + (fmt.get("abr") or 0)
+    if kbps and duration:
+        return int(kbps * 1000 / 8 * duration), True
+    return None, False
+
+
+def format_row(fmt: Dict[str, Any], duration: Optional[float]) -> Optional[Dict[str, Any]]:
+    """Normalized entry of a yt-dlp format, or None for storyboards and DRM-only formats"""
+    has_video = fmt.get("vcodec") not in (None, "none")
+    has_audio = fmt.get("acodec") not in (None, "none")
+    if not (has_video or has_audio) or fmt.get("has_drm") or fmt.get("ext") == "mhtml":
+        return None
+    size, estimated = estimate_size(fmt, duration)
+    height = fmt.get("height") if has_video else None
+    return {
+        "format_id": fmt.get("format_id"),
+        "ext": fmt.get("ext"),
+        "kind": "av" if has_video and has_audio else "video" if has_video else "audio",
+        "quality": fmt.get("format_note") or fmt.get("quality") or "Unknown",
+        "resolution": fmt.get("resolution") or (f"{height}p" if height else "audio only"),
+        "width": fmt.get("width") if has_video else None,
+        "height": height,
+        "fps": fmt.get("fps") if has_video else None,
+        "dynamic_range": dynamic_range(fmt),
+        "vcodec": fmt.get("vcodec"),
+        "acodec": fmt.get("acodec"),
+        "video_codec": codec_family(fmt.get("vcodec"), VIDEO_CODECS),
+        "audio_codec": codec_family(fmt.get("acodec"), AUDIO_CODECS),
+        "tbr": fmt.get("tbr"),
+        "abr": fmt.get("abr") if has_audio else None,
+        "language": fmt.get("language") if has_audio else None,
+        "protocol": protocol(fmt),
+        "filesize": size,
+        "filesize_estimated": estimated,
+    }
+
+
+def _equivalence_key(row: Dict[str, Any]) -> tuple:
+    return (
+        row["kind"], row["ext"], row["height"], round(row["fps"] or 0), row["dynamic_range"],
+        row["video_codec"], row["audio_codec"], row["language"],
+        # Audio variants differ mostly in bitrate; group them in 32 kbps steps
+        round((row["abr"] or 0) / 32) if row["kind"] == "audio" else None,
+    )
+
+
+def _preference(row: Dict[str, Any]) -> tuple:
+    # Lower is better among equivalent formats
+    return (
+        _PROTOCOL_RANK.get(row["protocol"] or "", 4),
+        row["filesize_estimated"] or row["filesize"] is None,
+        -(row["tbr"] or 0),
+    )
+
+
+def dedupe(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One format per set of equivalent ones, e.g. the same stream over HTTPS and HLS"""
+    best: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        key = _equivalence_key(row)
+        if key not in best or _preference(row) < _preference(best[key]):
+            best[key] = row
+    return list(best.values())
+
+
+def _codec_rank(family: Optional[str], order: Tuple[str, ...]) -> int:
+    return order.index(family) if family in order else len(order)
+
+
+def rank(rows: Iterable[Dict[str, Any]], codecs: Tuple[str, ...] = DEFAULT_CODEC_ORDER) -> List[Dict[str, Any]]:
+    """Video formats best first, then audio-only formats by bitrate"""
+    def key(row: Dict[str, Any]) -> tuple:
+        return (
+            row["kind"] == "audio",
+            -(row["height"] or 0),
+            -(row["fps"] or 0),
+            _codec_rank(row["video_codec"], codecs),
+            row["kind"] != "av",
+            -(row["abr"] or 0),
+            row["filesize"] or 0,
+        )
+    return sorted(rows, key=key)
+
+
+def format_table(info: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Ranked, deduplicated formats of a yt-dlp info dict with sizes filled in"""
+    duration = info.get("duration")
+    rows = (format_row(fmt, duration) for fmt in info.get("formats") or [])
+    return rank(dedupe(row for row in rows if row is not None))
+
+
+class FormatConstraints:
+    """Limits for picking a format automatically
+
+    ``max_bytes`` and ``target_seconds`` both cap the size; the latter through
+    the expected bandwidth. ``codecs`` orders preference, it never excludes.
+    """
+
+    def __init__(
+        self,
+        max_height: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        codecs: Optional[Iterable[str]] = None,
+        target_seconds: Optional[float] = None,
+        bandwidth: Optional[float] = None,
+    ):
+        self.max_height = max_height
+        self.max_bytes = max_bytes
+        self.codecs = tuple(codecs) if codecs else DEFAULT_CODEC_ORDER
+        self.target_seconds = target_seconds
+        self.bandwidth = bandwidth
+
+    @classmethod
+    def parse(cls, spec: str) -> "FormatConstraints":
+        """Constraints from ``auto`` or ``auto:height=720,size=500M,codec=vp9/h264,time=300,bw=2M``
+
+        Given options override the PLAYYT_AUTO_FORMAT defaults; an empty value
+        (``height=``) lifts a default limit. Raises ValueError on anything else.
+        """
+        if spec != AUTO and not spec.startswith(AUTO + ":"):
+            raise ValueError(f"Not an automatic format: {spec}")
+        values: Dict[str, str] = {}
+        for options in (DEFAULT_AUTO, spec[len(AUTO) + 1:]):
+            for part in filter(None, options.split(",")):
+                name, sep, value = part.partition("=")
+                if not sep or name not in _SPEC_KEYS:
+                    raise ValueError(f"Unknown format constraint: {part}")
+                values[name] = value
+        return cls(
+            max_height=int(values["height"].rstrip("p")) if values.get("height") else None,
+            max_bytes=parse_size(values["size"]) or None if values.get("size") else None,
+            codecs=[c.lower() for c in values["codec"].split("/") if c] if values.get("codec") else None,
+            target_seconds=float(values["time"]) if values.get("time") else None,
+            bandwidth=parse_size(values["bw"]) or None if values.get("bw") else None,
+        )
+
+    def _spec_values(self) -> Dict[str, str]:
+        return {
+            "height": str(self.max_height or ""),
+            "size": str(self.max_bytes or ""),
+            "codec": "/".join(self.codecs) if self.codecs != DEFAULT_CODEC_ORDER else "",
+            "time": f"{self.target_seconds:g}" if self.target_seconds else "",
+            "bw": str(int(self.bandwidth)) if self.bandwidth else "",
+        }
+
+    def to_spec(self) -> str:
+        """Shortest spec that :meth:`parse` reads back as these constraints"""
+        defaults = FormatConstraints.parse(AUTO)._spec_values()
+        parts = [f"{k}={v}" for k, v in self._spec_values().items() if v != defaults[k]]
+        return AUTO + (":" + ",".join(parts) if parts else "")
+
+    def budget(self) -> Optional[int]:
+        """Largest acceptable download in bytes, if anything limits it"""
+        limits = [self.max_bytes] if self.max_bytes else []
+        if self.target_seconds:
+            bandwidth = self.bandwidth or throughput.estimate()
+            if bandwidth:
+                limits.append(int(bandwidth * self.target_seconds))
+        return min(limits) if limits else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_height": self.max_height,
+            "max_bytes": self.max_bytes,
+            "codecs": list(self.codecs),
+            "target_seconds": self.target_seconds,
+            "bandwidth": self.bandwidth or throughput.estimate(),
+            "budget": self.budget(),
+        }
+
+
+def is_auto(format_id: str) -> bool:
+    return format_id == AUTO or format_id.startswith(AUTO + ":")
+
+
+def can_merge() -> bool:
+    """Separate video and audio streams need ffmpeg to be combined"""
+    return shutil.which("ffmpeg") is not None
+
+
+def _candidates(rows: List[Dict[str, Any]], merge: bool) -> Iterable[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+    audio = [r for r in rows if r["kind"] == "audio"]
+    for row in rows:
+        if row["kind"] == "av":
+            yield row, None
+        elif row["kind"] == "video" and merge:
+            for track in audio:
+                if track["ext"] in MERGEABLE.get(row["ext"], ()):
+                    yield row, track
+
+
+def choose(rows: List[Dict[str, Any]], constraints: FormatConstraints, merge: Optional[bool] = None) -> Optional[Dict[str, Any]]:
+    """Best video+audio combination within the constraints
+
+    Among combinations that fit, prefers height, then frame rate, then codec
+    preference and audio bitrate, and finally the smaller file. When nothing
+    fits, returns the smallest combination with ``fits`` false.
+    """
+    merge = can_merge() if merge is None else merge
+    budget = constraints.budget()
+    fitting = []
+    fallback = []
+    for video, audio in _candidates(rows, merge):
+        if constraints.max_height and (video["height"] or 0) > constraints.max_height:
+            continue
+        size = video["filesize"]
+        if audio is not None:
+            size = size + audio["filesize"] if size is not None and audio["filesize"] is not None else None
+        combo = (video, audio, size)
+        fallback.append(combo)
+        if budget is None or (size is not None and size <= budget):
+            fitting.append(combo)
+    if fitting:
+        def quality(combo: tuple) -> tuple:
+            video, audio, size = combo
+            return (
+                video["height"] or 0,
+                round(video["fps"] or 0),
+                -_codec_rank(video["video_codec"], constraints.codecs),
+                (audio or video)["abr"] or 0,
+                # An unknown size ranks below any known one
+                -(size if size is not None else float("inf")),
+            )
+        video, audio, size = max(fitting, key=quality)
+        fits = True
+    elif fallback:
+        video, audio, size = min(fallback, key=lambda c: c[2] if c[2] is not None else float("inf"))
+        fits = False
+    else:
+        return None
+    bandwidth = constraints.bandwidth or throughput.estimate()
+    return {
+        "format_id": video["format_id"] + (f"+{audio['format_id']}" if audio else ""),
+        "video": video,
+        "audio": audio,
+        "height": video["height"],
+        "filesize": size,
+        "filesize_estimated": video["filesize_estimated"] or bool(audio and audio["filesize_estimated"]),
+        "estimated_seconds": round(size / bandwidth, 1) if size and bandwidth else None,
+        "fits": fits,
+        # Without ffmpeg only single-file formats are candidates
+        "can_merge": merge,
+        "constraints": constraints.to_dict(),
+    }
+
+
+class ThroughputEstimator:
+    """Smoothed download bandwidth, fed by finished downloads
+
+    Starts from PLAYYT_BANDWIDTH (bytes per second, e.g. ``5M``) if set.
+    """
+
+    def __init__(self, initial: Optional[float] = None, alpha: float = 0.3):
+        self.alpha = alpha
+        self._value = initial
+        self._lock = threading.Lock()
+        self.samples = 0
+
+    def record(self, nbytes: int, seconds: float) -> None:
+        # Tiny files finish before the connection ramps up and would drag the estimate down
+        if nbytes < 1024 * 1024 or seconds <= 0:
+            return
+        rate = nbytes / seconds
+        with self._lock:
+            self._value = rate if self._value is None else self.alpha * rate + (1 - self.alpha) * self._value
+            self.samples += 1
+
+    def estimate(self) -> Optional[float]:
+        return self._value
+
+
+throughput = ThroughputEstimator(initial=parse_size(os.environ.get("PLAYYT_BANDWIDTH", "")) or None)
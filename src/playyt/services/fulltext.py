@@ -0,0 +1,212 @@
+from __future__ import annotations
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from bisect import bisect_left, insort
+import heapq
+import math
+import re
+import threading
+import unicodedata
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Bound the work a very short typeahead prefix or typo lookup can trigger
+MAX_PREFIX_EXPANSIONS = 64
+MAX_FUZZY_EXPANSIONS = 8
+FUZZY_MIN_SIMILARITY = 0.4
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, accent-folded word tokens"""
+    if not text:
+        return []
+    folded = unicodedata.normalize("NFKD", text.casefold())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return _TOKEN_RE.findall(folded)
+
+
+def _trigrams(term: str) -> Set[str]:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class InvertedIndex:
+    """In-memory full-text index with BM25 ranking and typeahead matching
+
+    Documents are dicts of field name -> text; each field's term frequencies
+    are scaled by its weight. Query terms match exactly, the last term also
+    matches as a prefix, and terms with no match fall back to trigram
+    similarity so small typos still find something.
+    """
+
+    def __init__(self, field_weights: Optional[Dict[str, float]] = None, k1: float = 1.2, b: float = 0.75):
+        self.field_weights = field_weights or {"title": 3.0, "channel": 2.0, "description": 1.0}
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Hashable, float]] = {}
+        self._doc_terms: Dict[Hashable, Dict[str, float]] = {}
+        self._doc_len: Dict[Hashable, float] = {}
+        self._payloads: Dict[Hashable, Any] = {}
+        self._total_len = 0.0
+        self._terms: List[str] = []  # sorted, for prefix lookups
+        self._trigram_terms: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self._doc_terms
+
+    def add(self, doc_id: Hashable, fields: Dict[str, str], payload: Any = None) -> None:
+        """Index a document, replacing any previous version with the same id"""
+        freqs: Dict[str, float] = {}
+        for field, text in fields.items():
+            weight = self.field_weights.get(field, 1.0)
+            for token in tokenize(text or ""):
+                freqs[token] = freqs.get(token, 0.0) + weight
+        with self._lock:
+            self._remove(doc_id)
+            self._doc_terms[doc_id] = freqs
+            length = sum(freqs.values())
+            self._doc_len[doc_id] = length
+            self._total_len += length
+            self._payloads[doc_id] = payload
+            for term, tf in freqs.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    insort(self._terms, term)
+                    for gram in _trigrams(term):
+                        self._trigram_terms.setdefault(gram, set()).add(term)
+                postings[doc_id] = tf
+
+    def remove(self, doc_id: Hashable) -> None:
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: Hashable) -> None:
+        freqs = self._doc_terms.pop(doc_id, None)
+        if freqs is None:
+            return
+        self._total_len -= self._doc_len.pop(doc_id, 0.0)
+        self._payloads.pop(doc_id, None)
+        for term in freqs:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                i = bisect_left(self._terms, term)
+                if i < len(self._terms) and self._terms[i] == term:
+                    del self._terms[i]
+                for gram in _trigrams(term):
+                    grams = self._trigram_terms.get(gram)
+                    if grams is not None:
+                        grams.discard(term)
+                        if not grams:
+                            del self._trigram_terms[gram]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_len.clear()
+            self._payloads.clear()
+            self._terms.clear()
+            self._trigram_terms.clear()
+            self._total_len = 0.0
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        # One- and two-letter prefixes match a huge share of the vocabulary
+        cap = MAX_PREFIX_EXPANSIONS if len(prefix) > 2 else MAX_PREFIX_EXPANSIONS // 4
+        i = bisect_left(self._terms, prefix)
+        out = []
+        while i < len(self._terms) and self._terms[i].startswith(prefix) and len(out) < cap:
+            out.append(self._terms[i])
+            i += 1
+        return out
+
+    def _fuzzy_terms(self, term: str) -> List[Tuple[str, float]]:
+        grams = _trigrams(term)
+        counts: Dict[str, int] = {}
+        for gram in grams:
+            for candidate in self._trigram_terms.get(gram, ()):
+                counts[candidate] = counts.get(candidate, 0) + 1
+        scored = []
+        for candidate, shared in counts.items():
+            similarity = shared / (len(grams) + len(_trigrams(candidate)) - shared)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((candidate, similarity))
+        return heapq.nlargest(MAX_FUZZY_EXPANSIONS, scored, key=lambda x: x[1])
+
+    def _expand(self, tokens: List[str], prefix: bool) -> List[List[Tuple[str, float]]]:
+        """For each query token, the index terms it matches with a match weight"""
+        expanded = []
+        for i, token in enumerate(tokens):
+            matches: List[Tuple[str, float]] = []
+            if token in self._postings:
+                matches.append((token, 1.0))
+            if prefix and i == len(tokens) - 1:
+                matches.extend((t, 0.8) for t in self._prefix_terms(token) if t != token)
+            if not matches and len(token) >= 3:
+                matches.extend((t, 0.5 * sim) for t, sim in self._fuzzy_terms(token))
+            expanded.append(matches)
+        return expanded
+
+    def search(self, query: str, limit: int = 20, prefix: bool = True) -> List[Tuple[Hashable, float, Any]]:
+        """Top ``limit`` (doc_id, score, payload) by BM25, best first
+
+        Every query token must match something in a document (AND semantics).
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs if n_docs else 1.0
+            expanded = self._expand(tokens, prefix)
+            if any(not matches for matches in expanded):
+                return []
+
+            # Start from the rarest token so the candidate set stays small
+            order = sorted(
+                range(len(expanded)),
+                key=lambda i: sum(len(self._postings[t]) for t, _ in expanded[i]),
+            )
+            scores: Optional[Dict[Hashable, float]] = None
+            for i in order:
+                token_scores: Dict[Hashable, float] = {}
+                for term, match_weight in expanded[i]:
+                    postings = self._postings[term]
+                    df = len(postings)
+                    idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                    if scores is not None and len(scores) < df:
+                        # Probe the (smaller) candidate set instead of the postings
+                        pairs = [(d, postings[d]) for d in scores if d in postings]
+                    else:
+                        pairs = postings.items()
+                    for doc_id, tf in pairs:
+                        if scores is not None and doc_id not in scores:
+                            continue
+                        norm = tf + self.k1 * (1.0 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                        score = match_weight * idf * tf * (self.k1 + 1.0) / norm
+                        # A token's best-matching expansion counts, not the sum
+                        if score > token_scores.get(doc_id, 0.0):
+                            token_scores[doc_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {d: s + token_scores[d] for d, s in scores.items() if d in token_scores}
+                if not scores:
+                    return []
+
+            top = heapq.nlargest(limit, scores.items(), key=lambda x: x[1])
+            return [(doc_id, score, self._payloads.get(doc_id)) for doc_id, score in top]
+
+    def bulk_load(self, docs: Iterable[Tuple[Hashable, Dict[str, str], Any]]) -> None:
+        with self._lock:
+            for doc_id, fields, payload in docs:
+                self.add(doc_id, fields, payload)
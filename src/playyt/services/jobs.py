@@ -0,0 +1,517 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from playyt.services import youtube
+from playyt.services.downloads import prepare_for_streaming, record_download
+from playyt.services.events import EventBus, event_bus
+from playyt.services.formats import throughput
+from playyt.services.quota import QuotaManager, quota_manager
+from playyt.services.ratelimit import HostLimiter
+from playyt.services.shared import SharedStore, per_worker, shared_store
+from playyt.services.thumbnails import thumbnail_cache
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_TERMINAL_STATES = {FINISHED, FAILED, CANCELLED}
+
+DEFAULT_HOST = "www.youtube.com"
+
+# yt-dlp calls progress hooks many times a second; state changes are
+# published at once, byte counts at most this often per job
+PROGRESS_EVENT_INTERVAL = 0.25
+
+
+class JobCancelled(Exception):
+    """Raised from the progress hook to abort a running download"""
+
+
+class DownloadJob:
+    """State of one background download, updated from yt-dlp hooks"""
+
+    def __init__(self, video_id: str, format_id: str, host: str = DEFAULT_HOST):
+        self.id = uuid.uuid4().hex
+        self.video_id = video_id
+        self.format_id = format_id
+        self.host = host
+        self.state = QUEUED
+        self.stage: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.downloaded_bytes = 0
+        self.total_bytes: Optional[int] = None
+        self.speed: Optional[float] = None
+        self.eta: Optional[int] = None
+        self.filename: Optional[str] = None
+        self.title: Optional[str] = None
+        self.error: Optional[str] = None
+        self.already_downloaded = False
+        self.cancel_requested = threading.Event()
+        self.future: Optional[Future] = None
+        self.published_at = 0.0
+        # Snapshot of a job another worker process runs
+        self.remote = False
+
+    # Fields copied to and from other workers' snapshots
+    _SHARED_FIELDS = (
+        "video_id", "format_id", "state", "stage", "title", "filename", "downloaded_bytes", "total_bytes",
+        "speed", "eta", "error", "already_downloaded", "created", "started", "finished",
+    )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DownloadJob":
+        job = cls(data["video_id"], data["format_id"])
+        job.id = data["job_id"]
+        job.remote = True
+        job.update_from(data)
+        return job
+
+    def update_from(self, data: Dict[str, Any]) -> None:
+        for name in self._SHARED_FIELDS:
+            if name in data:
+                setattr(self, name, data[name])
+
+    def progress_hook(self, d: Dict[str, Any]) -> None:
+        if self.cancel_requested.is_set():
+            raise JobCancelled("Download cancelled")
+        status = d.get("status")
+        if "postprocessor" in d:
+            # Postprocessor hooks report e.g. Merger/FixupM3u8 stages
+            self.stage = f"postprocessing:{d.get('postprocessor')}"
+            return
+        if status == "downloading":
+            self.stage = "downloading"
+            self.downloaded_bytes = d.get("downloaded_bytes") or 0
+            self.total_bytes = d.get("total_bytes") or d.get("total_bytes_estimate")
+            self.speed = d.get("speed")
+            self.eta = d.get("eta")
+        elif status == "finished":
+            self.downloaded_bytes = d.get("total_bytes") or d.get("downloaded_bytes") or self.downloaded_bytes
+            self.total_bytes = self.downloaded_bytes
+            self.eta = 0
+        title = (d.get("info_dict") or {}).get("title")
+        if title and not self.title:
+            self.title = title
+
+    @property
+    def percent(self) -> Optional[float]:
+        if self.state == FINISHED:
+            return 100.0
+        if not self.total_bytes:
+            return None
+        return round(min(100.0, 100.0 * self.downloaded_bytes / self.total_bytes), 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "video_id": self.video_id,
+            "format_id": self.format_id,
+            "state": self.state,
+            "stage": self.stage,
+            "title": self.title,
+            "filename": self.filename,
+            "downloaded_bytes": self.downloaded_bytes,
+            "total_bytes": self.total_bytes,
+            "percent": self.percent,
+            "speed": self.speed,
+            "eta": self.eta,
+            "error": self.error,
+            "already_downloaded": self.already_downloaded,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class DownloadBatch:
+    """A group of jobs submitted together, with aggregate progress"""
+
+    def __init__(self, jobs: List[DownloadJob], format_id: str, source: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.jobs = jobs
+        self.format_id = format_id
+        self.source = source
+        self.created = time.time()
+
+    def to_dict(self, include_jobs: bool = False) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        downloaded = 0
+        total = 0
+        speed = 0.0
+        started = [j.started for j in self.jobs if j.started]
+        for j in self.jobs:
+            counts[j.state] = counts.get(j.state, 0) + 1
+            if j.already_downloaded:
+                continue
+            downloaded += j.downloaded_bytes or 0
+            total += j.total_bytes or 0
+            if j.state == RUNNING and j.speed:
+                speed += j.speed
+        done = all(j.state in _TERMINAL_STATES for j in self.jobs)
+        finished = [j.finished for j in self.jobs if j.finished]
+        end = max(finished) if done and finished else time.time()
+        elapsed = end - min(started) if started else 0.0
+        out = {
+            "batch_id": self.id,
+            "source": self.source,
+            "format_id": self.format_id,
+            "created": self.created,
+            "size": len(self.jobs),
+            "counts": counts,
+            "done": done,
+            "downloaded_bytes": downloaded,
+            "total_bytes": total,
+            # Current rate across running jobs, and the average since the first start
+            "speed": speed,
+            "throughput": downloaded / elapsed if elapsed > 0 else None,
+            "elapsed": elapsed,
+        }
+        if include_jobs:
+            out["jobs"] = [j.to_dict() for j in self.jobs]
+        return out
+
+
+class DownloadJobManager:
+    """Runs downloads on a bounded worker pool and keeps a table of recent jobs"""
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_history: int = 200,
+        download_func: Optional[Callable[..., dict]] = None,
+        existing_func: Optional[Callable[..., Optional[str]]] = None,
+        host_limiter: Optional[HostLimiter] = None,
+        max_batches: int = 50,
+        quota: Optional[QuotaManager] = None,
+        events: Optional[EventBus] = None,
+        store: Optional[SharedStore] = None,
+    ):
+        self.max_workers = max(1, int(max_workers))
+        self.max_history = max_history
+        self.max_batches = max_batches
+        self.host_limiter = host_limiter or HostLimiter()
+        self.quota = quota or quota_manager
+        self.events = events or event_bus
+        # Set in multi-worker mode: jobs, batches and dedupe span all workers
+        self.store = store
+        self._batches: "OrderedDict[str, DownloadBatch]" = OrderedDict()
+        self._download = download_func or youtube.download_video
+        self._find_existing = existing_func or youtube.find_existing_download
+        self._jobs: "OrderedDict[str, DownloadJob]" = OrderedDict()
+        # (video_id, format_id) -> the queued or running job for it
+        self._active: Dict[tuple, DownloadJob] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="playyt-download"
+                )
+            return self._executor
+
+    def configure(self, max_workers: int) -> None:
+        """Change pool size; running jobs finish on the old pool"""
+        with self._lock:
+            self.max_workers = max(1, int(max_workers))
+            old, self._executor = self._executor, None
+        if old is not None:
+            old.shutdown(wait=False)
+
+    def submit(self, video_id: str, format_id: str = "best") -> DownloadJob:
+        """Start a download, or return the job already fetching the same file
+
+        A video that is already on disk in this format finishes immediately
+        without taking a worker.
+        """
+        key = (video_id, format_id)
+        with self._lock:
+            active = self._active_job(key)
+            if active is not None:
+                return active
+        existing = self._find_existing(video_id, format_id)
+        job = DownloadJob(video_id, format_id)
+        if self.store is not None and not existing:
+            other = self.store.claim_job(job.to_dict())
+            if other is not None:
+                return self._snapshot(other)
+        with self._lock:
+            active = self._active_job(key)
+            if active is not None:
+                return active
+            self._jobs[job.id] = job
+            self._trim_history()
+            if existing:
+                job.state = FINISHED
+                job.filename = existing
+                job.already_downloaded = True
+                job.started = job.finished = time.time()
+            else:
+                self._active[key] = job
+        if self.store is not None and existing:
+            self.store.claim_job(job.to_dict())
+        self._publish(job)
+        if not existing:
+            job.future = self._get_executor().submit(self._run, job)
+        return job
+
+    def submit_batch(self, video_ids: List[str], format_id: str = "best", source: Optional[str] = None) -> DownloadBatch:
+        """Queue many downloads at once; duplicates within and across batches share jobs"""
+        seen = set()
+        jobs = []
+        for video_id in video_ids:
+            if video_id and video_id not in seen:
+                seen.add(video_id)
+                jobs.append(self.submit(video_id, format_id))
+        batch = DownloadBatch(jobs, format_id, source)
+        with self._lock:
+            self._batches[batch.id] = batch
+            while len(self._batches) > self.max_batches:
+                self._batches.popitem(last=False)
+        if self.store is not None:
+            self.store.save_batch(batch.id, {
+                "batch_id": batch.id,
+                "job_ids": [j.id for j in jobs],
+                "format_id": format_id,
+                "source": source,
+                "created": batch.created,
+            }, batch.created)
+        return batch
+
+    def _batch_from_dict(self, data: Dict[str, Any]) -> DownloadBatch:
+        snapshots = self.store.get_jobs(data["job_ids"])
+        jobs = [self._snapshot(snapshots[i]) for i in data["job_ids"] if i in snapshots]
+        batch = DownloadBatch(jobs, data["format_id"], data["source"])
+        batch.id = data["batch_id"]
+        batch.created = data["created"]
+        return batch
+
+    def get_batch(self, batch_id: str) -> Optional[DownloadBatch]:
+        with self._lock:
+            batch = self._batches.get(batch_id)
+        if batch is not None or self.store is None:
+            if batch is not None:
+                self._sync(batch.jobs)
+            return batch
+        data = self.store.get_batch(batch_id)
+        return self._batch_from_dict(data) if data else None
+
+    def list_batches(self) -> List[DownloadBatch]:
+        if self.store is not None:
+            return [self._batch_from_dict(data) for data in self.store.list_batches(self.max_batches)]
+        with self._lock:
+            return list(reversed(self._batches.values()))
+
+    def cancel_batch(self, batch_id: str) -> Optional[DownloadBatch]:
+        batch = self.get_batch(batch_id)
+        if batch is not None:
+            for job in batch.jobs:
+                self.cancel(job.id)
+        return batch
+
+    def _active_job(self, key: tuple) -> Optional[DownloadJob]:
+        # Called with the lock held; a job being cancelled is not shared
+        job = self._active.get(key)
+        if job is None or job.state in _TERMINAL_STATES or job.cancel_requested.is_set():
+            return None
+        return job
+
+    def _release(self, job: DownloadJob) -> None:
+        with self._lock:
+            if self._active.get((job.video_id, job.format_id)) is job:
+                del self._active[(job.video_id, job.format_id)]
+
+    def _run(self, job: DownloadJob) -> None:
+        try:
+            self._run_job(job)
+        finally:
+            self.quota.release(job.id)
+            self._release(job)
+
+    def _snapshot(self, data: Dict[str, Any]) -> DownloadJob:
+        """The local job for ``data`` if this process runs it, else a remote snapshot"""
+        with self._lock:
+            job = self._jobs.get(data["job_id"])
+        return job if job is not None else DownloadJob.from_dict(data)
+
+    def _sync(self, jobs: List[DownloadJob]) -> None:
+        # Refresh snapshots of other workers' jobs from the shared store
+        remote = [j for j in jobs if j.remote and j.state not in _TERMINAL_STATES]
+        if self.store is None or not remote:
+            return
+        latest = self.store.get_jobs([j.id for j in remote])
+        for job in remote:
+            if job.id in latest:
+                job.update_from(latest[job.id])
+
+    def _publish(self, job: DownloadJob, force: bool = True) -> None:
+        now = time.monotonic()
+        if not force and now - job.published_at < PROGRESS_EVENT_INTERVAL:
+            return
+        job.published_at = now
+        data = job.to_dict()
+        # Keyed by job so a slow subscriber only ever gets its latest state
+        self.events.publish("jobs", "job", data, key=job.id)
+        if self.store is not None:
+            self.store.save_job(data)
+            # Cancels requested through another worker arrive here
+            if job.state not in _TERMINAL_STATES and self.store.cancel_requested(job.id):
+                job.cancel_requested.set()
+
+    def _progress_hook(self, job: DownloadJob) -> Callable[[Dict[str, Any]], None]:
+        def hook(d: Dict[str, Any]) -> None:
+            stage = job.stage
+            job.progress_hook(d)
+            if d.get("status") == "downloading" and job.total_bytes:
+                # Raising here aborts the download before the disk fills up
+                self.quota.reserve(job.id, job.total_bytes, job.downloaded_bytes)
+            if d.get("status") == "finished" and d.get("elapsed"):
+                # Bandwidth for sizing "auto" formats to a target download time
+                throughput.record(d.get("total_bytes") or d.get("downloaded_bytes") or 0, d["elapsed"])
+            self._publish(job, force=job.stage != stage or d.get("status") == "finished")
+        return hook
+
+    def _run_job(self, job: DownloadJob) -> None:
+        try:
+            self._execute(job)
+        except Exception as e:
+            # Post-processing and bookkeeping (e.g. a locked state database)
+            # must not leave the job RUNNING forever
+            job.state = FAILED
+            job.error = str(e)
+        finally:
+            job.finished = time.time()
+            job.stage = None
+            try:
+                self._publish(job)
+            except sqlite3.Error:
+                # Subscribers already have the final state; only the shared copy lags
+                pass
+
+    def _execute(self, job: DownloadJob) -> None:
+        if job.cancel_requested.is_set():
+            job.state = CANCELLED
+            return
+        job.state = RUNNING
+        job.started = time.time()
+        job.stage = "waiting"
+        self._publish(job)
+        with self.host_limiter.slot(job.host, job.cancel_requested) as admitted:
+            if admitted:
+                job.stage = "starting"
+                self._publish(job)
+                try:
+                    # Size is unknown yet; at least refuse to start on a full disk
+                    self.quota.ensure_space(0)
+                    result = self._download(job.video_id, job.format_id, progress_hook=self._progress_hook(job))
+                except Exception as e:  # download_video reports errors itself; QuotaExceeded lands here
+                    result = {"success": False, "error": str(e)}
+            else:
+                result = {"success": False, "error": "Download cancelled"}
+        if job.cancel_requested.is_set():
+            job.state = CANCELLED
+        elif result.get("success"):
+            job.title = result.get("title") or job.title
+            job.filename = result.get("filename")
+            job.already_downloaded = bool(result.get("already_downloaded"))
+            if job.filename:
+                if not job.already_downloaded:
+                    # Still RUNNING so nobody streams the file mid-rewrite
+                    job.stage = "postprocessing:faststart"
+                    self._publish(job)
+                    prepare_for_streaming(job.filename)
+                    # Cached now so the player poster works offline later
+                    job.stage = "postprocessing:thumbnail"
+                    self._publish(job)
+                    thumbnail_cache.warm(job.video_id)
+                record_download(job.filename)
+            job.state = FINISHED
+        else:
+            job.state = FAILED
+            job.error = result.get("error")
+
+    def _trim_history(self) -> None:
+        # Called with the lock held; drop the oldest finished jobs first
+        excess = len(self._jobs) - self.max_history
+        if excess <= 0:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.state in _TERMINAL_STATES][:excess]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[DownloadJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            data = self.store.get_job(job_id)
+            job = DownloadJob.from_dict(data) if data else None
+        return job
+
+    def list_jobs(self, state: Optional[str] = None) -> List[DownloadJob]:
+        if self.store is not None:
+            return [self._snapshot(data) for data in self.store.list_jobs(state, self.max_history)]
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if state:
+            jobs = [j for j in jobs if j.state == state]
+        return list(reversed(jobs))
+
+    def cancel(self, job_id: str) -> Optional[DownloadJob]:
+        job = self.get(job_id)
+        if job is None or job.state in _TERMINAL_STATES:
+            return job
+        if job.remote:
+            # The owning worker sees the flag on its next progress update
+            self.store.request_cancel(job_id)
+            return job
+        job.cancel_requested.set()
+        if self.store is not None:
+            # Frees the shared claim at once, as _active_job does locally
+            self.store.request_cancel(job_id)
+        if job.future is not None and job.future.cancel():
+            # Never started; the pool will not run it
+            job.state = CANCELLED
+            job.finished = time.time()
+            self._release(job)
+        self._publish(job)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts: Dict[str, int] = {}
+        for j in jobs:
+            counts[j.state] = counts.get(j.state, 0) + 1
+        return {
+            "max_workers": self.max_workers,
+            "counts": counts,
+            "reused": sum(j.already_downloaded for j in jobs),
+            "batches": len(self._batches),
+            "hosts": self.host_limiter.stats(),
+            "quota": self.quota.stats(),
+            "shared": self.store.stats() if self.store is not None else None,
+        }
+
+
+# Limits are per host machine; with several worker processes each gets its share
+job_manager = DownloadJobManager(
+    max_workers=int(per_worker(int(os.environ.get("PLAYYT_DOWNLOAD_WORKERS", "2")))),
+    host_limiter=HostLimiter(
+        max_per_host=int(per_worker(int(os.environ.get("PLAYYT_HOST_CONCURRENCY", "2")))),
+        # Download starts per second per host; 0 disables the bucket
+        rate=per_worker(float(os.environ.get("PLAYYT_HOST_RATE", "0.5")), minimum=0),
+        burst=per_worker(float(os.environ.get("PLAYYT_HOST_BURST", "3"))),
+    ),
+    store=shared_store,
+)
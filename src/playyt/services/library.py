@@ -0,0 +1,523 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from pathlib import Path
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from playyt.services.metrics import library_scan_seconds
+
+VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v'}
+
+INDEX_FILENAME = ".playyt-library.sqlite3"
+
+# Directory mtime catches adds, removals and renames (yt-dlp renames .part
+# files on completion); the periodic rescan also catches in-place rewrites.
+RESCAN_INTERVAL = float(os.environ.get("PLAYYT_LIBRARY_RESCAN_INTERVAL", "300"))
+
+_SCHEMA_VERSION = 3
+
+# Sort keys exposed to callers, mapped to an SQL expression; every key is
+# paired with filename as a tie-breaker so keyset cursors are total
+SORT_KEYS = {
+    "mtime": "mtime",
+    "size": "size",
+    "title": "filename COLLATE NOCASE",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    filename  TEXT PRIMARY KEY,
+    size      INTEGER NOT NULL,
+    mtime     REAL NOT NULL,
+    extension TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime, filename);
+CREATE INDEX IF NOT EXISTS files_size ON files (size, filename);
+CREATE INDEX IF NOT EXISTS files_title ON files (filename COLLATE NOCASE, filename);
+CREATE TABLE IF NOT EXISTS totals (
+    id          INTEGER PRIMARY KEY CHECK (id = 1),
+    total_files INTEGER NOT NULL,
+    total_size  INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals (id, total_files, total_size) VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+    UPDATE totals SET total_files = total_files + 1, total_size = total_size + new.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+    UPDATE totals SET total_files = total_files - 1, total_size = total_size - old.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE OF size ON files BEGIN
+    UPDATE totals SET total_size = total_size - old.size + new.size WHERE id = 1;
+END;
+CREATE TABLE IF NOT EXISTS state (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS metadata (
+    filename TEXT PRIMARY KEY,
+    video_id TEXT,
+    info     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metadata_video_id ON metadata (video_id);
+CREATE TRIGGER IF NOT EXISTS files_ad_metadata AFTER DELETE ON files BEGIN
+    DELETE FROM metadata WHERE filename = old.filename;
+END;
+CREATE TABLE IF NOT EXISTS containers (
+    filename TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime    REAL NOT NULL,
+    info     TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS files_ad_containers AFTER DELETE ON files BEGIN
+    DELETE FROM containers WHERE filename = old.filename;
+END;
+CREATE TABLE IF NOT EXISTS access (
+    filename    TEXT PRIMARY KEY,
+    plays       INTEGER NOT NULL DEFAULT 0,
+    last_access REAL,
+    pinned      INTEGER NOT NULL DEFAULT 0
+);
+CREATE TRIGGER IF NOT EXISTS files_ad_access AFTER DELETE ON files BEGIN
+    DELETE FROM access WHERE filename = old.filename;
+END;
+CREATE TABLE IF NOT EXISTS changes (
+    id      INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    nonce   TEXT NOT NULL
+);
+INSERT OR IGNORE INTO changes (id, version, nonce) VALUES (1, 0, lower(hex(randomblob(8))));
+CREATE TABLE IF NOT EXISTS changelog (
+    seq      INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT NOT NULL,
+    removed  INTEGER NOT NULL
+);
+"""
+
+# Names per IN (...) list; older SQLite builds allow 999 bound parameters
+QUERY_CHUNK_SIZE = 500
+
+# Rows kept in the changelog, which tells every process sharing the
+# database (worker processes) which files changed, for their listeners
+CHANGELOG_KEEP = 10000
+
+# Eviction orders over files LEFT JOIN access; files never played count as
+# last accessed when they were downloaded
+EVICTION_ORDERS = {
+    "lru": "COALESCE(a.last_access, f.mtime) ASC, f.filename ASC",
+    "lfu": "COALESCE(a.plays, 0) ASC, COALESCE(a.last_access, f.mtime) ASC, f.filename ASC",
+}
+
+# Every write to files or metadata bumps changes.version, giving HTTP
+# caches a cheap validator for anything rendered from the library, and is
+# logged to the changelog
+for _table in ("files", "metadata"):
+    for _event in ("INSERT", "UPDATE", "DELETE"):
+        _row = "old" if _event == "DELETE" else "new"
+        _removed = int(_table == "files" and _event == "DELETE")
+        _SCHEMA += (
+            f"CREATE TRIGGER IF NOT EXISTS {_table}_{_event.lower()}_version AFTER {_event} ON {_table} BEGIN\n"
+            "    UPDATE changes SET version = version + 1 WHERE id = 1;\n"
+            f"    INSERT INTO changelog (filename, removed) VALUES ({_row}.filename, {_removed});\n"
+            "END;\n"
+        )
+
+
+def _chunks(names: List[str]) -> Iterator[List[str]]:
+    for i in range(0, len(names), QUERY_CHUNK_SIZE):
+        yield names[i:i + QUERY_CHUNK_SIZE]
+
+
+def _placeholders(names: List[str]) -> str:
+    return ",".join("?" * len(names))
+
+
+def _stat_entry(entry: os.DirEntry) -> Optional[Tuple[int, float]]:
+    try:
+        if not entry.is_file():
+            return None
+        st = entry.stat()
+    except (OSError, PermissionError):
+        return None
+    return st.st_size, st.st_mtime
+
+
+class LibraryIndex:
+    """SQLite index of the video files in one downloads directory
+
+    Totals are maintained by triggers, so stats are O(1) and listings are
+    O(page) via the mtime index. The table is reconciled against the
+    directory by diffing size/mtime, and only when the directory changed.
+    """
+
+    def __init__(self, directory: Path, db_path: Optional[Path] = None):
+        self.directory = Path(directory)
+        self.db_path = Path(db_path) if db_path else self.directory / INDEX_FILENAME
+        self._lock = threading.RLock()
+        # Worker processes share the database; wait out their write locks
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+        self._seen_seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changelog").fetchone()[0]
+        self._last_scan = 0.0
+        self._listeners: List[Callable[[List[str], List[str]], None]] = []
+
+    def add_listener(self, listener: Callable[[List[str], List[str]], None]) -> None:
+        """Call ``listener(changed, removed)`` with filenames after every index change"""
+        self._listeners.append(listener)
+
+    def _notify(self, changed: List[str], removed: List[str]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(changed, removed)
+            except Exception:
+                # A broken derived index must not break the library itself
+                pass
+
+    def poll_changes(self) -> None:
+        """Notify listeners of changes since the last poll, by this or any other process"""
+        if not self._listeners:
+            return
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, filename, removed FROM changelog WHERE seq > ? ORDER BY seq", (self._seen_seq,)
+            ).fetchall()
+            if not rows:
+                return
+            self._seen_seq = rows[-1][0]
+        # The last entry per file wins: re-added files count as changed
+        latest: Dict[str, int] = {}
+        for _, filename, removed in rows:
+            latest.pop(filename, None)
+            latest[filename] = removed
+        self._notify([f for f, r in latest.items() if not r], [f for f, r in latest.items() if r])
+
+    def _trim_changelog(self) -> None:
+        # Called in every write transaction, so the log stays bounded even
+        # when no process has listeners to read it
+        self._conn.execute(
+            "DELETE FROM changelog WHERE seq <= (SELECT MAX(seq) FROM changelog) - ?", (CHANGELOG_KEEP,)
+        )
+
+    def _init_schema(self) -> None:
+        with self._lock, self._conn:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != _SCHEMA_VERSION:
+                # Derived tables only; metadata cannot be rebuilt from disk and is kept
+                self._conn.executescript(
+                    "DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS totals; DROP TABLE IF EXISTS state;"
+                    + "".join(f"DROP TRIGGER IF EXISTS metadata_{e}_version;" for e in ("insert", "update", "delete"))
+                )
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    def _get_state(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reconcile with the directory if it changed; returns True if a rescan ran"""
+        try:
+            dir_mtime = str(os.stat(self.directory).st_mtime_ns)
+        except OSError:
+            return False
+        # Changes other processes made since our last look
+        self.poll_changes()
+        with self._lock:
+            now = time.monotonic()
+            if (
+                not force
+                and self._get_state("dir_mtime") == dir_mtime
+                and now - self._last_scan < RESCAN_INTERVAL
+            ):
+                return False
+            self._rescan()
+            with self._conn:
+                self._set_state("dir_mtime", dir_mtime)
+            self._last_scan = now
+            return True
+
+    def _rescan(self) -> None:
+        with library_scan_seconds.time():
+            self._rescan_directory()
+
+    def _rescan_directory(self) -> None:
+        on_disk: Dict[str, Tuple[int, float, str]] = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    ext = os.path.splitext(entry.name)[1].lower()
+                    if ext not in VIDEO_EXTENSIONS:
+                        continue
+                    st = _stat_entry(entry)
+                    if st is not None:
+                        on_disk[entry.name] = (st[0], st[1], ext)
+        except (OSError, PermissionError):
+            return
+
+        indexed = {
+            name: (size, mtime)
+            for name, size, mtime in self._conn.execute("SELECT filename, size, mtime FROM files")
+        }
+        removed = [(name,) for name in indexed.keys() - on_disk.keys()]
+        changed = [
+            (name, size, mtime, ext)
+            for name, (size, mtime, ext) in on_disk.items()
+            if indexed.get(name) != (size, mtime)
+        ]
+        if not removed and not changed:
+            return
+        with self._conn:
+            self._conn.executemany("DELETE FROM files WHERE filename = ?", removed)
+            self._conn.executemany(
+                "INSERT INTO files (filename, size, mtime, extension) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(filename) DO UPDATE SET size = excluded.size, mtime = excluded.mtime",
+                changed,
+            )
+            self._trim_changelog()
+        self.poll_changes()
+
+    def add(self, filename: str) -> bool:
+        """Index (or re-index) a single file without rescanning the directory"""
+        path = self.directory / filename
+        ext = path.suffix.lower()
+        if ext not in VIDEO_EXTENSIONS:
+            return False
+        try:
+            st = path.stat()
+        except OSError:
+            self.remove(filename)
+            return False
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO files (filename, size, mtime, extension) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(filename) DO UPDATE SET size = excluded.size, mtime = excluded.mtime",
+                (filename, st.st_size, st.st_mtime, ext),
+            )
+            self._trim_changelog()
+        self.poll_changes()
+        return True
+
+    def remove(self, filename: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files WHERE filename = ?", (filename,))
+            self._trim_changelog()
+        self.poll_changes()
+
+    def page(self, limit: Optional[int] = None, offset: int = 0) -> List[Tuple[str, int, float, str]]:
+        """Rows of (filename, size, mtime, extension), newest first"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT filename, size, mtime, extension FROM files "
+                "ORDER BY mtime DESC, filename DESC LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset),
+            ).fetchall()
+
+    def query(
+        self,
+        sort: str = "mtime",
+        descending: bool = True,
+        extensions: Optional[Iterable[str]] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 50,
+        after: Optional[Tuple[Any, str]] = None,
+    ) -> List[Tuple[str, int, float, str]]:
+        """Filtered, keyset-paginated rows; ``after`` is the (sort value, filename) of the previous page's last row"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        expr = SORT_KEYS[sort]
+        where: List[str] = []
+        params: List[Any] = []
+        if extensions:
+            exts = [e.lower() if e.startswith(".") else "." + e.lower() for e in extensions]
+            where.append(f"extension IN ({','.join('?' * len(exts))})")
+            params.extend(exts)
+        if min_size is not None:
+            where.append("size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            where.append("size <= ?")
+            params.append(max_size)
+        if since is not None:
+            where.append("mtime >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("mtime <= ?")
+            params.append(until)
+        if after is not None:
+            where.append(f"({expr}, filename) {'<' if descending else '>'} (?, ?)")
+            params.extend(after)
+        direction = "DESC" if descending else "ASC"
+        sql = "SELECT filename, size, mtime, extension FROM files"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {expr} {direction}, filename {direction} LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get(self, filenames: Iterable[str]) -> List[Tuple[str, int, float, str]]:
+        names = list(filenames)
+        rows: List[Tuple[str, int, float, str]] = []
+        with self._lock:
+            for chunk in _chunks(names):
+                rows.extend(self._conn.execute(
+                    f"SELECT filename, size, mtime, extension FROM files WHERE filename IN ({_placeholders(chunk)})",
+                    chunk,
+                ).fetchall())
+        return rows
+
+    def set_metadata(self, filename: str, info: Dict[str, Any]) -> None:
+        """Store the compact info dict captured at download time for a file"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO metadata (filename, video_id, info) VALUES (?, ?, ?)",
+                (filename, info.get("video_id"), json.dumps(info, separators=(",", ":"))),
+            )
+            self._trim_changelog()
+        self.poll_changes()
+
+    def get_metadata(self, filenames: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Stored info dicts by filename, in one query; all of them when ``filenames`` is None"""
+        with self._lock:
+            if filenames is None:
+                rows = self._conn.execute("SELECT filename, info FROM metadata").fetchall()
+            else:
+                rows = []
+                for chunk in _chunks(list(filenames)):
+                    rows.extend(self._conn.execute(
+                        f"SELECT filename, info FROM metadata WHERE filename IN ({_placeholders(chunk)})",
+                        chunk,
+                    ).fetchall())
+        return {filename: json.loads(info) for filename, info in rows}
+
+    def find_by_video_id(self, video_id: str) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT m.filename FROM metadata m JOIN files f ON f.filename = m.filename WHERE m.video_id = ?",
+                (video_id,),
+            )]
+
+    def set_container(self, filename: str, size: int, mtime: float, info: Dict[str, Any]) -> None:
+        """Store a container index, valid for the file's current size and mtime"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO containers (filename, size, mtime, info) VALUES (?, ?, ?, ?)",
+                (filename, size, mtime, json.dumps(info, separators=(",", ":"))),
+            )
+
+    def get_container(self, filename: str, size: int, mtime: float) -> Optional[Dict[str, Any]]:
+        """The stored container index, unless the file changed since it was built"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, info FROM containers WHERE filename = ?", (filename,)
+            ).fetchone()
+        if row is None or row[0] != size or row[1] != mtime:
+            return None
+        return json.loads(row[2])
+
+    def record_access(self, filename: str, play: bool = False, at: Optional[float] = None) -> None:
+        """Note that a file was read, counting a new play if ``play`` is set"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO access (filename, plays, last_access) "
+                "SELECT filename, ?, ? FROM files WHERE filename = ? "
+                "ON CONFLICT(filename) DO UPDATE SET plays = plays + excluded.plays, last_access = excluded.last_access",
+                (int(play), time.time() if at is None else at, filename),
+            )
+
+    def set_pinned(self, filename: str, pinned: bool) -> bool:
+        """Pin or unpin a file; pinned files are never evicted. False if not indexed"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO access (filename, pinned) SELECT filename, ? FROM files WHERE filename = ? "
+                "ON CONFLICT(filename) DO UPDATE SET pinned = excluded.pinned",
+                (int(pinned), filename),
+            )
+            return cursor.rowcount > 0
+
+    def get_access(self, filenames: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        rows = []
+        with self._lock:
+            for chunk in _chunks(list(filenames)):
+                rows.extend(self._conn.execute(
+                    f"SELECT filename, plays, last_access, pinned FROM access WHERE filename IN ({_placeholders(chunk)})",
+                    chunk,
+                ).fetchall())
+        return {
+            filename: {"plays": plays, "last_access": last_access, "pinned": bool(pinned)}
+            for filename, plays, last_access, pinned in rows
+        }
+
+    def eviction_candidates(self, policy: str = "lru", idle_before: Optional[float] = None) -> List[Tuple[str, int, int, float]]:
+        """Unpinned files as (filename, size, plays, last access), first to evict first
+
+        Files accessed at or after ``idle_before`` are left out.
+        """
+        if policy not in EVICTION_ORDERS:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        sql = (
+            "SELECT f.filename, f.size, COALESCE(a.plays, 0), COALESCE(a.last_access, f.mtime) "
+            "FROM files f LEFT JOIN access a ON a.filename = f.filename "
+            "WHERE COALESCE(a.pinned, 0) = 0"
+        )
+        params: List[Any] = []
+        if idle_before is not None:
+            sql += " AND COALESCE(a.last_access, f.mtime) < ?"
+            params.append(idle_before)
+        sql += f" ORDER BY {EVICTION_ORDERS[policy]}"
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def pinned_size(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(f.size), 0) FROM files f JOIN access a ON a.filename = f.filename WHERE a.pinned = 1"
+            ).fetchone()[0]
+
+    def version(self) -> str:
+        """Token that changes whenever any file or metadata row does
+
+        The per-database nonce keeps a recreated index from reusing old tokens.
+        """
+        with self._lock:
+            version, nonce = self._conn.execute("SELECT version, nonce FROM changes WHERE id = 1").fetchone()
+        return f"{nonce}-{version}"
+
+    def totals(self) -> Dict[str, Any]:
+        with self._lock:
+            total_files, total_size = self._conn.execute(
+                "SELECT total_files, total_size FROM totals WHERE id = 1"
+            ).fetchone()
+            latest = self._conn.execute("SELECT MAX(mtime) FROM files").fetchone()[0]
+        return {"total_files": total_files, "total_size": total_size, "latest_mtime": latest}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_indexes: Dict[str, LibraryIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_library_index(directory: Path) -> Optional[LibraryIndex]:
+    """Shared index for a downloads directory, or None if it does not exist"""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return None
+    key = str(directory.resolve())
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = LibraryIndex(directory)
+    return index
@@ -0,0 +1,337 @@
+"""Minimal ISO BMFF (MP4) reader/writer for faststart and seek indexes
+
+Only the boxes needed to relocate ``moov`` and to map keyframes to byte
+offsets are understood; everything else is copied verbatim.
+"""
+from __future__ import annotations
+from bisect import bisect_right
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import os
+import struct
+
+MP4_EXTENSIONS = {".mp4", ".m4v", ".mov", ".m4a"}
+
+# Boxes on the path from moov to the chunk offset tables
+_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+COPY_BLOCK_SIZE = 1024 * 1024
+# Keeps the stored index small even for long, keyframe-dense videos
+MAX_KEYFRAMES = 20000
+
+
+class Mp4Error(Exception):
+    """The file is not an MP4 layout we can safely handle"""
+
+
+class Box(NamedTuple):
+    type: bytes
+    offset: int
+    size: int
+    header: int
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+    @property
+    def payload(self) -> int:
+        return self.offset + self.header
+
+
+def iter_file_boxes(f: BinaryIO, start: int, end: int) -> Iterator[Box]:
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise Mp4Error(f"Invalid {kind!r} box at {offset}")
+        yield Box(kind, offset, size, header)
+        offset += size
+
+
+def iter_boxes(data: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[Box]:
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise Mp4Error(f"Invalid {kind!r} box at {offset}")
+        yield Box(kind, offset, size, header)
+        offset += size
+
+
+def _child(data: bytes, parent: Box, kind: bytes) -> Optional[Box]:
+    for box in iter_boxes(data, parent.payload, parent.end):
+        if box.type == kind:
+            return box
+    return None
+
+
+def _children(data: bytes, parent: Box, kind: bytes) -> List[Box]:
+    return [box for box in iter_boxes(data, parent.payload, parent.end) if box.type == kind]
+
+
+def top_level_boxes(path: Path) -> List[Box]:
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        return list(iter_file_boxes(f, 0, size))
+
+
+def _chunk_offsets(data: bytes, box: Box) -> List[int]:
+    count = struct.unpack_from(">I", data, box.payload + 4)[0]
+    fmt = ">%dI" if box.type == b"stco" else ">%dQ"
+    return list(struct.unpack_from(fmt % count, data, box.payload + 8))
+
+
+def _max_chunk_offset(data: bytes, parent: Box) -> int:
+    best = 0
+    for box in iter_boxes(data, parent.payload, parent.end):
+        if box.type in _CONTAINERS:
+            best = max(best, _max_chunk_offset(data, box))
+        elif box.type in (b"stco", b"co64"):
+            offsets = _chunk_offsets(data, box)
+            if offsets:
+                best = max(best, max(offsets))
+    return best
+
+
+def _rebuild(data: bytes, parent: Box, shift: Callable[[int], int], upgrade: bool) -> bytes:
+    """Serialize ``parent`` with every chunk offset mapped through ``shift``
+
+    With ``upgrade`` 32-bit stco tables become co64, for files where the
+    shifted offsets no longer fit in 32 bits.
+    """
+    parts = []
+    for box in iter_boxes(data, parent.payload, parent.end):
+        if box.type in _CONTAINERS:
+            parts.append(_rebuild(data, box, shift, upgrade))
+        elif box.type in (b"stco", b"co64"):
+            version_flags = data[box.payload:box.payload + 4]
+            offsets = [shift(o) for o in _chunk_offsets(data, box)]
+            if box.type == b"co64" or upgrade:
+                body = version_flags + struct.pack(">I%dQ" % len(offsets), len(offsets), *offsets)
+                parts.append(struct.pack(">I4s", 8 + len(body), b"co64") + body)
+            else:
+                body = version_flags + struct.pack(">I%dI" % len(offsets), len(offsets), *offsets)
+                parts.append(struct.pack(">I4s", 8 + len(body), b"stco") + body)
+        else:
+            parts.append(data[box.offset:box.end])
+    payload = b"".join(parts)
+    # Keep any extended-size header data out; containers here always fit 32 bits
+    return struct.pack(">I4s", 8 + len(payload), parent.type) + payload
+
+
+def _copy_range(src: BinaryIO, dst: BinaryIO, offset: int, length: int) -> None:
+    src.seek(offset)
+    while length > 0:
+        block = src.read(min(COPY_BLOCK_SIZE, length))
+        if not block:
+            raise Mp4Error("File truncated while copying")
+        dst.write(block)
+        length -= len(block)
+
+
+def is_faststart(boxes: List[Box]) -> bool:
+    types = [b.type for b in boxes]
+    if b"moov" not in types or b"mdat" not in types:
+        return True
+    return types.index(b"moov") < types.index(b"mdat")
+
+
+def faststart(path: Path) -> bool:
+    """Move ``moov`` in front of the media data, in place; True if the file changed
+
+    The media data is streamed block by block into a temporary file next to
+    the original, which then atomically replaces it. Fragmented files (moof)
+    are left alone.
+    """
+    path = Path(path)
+    boxes = top_level_boxes(path)
+    types = [b.type for b in boxes]
+    if b"moof" in types or is_faststart(boxes):
+        return False
+    if types.count(b"moov") != 1:
+        raise Mp4Error("Expected exactly one moov box")
+    moov_box = boxes[types.index(b"moov")]
+    first_mdat = types.index(b"mdat")
+
+    with open(path, "rb") as src:
+        src.seek(moov_box.offset)
+        moov = src.read(moov_box.size)
+        root = Box(b"moov", 0, moov_box.size, moov_box.header)
+        unchanged = lambda o: o  # noqa: E731
+        new_size = len(_rebuild(moov, root, unchanged, upgrade=False))
+        upgrade = _max_chunk_offset(moov, root) + new_size > 0xFFFFFFFF
+        if upgrade:
+            new_size = len(_rebuild(moov, root, unchanged, upgrade=True))
+
+        def shift(offset: int) -> int:
+            # Data ahead of the old moov moves down by the new moov; data
+            # after it (a second mdat) only by the size difference
+            if offset >= moov_box.end:
+                return offset + new_size - moov_box.size
+            return offset + new_size
+
+        new_moov = _rebuild(moov, root, shift, upgrade)
+
+        tmp = path.with_name(f".{path.name}.faststart.tmp")
+        try:
+            with open(tmp, "wb") as dst:
+                for i, box in enumerate(boxes):
+                    if i == first_mdat:
+                        dst.write(new_moov)
+                    if box.type != b"moov":
+                        _copy_range(src, dst, box.offset, box.size)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+    return True
+
+
+def _full_box_version(data: bytes, box: Box) -> int:
+    return data[box.payload]
+
+
+def _timescale_duration(data: bytes, box: Box) -> Tuple[int, int]:
+    """(timescale, duration) from an mvhd or mdhd box"""
+    p = box.payload + 4
+    if _full_box_version(data, box) == 1:
+        return struct.unpack_from(">IQ", data, p + 16)
+    return struct.unpack_from(">II", data, p + 8)
+
+
+def _handler(data: bytes, mdia: Box) -> Optional[bytes]:
+    hdlr = _child(data, mdia, b"hdlr")
+    return data[hdlr.payload + 8:hdlr.payload + 12] if hdlr else None
+
+
+def _keyframes(data: bytes, stbl: Box, timescale: int) -> List[Tuple[float, int]]:
+    """(seconds, byte offset) for each sync sample of a track"""
+    stts = _child(data, stbl, b"stts")
+    stsz = _child(data, stbl, b"stsz")
+    stsc = _child(data, stbl, b"stsc")
+    stco = _child(data, stbl, b"stco") or _child(data, stbl, b"co64")
+    if not (stts and stsz and stsc and stco) or not timescale:
+        return []
+
+    sample_size, sample_count = struct.unpack_from(">II", data, stsz.payload + 4)
+    sizes = (
+        struct.unpack_from(">%dI" % sample_count, data, stsz.payload + 12) if sample_size == 0 else None
+    )
+    stss = _child(data, stbl, b"stss")
+    if stss is not None:
+        n = struct.unpack_from(">I", data, stss.payload + 4)[0]
+        sync = set(struct.unpack_from(">%dI" % n, data, stss.payload + 8))
+    else:
+        sync = None  # every sample is a sync sample
+
+    # Decode time of each sample from stts runs
+    n = struct.unpack_from(">I", data, stts.payload + 4)[0]
+    runs = struct.unpack_from(">%dI" % (2 * n), data, stts.payload + 8)
+    times = []
+    t = 0
+    for i in range(0, len(runs), 2):
+        count, delta = runs[i], runs[i + 1]
+        for _ in range(count):
+            times.append(t)
+            t += delta
+
+    n = struct.unpack_from(">I", data, stsc.payload + 4)[0]
+    stsc_entries = struct.unpack_from(">%dI" % (3 * n), data, stsc.payload + 8)
+    chunk_offsets = _chunk_offsets(data, stco)
+
+    keyframes: List[Tuple[float, int]] = []
+    sample = 1
+    for e in range(0, len(stsc_entries), 3):
+        first_chunk, per_chunk = stsc_entries[e], stsc_entries[e + 1]
+        last_chunk = stsc_entries[e + 3] - 1 if e + 3 < len(stsc_entries) else len(chunk_offsets)
+        for chunk in range(first_chunk, last_chunk + 1):
+            offset = chunk_offsets[chunk - 1]
+            for _ in range(per_chunk):
+                if sample > sample_count:
+                    break
+                if (sync is None or sample in sync) and sample - 1 < len(times):
+                    keyframes.append((round(times[sample - 1] / timescale, 3), offset))
+                offset += sizes[sample - 1] if sizes is not None else sample_size
+                sample += 1
+    if len(keyframes) > MAX_KEYFRAMES:
+        step = len(keyframes) / MAX_KEYFRAMES
+        keyframes = [keyframes[int(i * step)] for i in range(MAX_KEYFRAMES)]
+    return keyframes
+
+
+def container_index(path: Path) -> Dict[str, Any]:
+    """Layout summary for streaming: moov/mdat position, duration and keyframes"""
+    path = Path(path)
+    boxes = top_level_boxes(path)
+    by_type = {b.type: b for b in reversed(boxes)}  # first occurrence wins
+    moov_box = by_type.get(b"moov")
+    mdat_box = by_type.get(b"mdat")
+    if moov_box is None:
+        raise Mp4Error("No moov box")
+    with open(path, "rb") as f:
+        f.seek(moov_box.offset)
+        moov = f.read(moov_box.size)
+    root = Box(b"moov", 0, moov_box.size, moov_box.header)
+
+    duration = None
+    mvhd = _child(moov, root, b"mvhd")
+    if mvhd is not None:
+        timescale, units = _timescale_duration(moov, mvhd)
+        duration = round(units / timescale, 3) if timescale else None
+
+    keyframes: List[Tuple[float, int]] = []
+    for trak in _children(moov, root, b"trak"):
+        mdia = _child(moov, trak, b"mdia")
+        if mdia is None or _handler(moov, mdia) != b"vide":
+            continue
+        mdhd = _child(moov, mdia, b"mdhd")
+        minf = _child(moov, mdia, b"minf")
+        stbl = _child(moov, minf, b"stbl") if minf else None
+        if mdhd is None or stbl is None:
+            continue
+        keyframes = _keyframes(moov, stbl, _timescale_duration(moov, mdhd)[0])
+        break
+
+    return {
+        "faststart": is_faststart(boxes),
+        "fragmented": b"moof" in by_type,
+        "moov_offset": moov_box.offset,
+        "moov_size": moov_box.size,
+        "mdat_offset": mdat_box.offset if mdat_box else None,
+        "mdat_size": mdat_box.size if mdat_box else None,
+        "duration": duration,
+        "keyframes": keyframes,
+    }
+
+
+def keyframe_span(offsets: List[int], offset: int, media_end: int) -> Optional[Tuple[int, int]]:
+    """Byte span from ``offset`` up to the next keyframe, for readahead
+
+    ``offsets`` are the keyframe byte offsets, sorted.
+    """
+    if not offsets:
+        return None
+    i = bisect_right(offsets, offset)
+    end = offsets[i] if i < len(offsets) else media_end
+    if end <= offset:
+        return None
+    return offset, end - offset
@@ -0,0 +1,119 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+
+
+class Prefetcher:
+    """Warms a cache in the background for keys the user is likely to ask for next
+
+    Each ``schedule`` call starts a new generation: queued work from older
+    generations is cancelled before it runs, since a new search makes the
+    previous results unlikely clicks. Work already running finishes (an
+    extraction cannot be interrupted) but its result still lands in the cache.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[Hashable], Any],
+        is_cached: Callable[[Hashable], bool],
+        max_workers: int = 2,
+        can_run: Optional[Callable[[], bool]] = None,
+        max_tracked: int = 1024,
+    ):
+        self._fetch = fetch
+        self._is_cached = is_cached
+        self._can_run = can_run
+        self.max_workers = max(1, int(max_workers))
+        self.max_tracked = max_tracked
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="playyt-prefetch")
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._pending: Dict[Hashable, Future] = {}
+        # Keys warmed by us and not yet requested, oldest first
+        self._warmed: "OrderedDict[Hashable, None]" = OrderedDict()
+        self.scheduled = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.skipped = 0
+        self.errors = 0
+        self.hits = 0
+        self.wasted = 0
+
+    def schedule(self, keys: Iterable[Hashable]) -> int:
+        """Queue ``keys`` (best first), cancelling earlier queued work; returns how many were queued"""
+        if self._can_run is not None and not self._can_run():
+            with self._lock:
+                self.skipped += 1
+            return 0
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            for key, future in list(self._pending.items()):
+                if future.cancel():
+                    self.cancelled += 1
+                    del self._pending[key]
+            queued = 0
+            for key in keys:
+                if key in self._pending or self._is_cached(key):
+                    continue
+                self._pending[key] = self._pool.submit(self._run, key, generation)
+                queued += 1
+            self.scheduled += queued
+            return queued
+
+    def _run(self, key: Hashable, generation: int) -> None:
+        try:
+            with self._lock:
+                stale = generation != self._generation
+            if stale:
+                with self._lock:
+                    self.cancelled += 1
+                return
+            if self._is_cached(key):
+                return
+            try:
+                self._fetch(key)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                return
+            with self._lock:
+                self.completed += 1
+                self._warmed[key] = None
+                self._warmed.move_to_end(key)
+                while len(self._warmed) > self.max_tracked:
+                    self._warmed.popitem(last=False)
+                    self.wasted += 1
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def note_request(self, key: Hashable) -> None:
+        """Record a real request so prefetches can be scored as used or wasted"""
+        with self._lock:
+            if key in self._warmed:
+                del self._warmed[key]
+                if self._is_cached(key):
+                    self.hits += 1
+                else:
+                    # Warmed but expired or evicted before the click
+                    self.wasted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "pending": len(self._pending),
+                "scheduled": self.scheduled,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "skipped": self.skipped,
+                "errors": self.errors,
+                "hits": self.hits,
+                "wasted": self.wasted,
+                "unused": len(self._warmed),
+                # Share of finished prefetches that a later request actually used
+                "hit_rate": (self.hits / self.completed) if self.completed else 0.0,
+            }
@@ -0,0 +1,102 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import sys
+import threading
+import time
+
+# Stop collecting new distinct stacks past this point to bound memory
+MAX_STACKS = 20000
+MAX_DEPTH = 64
+
+
+class SamplingProfiler:
+    """Low-overhead wall-clock profiler that samples every thread's stack
+
+    Samples are aggregated as folded stacks ("outer;inner count"), the input
+    format of flamegraph.pl and speedscope. Nothing runs until ``start``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stacks: Dict[str, int] = {}
+        self.interval = 0.01
+        self.samples = 0
+        self.dropped = 0
+        self.started: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = 0.01) -> bool:
+        """Begin sampling; False if already running"""
+        with self._lock:
+            if self.running:
+                return False
+            self.interval = max(0.001, float(interval))
+            self._stop.clear()
+            self.started = time.time()
+            self._thread = threading.Thread(target=self._loop, name="playyt-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=1.0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+            self.dropped = 0
+
+    def _loop(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            folded = []
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                names = []
+                while frame is not None and len(names) < MAX_DEPTH:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                folded.append(";".join(reversed(names)))
+            del frames
+            with self._lock:
+                for stack in folded:
+                    if stack in self._stacks:
+                        self._stacks[stack] += 1
+                    elif len(self._stacks) < MAX_STACKS:
+                        self._stacks[stack] = 1
+                    else:
+                        self.dropped += 1
+                self.samples += 1
+
+    def folded(self, limit: Optional[int] = None) -> str:
+        """Collected stacks, most frequent first"""
+        with self._lock:
+            items = sorted(self._stacks.items(), key=lambda x: x[1], reverse=True)
+        if limit:
+            items = items[:limit]
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self.running,
+                "interval": self.interval,
+                "started": self.started,
+                "samples": self.samples,
+                "stacks": len(self._stacks),
+                "dropped": self.dropped,
+            }
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,213 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import os
+import shutil
+import threading
+import time
+
+from playyt.services.cache import TTLCache
+from playyt.services.downloads import delete_download, get_downloads_directory
+from playyt.services.library import EVICTION_ORDERS, LibraryIndex, get_library_index
+from playyt.services.metrics import REGISTRY
+from playyt.services.shared import shared_store
+from playyt.services.units import parse_size
+
+# A new play is counted when a file was not played for this long; range
+# requests within one viewing only refresh the access time, at most this often
+PLAY_SESSION_GAP = 30 * 60
+ACCESS_WRITE_INTERVAL = 60
+# Files whose recent access is remembered; older entries expire anyway
+ACCESS_TRACKED_FILES = 4096
+# In-flight downloads re-check free space this often even if their size
+# estimate holds, since other writers share the filesystem
+RECHECK_INTERVAL = 10.0
+
+EVICTION_POLICIES = tuple(EVICTION_ORDERS)
+
+evicted_files = REGISTRY.counter(
+    "playyt_quota_evicted_files_total", "Downloads deleted to stay within the disk quota", ("policy",)
+)
+evicted_bytes = REGISTRY.counter(
+    "playyt_quota_evicted_bytes_total", "Bytes freed by quota eviction", ("policy",)
+)
+
+
+class QuotaExceeded(Exception):
+    """Not enough room for a download, even after evicting what may be evicted"""
+
+
+def _index() -> Optional[LibraryIndex]:
+    return get_library_index(get_downloads_directory())
+
+
+class QuotaManager:
+    """Keeps the downloads directory within a byte quota and a free-space floor
+
+    ``max_bytes`` caps the library plus in-flight downloads; ``min_free``
+    keeps that much free on the filesystem. Eviction only happens when a
+    quota is configured: it deletes unpinned, idle files in ``policy`` order
+    (``lru``: least recently played, ``lfu``: least often played). Without a
+    quota, a download that would breach the floor fails up front instead of
+    halfway through.
+    """
+
+    def __init__(self, max_bytes: int = 0, min_free: int = 0, policy: str = "lru", min_idle: float = 3600):
+        self.max_bytes = max_bytes
+        self.min_free = min_free
+        self.policy = policy
+        self.min_idle = min_idle
+        self._lock = threading.Lock()
+        # Held from planning until the space is claimed, so concurrent
+        # downloads never count the same free bytes twice
+        self._space_lock = threading.RLock()
+        # In-flight downloads: key -> [expected total bytes, bytes written, last checked]
+        self._reserved: Dict[str, List[int]] = {}
+        # Entries only matter within their window, so they expire with it
+        self._last_play = TTLCache(max_size=ACCESS_TRACKED_FILES, ttl=PLAY_SESSION_GAP)
+        self._last_write = TTLCache(max_size=ACCESS_TRACKED_FILES, ttl=ACCESS_WRITE_INTERVAL)
+        self.evictions = 0
+        self.refusals = 0
+
+    def _disk_free(self) -> Optional[int]:
+        directory = get_downloads_directory()
+        try:
+            return shutil.disk_usage(directory if directory.exists() else ".").free
+        except OSError:
+            return None
+
+    def usage(self) -> Dict[str, Any]:
+        index = _index()
+        library = index.totals()["total_size"] if index is not None else 0
+        with self._lock:
+            reserved = sum(r[0] for r in self._reserved.values())
+            pending = sum(max(0, r[0] - r[1]) for r in self._reserved.values())
+        if shared_store is not None:
+            # Other workers' downloads land on the same disk
+            pending += shared_store.pending_bytes()
+        return {
+            "library_bytes": library,
+            "pinned_bytes": index.pinned_size() if index is not None else 0,
+            "in_flight_bytes": reserved,
+            # Still to be written by in-flight downloads
+            "pending_bytes": pending,
+            "disk_free": self._disk_free(),
+        }
+
+    def plan(self, needed: int = 0, policy: Optional[str] = None) -> Dict[str, Any]:
+        """What making room for ``needed`` more bytes would evict; deletes nothing"""
+        policy = policy or self.policy
+        usage = self.usage()
+        over_quota = 0
+        if self.max_bytes:
+            over_quota = usage["library_bytes"] + usage["pending_bytes"] + needed - self.max_bytes
+        over_floor = 0
+        if self.min_free and usage["disk_free"] is not None:
+            over_floor = self.min_free - (usage["disk_free"] - usage["pending_bytes"] - needed)
+        to_free = max(0, over_quota, over_floor)
+
+        evict: List[Dict[str, Any]] = []
+        freed = 0
+        index = _index()
+        if to_free and self.max_bytes and index is not None:
+            for filename, size, plays, last_access in index.eviction_candidates(
+                policy, idle_before=time.time() - self.min_idle
+            ):
+                if freed >= to_free:
+                    break
+                evict.append({"filename": filename, "size": size, "plays": plays, "last_access": last_access})
+                freed += size
+        return {
+            "policy": policy,
+            "max_bytes": self.max_bytes,
+            "min_free": self.min_free,
+            "needed": needed,
+            **usage,
+            "to_free": to_free,
+            "evict": evict,
+            "evict_bytes": freed,
+            "fits": freed >= to_free,
+        }
+
+    def ensure_space(self, needed: int = 0) -> Dict[str, Any]:
+        """Evict per ``plan`` until ``needed`` bytes fit; raises QuotaExceeded if they cannot"""
+        with self._space_lock:
+            plan = self.plan(needed)
+            if not plan["fits"]:
+                # Deleting files would not make it fit, so keep them
+                self.refusals += 1
+                raise QuotaExceeded(
+                    f"Not enough disk space: {plan['to_free'] - plan['evict_bytes']} more bytes needed"
+                )
+            for item in plan["evict"]:
+                result = delete_download(item["filename"])
+                if result.get("success"):
+                    self._last_play.invalidate(item["filename"])
+                    self._last_write.invalidate(item["filename"])
+                    self.evictions += 1
+                    evicted_files.inc(policy=plan["policy"])
+                    evicted_bytes.inc(item["size"], policy=plan["policy"])
+        return plan
+
+    def reserve(self, key: str, total: int, written: int = 0) -> None:
+        """Check and account for an in-flight download once its size is known
+
+        The first call for ``key`` makes room for the whole remaining size;
+        later calls update progress and check again when the estimate grew
+        or every RECHECK_INTERVAL seconds.
+        """
+        now = time.monotonic()
+        with self._lock:
+            current = self._reserved.get(key)
+            if current is not None:
+                current[1] = written
+                if total <= current[0] and now - current[2] < RECHECK_INTERVAL:
+                    return
+        with self._space_lock:
+            needed = total - written if current is None else max(0, total - current[0])
+            self.ensure_space(max(0, needed))
+            with self._lock:
+                self._reserved[key] = [max(total, current[0]) if current else total, written, now]
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._reserved.pop(key, None)
+
+    def record_access(self, filename: str, play: bool = False) -> None:
+        """Feed the eviction policy; cheap enough to call on every range request"""
+        now = time.time()
+        with self._lock:
+            play = play and self._last_play.get(filename) is None
+            if not play and self._last_write.get(filename) is not None:
+                return
+            if play:
+                self._last_play.set(filename, now)
+            self._last_write.set(filename, now)
+        index = _index()
+        if index is not None:
+            index.record_access(filename, play=play, at=now)
+
+    def set_pinned(self, filename: str, pinned: bool) -> bool:
+        index = _index()
+        if index is None:
+            return False
+        index.refresh()
+        return index.set_pinned(filename, pinned)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_bytes": self.max_bytes,
+            "min_free": self.min_free,
+            "policy": self.policy,
+            "in_flight": len(self._reserved),
+            "evictions": self.evictions,
+            "refusals": self.refusals,
+        }
+
+
+quota_manager = QuotaManager(
+    max_bytes=parse_size(os.environ.get("PLAYYT_DISK_QUOTA", "0")),
+    min_free=parse_size(os.environ.get("PLAYYT_DISK_MIN_FREE", "1G")),
+    policy=os.environ.get("PLAYYT_EVICTION_POLICY", "lru"),
+    # Recently played files are never evicted, so a video being watched stays put
+    min_idle=float(os.environ.get("PLAYYT_EVICTION_MIN_IDLE", "3600")),
+)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+import threading
+import time
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, bursts of up to ``burst``
+
+    A rate of 0 or less disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available; otherwise return the seconds to wait"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0, cancel: Optional[threading.Event] = None) -> bool:
+        """Block until tokens are available; False if ``cancel`` was set first"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return True
+            self.waited += wait
+            # Short sleeps so a cancelled caller does not sit out a long refill
+            if cancel is not None:
+                if cancel.wait(min(wait, 0.5)):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class HostLimiter:
+    """Per-host concurrency cap plus a per-host token bucket for request starts"""
+
+    def __init__(self, max_per_host: int = 2, rate: float = 0.0, burst: float = 1.0):
+        self.max_per_host = max(1, int(max_per_host))
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, tuple] = {}
+        self._active: Dict[str, int] = {}
+
+    def _host(self, host: str) -> tuple:
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None:
+                entry = self._hosts[host] = (
+                    threading.BoundedSemaphore(self.max_per_host),
+                    TokenBucket(self.rate, self.burst),
+                )
+            return entry
+
+    @contextmanager
+    def slot(self, host: str, cancel: Optional[threading.Event] = None) -> Iterator[bool]:
+        """Hold one of ``host``'s slots; yields False if cancelled while waiting"""
+        semaphore, bucket = self._host(host)
+        while not semaphore.acquire(timeout=0.5):
+            if cancel is not None and cancel.is_set():
+                yield False
+                return
+        try:
+            if not bucket.acquire(cancel=cancel):
+                yield False
+                return
+            with self._lock:
+                self._active[host] = self._active.get(host, 0) + 1
+            try:
+                yield True
+            finally:
+                with self._lock:
+                    self._active[host] -= 1
+        finally:
+            semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_per_host": self.max_per_host,
+                "rate": self.rate,
+                "burst": self.burst,
+                "hosts": {
+                    host: {"active": self._active.get(host, 0), "waited": round(bucket.waited, 3)}
+                    for host, (_, bucket) in self._hosts.items()
+                },
+            }
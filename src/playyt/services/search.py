@@ -1,4 +1,9 @@
-from typing import List
+from typing import Any, Dict, List, Optional
+import threading
+
+from playyt.services.downloads import download_item, get_downloads_directory, get_video_info_from_filename
+from playyt.services.fulltext import InvertedIndex
+from playyt.services.library import LibraryIndex, get_library_index
 
 # Simple in-memory dataset for demo purposes
 _SAMPLE_VIDEOS = [
@@ -8,12 +13,17 @@ _SAMPLE_VIDEOS = [
     {"id": "d4", "title": "Top 10 FastAPI Tips", "channel": "PlayYT Labs", "duration": "7:30", "description": "Tips and tricks for building with FastAPI."},
 ]
 
+_catalog_index = InvertedIndex()
+_catalog_index.bulk_load(
+    (v["id"], {"title": v["title"], "channel": v["channel"], "description": v["description"]}, v)
+    for v in _SAMPLE_VIDEOS
+)
+
 
 def search_videos(query: str) -> List[dict]:
     if not query:
         return []
-    q = query.lower()
-    return [v for v in _SAMPLE_VIDEOS if q in v["title"].lower() or q in v["channel"].lower()]
+    return [payload for _, _, payload in _catalog_index.search(query)]
 
 
 def get_video(video_id: str) -> dict | None:
@@ -22,3 +32,61 @@ def get_video(video_id: str) -> dict | None:
             return v
     return None
 
+
+# Full-text index over the downloads library, built once from the library
+# index and then kept current through its change notifications
+_library_text_index: Optional[InvertedIndex] = None
+_library_source: Optional[LibraryIndex] = None
+_library_lock = threading.Lock()
+
+
+def _library_document(filename: str, metadata: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    info = get_video_info_from_filename(filename, metadata)
+    return {
+        "title": info.get("title") or "",
+        "channel": info.get("channel") or "",
+        "description": info.get("description") or "",
+    }
+
+
+def _on_library_change(changed: List[str], removed: List[str]) -> None:
+    index, source = _library_text_index, _library_source
+    if index is None or source is None:
+        return
+    for filename in removed:
+        index.remove(filename)
+    rows = source.get(changed)
+    metadata = source.get_metadata(row[0] for row in rows)
+    for row in rows:
+        meta = metadata.get(row[0])
+        index.add(row[0], _library_document(row[0], meta), download_item(row, meta))
+
+
+def _get_library_text_index() -> Optional[InvertedIndex]:
+    global _library_text_index, _library_source
+    source = get_library_index(get_downloads_directory())
+    if source is None:
+        return None
+    with _library_lock:
+        if _library_source is not source:
+            index = InvertedIndex()
+            metadata = source.get_metadata()
+            index.bulk_load(
+                (row[0], _library_document(row[0], metadata.get(row[0])), download_item(row, metadata.get(row[0])))
+                for row in source.page()
+            )
+            _library_text_index, _library_source = index, source
+            source.add_listener(_on_library_change)
+    # Picks up files added outside the app; changes arrive via the listener
+    source.refresh()
+    return _library_text_index
+
+
+def search_library(query: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """Ranked full-text search over downloaded videos; the last word matches as a prefix"""
+    if not query:
+        return []
+    index = _get_library_text_index()
+    if index is None:
+        return []
+    return [dict(payload, score=round(score, 4)) for _, score, payload in index.search(query, limit=limit)]
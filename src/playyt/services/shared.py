@@ -0,0 +1,395 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from playyt.services.cache import TTLCache
+from playyt.services.downloads import get_downloads_directory
+
+# Number of server processes sharing this host's downloads directory. With
+# more than one, caches, jobs and dedupe go through a shared SQLite store.
+WORKERS = max(1, int(os.environ.get("PLAYYT_WORKERS", "1")))
+SHARED_STATE = WORKERS > 1 or os.environ.get("PLAYYT_SHARED_STATE", "").lower() in ("1", "true", "yes")
+
+STATE_FILENAME = ".playyt-state.sqlite3"
+
+_ACTIVE_STATES = ("queued", "running")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace   TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    value       TEXT NOT NULL,
+    expires     REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS cache_stale_until ON cache (stale_until);
+CREATE TABLE IF NOT EXISTS jobs (
+    id        TEXT PRIMARY KEY,
+    video_id  TEXT NOT NULL,
+    format_id TEXT NOT NULL,
+    state     TEXT NOT NULL,
+    owner     INTEGER NOT NULL,
+    cancel    INTEGER NOT NULL DEFAULT 0,
+    data      TEXT NOT NULL,
+    created   REAL NOT NULL,
+    updated   REAL NOT NULL
+);
+-- A job being cancelled no longer holds its claim, so a retry starts afresh
+DROP INDEX IF EXISTS jobs_active;
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_claim ON jobs (video_id, format_id)
+    WHERE state IN ('queued', 'running') AND cancel = 0;
+CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated);
+CREATE TABLE IF NOT EXISTS batches (
+    id      TEXT PRIMARY KEY,
+    data    TEXT NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+
+def per_worker(value: float, minimum: float = 1) -> float:
+    """Split a host-wide limit evenly across worker processes"""
+    return max(minimum, value / WORKERS)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedStore:
+    """SQLite (WAL) state shared by every worker process on one host
+
+    Holds cache entries, download jobs and batches. The partial unique index
+    on active, uncancelled jobs is the cross-process lock that keeps two workers from
+    downloading the same video and format at once.
+    """
+
+    def __init__(self, path: Path, max_jobs: int = 1000, max_cache_rows: int = 5000):
+        self.path = Path(path)
+        self.max_jobs = max_jobs
+        self.max_cache_rows = max_cache_rows
+        self._lock = threading.RLock()
+        self._pid = -1
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Reopened after a fork; SQLite connections must not cross processes
+        if self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.executescript(_SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    # Cache entries
+
+    def cache_get(self, namespace: str, key: str) -> Optional[Tuple[Any, float, float]]:
+        """(value, expires, stale_until) in wall-clock time, or None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value, expires, stale_until FROM cache WHERE namespace = ? AND key = ? AND stale_until > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def cache_fresh(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT 1 FROM cache WHERE namespace = ? AND key = ? AND expires > ?",
+                (namespace, key, time.time()),
+            ).fetchone() is not None
+
+    def cache_set(self, namespace: str, key: str, value: str, expires: float, stale_until: float) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires, stale_until) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, value, expires, stale_until),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune_cache()
+
+    def _prune_cache(self) -> None:
+        # Called in a transaction; expired rows first, then the oldest beyond the cap
+        self.conn.execute("DELETE FROM cache WHERE stale_until <= ?", (time.time(),))
+        self.conn.execute(
+            "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+            (self.max_cache_rows,),
+        )
+
+    def cache_delete(self, namespace: str, key: Optional[str] = None) -> None:
+        with self._lock, self.conn:
+            if key is None:
+                self.conn.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+            else:
+                self.conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+
+    # Jobs
+
+    def claim_job(self, job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Record a new queued job; returns the other worker's job if one is already active
+
+        Active jobs left behind by a dead process are failed so the claim can proceed.
+        """
+        now = time.time()
+        for _ in range(2):
+            try:
+                with self._lock, self.conn:
+                    self.conn.execute(
+                        "INSERT INTO jobs (id, video_id, format_id, state, owner, data, created, updated) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (job["job_id"], job["video_id"], job["format_id"], job["state"], os.getpid(),
+                         json.dumps(job), now, now),
+                    )
+                    self._trim_jobs()
+                return None
+            except sqlite3.IntegrityError:
+                pass
+            with self._lock:
+                row = self.conn.execute(
+                    "SELECT id, owner, data FROM jobs "
+                    "WHERE video_id = ? AND format_id = ? AND state IN (?, ?) AND cancel = 0",
+                    (job["video_id"], job["format_id"], *_ACTIVE_STATES),
+                ).fetchone()
+            if row is None:
+                continue
+            if _pid_alive(row[1]):
+                return json.loads(row[2])
+            self.abandon_job(row[0], "Worker exited before the download finished")
+        return None
+
+    def abandon_job(self, job_id: str, error: str) -> None:
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            data = dict(json.loads(row[0]), state="failed", error=error, finished=time.time())
+            self.conn.execute(
+                "UPDATE jobs SET state = 'failed', data = ?, updated = ? WHERE id = ?",
+                (json.dumps(data), time.time(), job_id),
+            )
+
+    def _trim_jobs(self) -> None:
+        self.conn.execute(
+            "DELETE FROM jobs WHERE state NOT IN (?, ?) AND id IN "
+            "(SELECT id FROM jobs ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (*_ACTIVE_STATES, self.max_jobs),
+        )
+
+    def save_job(self, job: Dict[str, Any]) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, data = ?, updated = ? WHERE id = ?",
+                (job["state"], json.dumps(job), time.time(), job["job_id"]),
+            )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_jobs(self, job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not job_ids:
+            return {}
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT id, data FROM jobs WHERE id IN ({','.join('?' * len(job_ids))})", job_ids
+            ).fetchall()
+        return {job_id: json.loads(data) for job_id, data in rows}
+
+    def list_jobs(self, state: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+        """Jobs of every worker, newest first"""
+        sql = "SELECT data FROM jobs"
+        params: List[Any] = []
+        if state:
+            sql += " WHERE state = ?"
+            params.append(state)
+        sql += " ORDER BY created DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [json.loads(r[0]) for r in self.conn.execute(sql, params)]
+
+    def jobs_updated_since(self, since: float) -> List[Tuple[float, Dict[str, Any]]]:
+        """(updated, job) for jobs of other workers changed after ``since``"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT updated, data FROM jobs WHERE updated > ? AND owner != ? ORDER BY updated",
+                (since, os.getpid()),
+            ).fetchall()
+        return [(updated, json.loads(data)) for updated, data in rows]
+
+    def request_cancel(self, job_id: str) -> bool:
+        with self._lock, self.conn:
+            return self.conn.execute(
+                "UPDATE jobs SET cancel = 1 WHERE id = ? AND state IN (?, ?)", (job_id, *_ACTIVE_STATES)
+            ).rowcount > 0
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self.conn.execute("SELECT cancel FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def pending_bytes(self) -> int:
+        """Bytes still to be written by running downloads of other workers"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT data FROM jobs WHERE state = 'running' AND owner != ?", (os.getpid(),)
+            ).fetchall()
+        pending = 0
+        for (data,) in rows:
+            job = json.loads(data)
+            pending += max(0, (job.get("total_bytes") or 0) - (job.get("downloaded_bytes") or 0))
+        return pending
+
+    # Batches
+
+    def save_batch(self, batch_id: str, data: Dict[str, Any], created: float) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO batches (id, data, created) VALUES (?, ?, ?)",
+                (batch_id, json.dumps(data), created),
+            )
+            self.conn.execute(
+                "DELETE FROM batches WHERE id IN (SELECT id FROM batches ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.max_jobs,),
+            )
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute("SELECT data FROM batches WHERE id = ?", (batch_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_batches(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                json.loads(r[0])
+                for r in self.conn.execute("SELECT data FROM batches ORDER BY created DESC LIMIT ?", (limit,))
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cache_rows = self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            active = self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)", _ACTIVE_STATES
+            ).fetchone()[0]
+        return {"path": str(self.path), "workers": WORKERS, "cache_rows": cache_rows, "active_jobs": active}
+
+
+_MISSING = object()
+
+
+class SharedTTLCache(TTLCache):
+    """TTLCache backed by the shared store, for values other workers can reuse
+
+    The in-process LRU stays the first level; misses fall through to SQLite,
+    and hits there are copied back in for their remaining lifetime. Values
+    must be JSON-serializable; anything else stays process-local. The
+    ``*_local`` lookups inherited from TTLCache only read the first level and
+    are the ones to use on the event loop.
+    """
+
+    def __init__(self, store: SharedStore, namespace: str, max_size: int = 256, ttl: float = 300.0, stale_ttl: float = 0.0):
+        super().__init__(max_size=max_size, ttl=ttl, stale_ttl=stale_ttl)
+        self.store = store
+        self.namespace = namespace
+        self.shared_hits = 0
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        return json.dumps(key, separators=(",", ":"))
+
+    def _load(self, key: Hashable) -> Optional[Tuple[Any, bool]]:
+        try:
+            found = self.store.cache_get(self.namespace, self._key(key))
+        except (sqlite3.Error, TypeError, ValueError):
+            return None
+        if found is None:
+            return None
+        value, expires, _ = found
+        remaining = expires - time.time()
+        # Local copy expires (and goes stale) when the shared one does
+        super().set(key, value, ttl=remaining)
+        self.shared_hits += 1
+        return value, remaining > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = super().get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        loaded = self._load(key)
+        if loaded is None or not loaded[1]:
+            return default
+        return loaded[0]
+
+    def get_stale(self, key: Hashable) -> Optional[Tuple[Any, bool]]:
+        found = super().get_stale(key)
+        if found is not None and found[1]:
+            return found
+        # A stale local copy may have been refreshed by another worker
+        return self._load(key) or found
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        super().set(key, value, ttl)
+        try:
+            encoded = json.dumps(value, separators=(",", ":"))
+        except (TypeError, ValueError):
+            return
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        try:
+            self.store.cache_set(self.namespace, self._key(key), encoded, expires, expires + self.stale_ttl)
+        except (sqlite3.Error, TypeError, ValueError):
+            pass
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        super().invalidate(key)
+        try:
+            self.store.cache_delete(self.namespace, None if key is None else self._key(key))
+        except (sqlite3.Error, TypeError, ValueError):
+            pass
+
+    def __contains__(self, key: Hashable) -> bool:
+        if super().__contains__(key):
+            return True
+        try:
+            return self.store.cache_fresh(self.namespace, self._key(key))
+        except (sqlite3.Error, TypeError, ValueError):
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "shared": True, "shared_hits": self.shared_hits}
+
+
+def _default_path() -> Path:
+    configured = os.environ.get("PLAYYT_STATE_DB")
+    if configured:
+        return Path(configured)
+    return get_downloads_directory() / STATE_FILENAME
+
+
+shared_store: Optional[SharedStore] = SharedStore(_default_path()) if SHARED_STATE else None
+
+
+def make_cache(namespace: str, max_size: int = 256, ttl: float = 300.0, stale_ttl: float = 0.0) -> TTLCache:
+    """A TTLCache, shared across workers when running more than one"""
+    if shared_store is None:
+        return TTLCache(max_size=max_size, ttl=ttl, stale_ttl=stale_ttl)
+    return SharedTTLCache(shared_store, namespace, max_size=max_size, ttl=ttl, stale_ttl=stale_ttl)
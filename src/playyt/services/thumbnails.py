@@ -0,0 +1,227 @@
+from __future__ import annotations
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import io
+import os
+import re
+import threading
+import urllib.error
+import urllib.request
+
+from playyt.services.cache import SingleFlight, TTLCache
+
+try:
+    from PIL import Image  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    Image = None
+
+VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{6,20}$")
+
+# Width buckets and the smallest upstream variant that covers each one;
+# without Pillow the variant itself is served, which is already most of the saving
+WIDTH_BUCKETS: List[Tuple[int, str]] = [
+    (120, "default"),
+    (320, "mqdefault"),
+    (480, "hqdefault"),
+    (640, "sddefault"),
+    (1280, "maxresdefault"),
+]
+FALLBACK_VARIANT = "hqdefault"  # exists for every video
+UPSTREAM_URL = "https://i.ytimg.com/vi/{id}/{variant}.jpg"
+FETCH_TIMEOUT = float(os.environ.get("PLAYYT_THUMB_TIMEOUT", "5"))
+MAX_IMAGE_BYTES = 4 * 1024 * 1024
+JPEG_QUALITY = 82
+POSTER_WIDTH = 1280  # the player page poster
+
+
+class ThumbnailNotFound(Exception):
+    """Upstream has no usable thumbnail for this video"""
+
+
+Fetcher = Callable[[str], Optional[Tuple[bytes, str]]]
+
+
+def fetch_url(url: str) -> Optional[Tuple[bytes, str]]:
+    """Default upstream fetcher: (body, content type), or None on 404"""
+    request = urllib.request.Request(url, headers={"User-Agent": "playYT thumbnail proxy"})
+    try:
+        with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+            body = response.read(MAX_IMAGE_BYTES + 1)
+            if len(body) > MAX_IMAGE_BYTES:
+                return None
+            return body, response.headers.get_content_type()
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+
+
+def bucket_for(width: Optional[int]) -> Tuple[int, str]:
+    if not width:
+        return WIDTH_BUCKETS[2]
+    for bucket in WIDTH_BUCKETS:
+        if bucket[0] >= width:
+            return bucket
+    return WIDTH_BUCKETS[-1]
+
+
+def _resize(body: bytes, width: int) -> Optional[bytes]:
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(body)) as img:
+            if img.width <= width:
+                return None
+            height = max(1, round(img.height * width / img.width))
+            out = io.BytesIO()
+            img.convert("RGB").resize((width, height), Image.LANCZOS).save(
+                out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True
+            )
+            return out.getvalue()
+    except Exception:
+        return None
+
+
+class ThumbnailCache:
+    """Size-bucketed thumbnails on disk, evicted least recently used first
+
+    Recency survives restarts through file mtimes, which every hit refreshes.
+    Concurrent misses for the same image share one upstream fetch.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, fetcher: Optional[Fetcher] = None):
+        self.directory = Path(directory)
+        self.max_bytes = max(1, int(max_bytes))
+        self.fetcher: Fetcher = fetcher or fetch_url
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        self._flight = SingleFlight()
+        self._missing = TTLCache(max_size=4096, ttl=3600)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.upstream_errors = 0
+
+    def _load(self) -> None:
+        # Called with the lock held
+        if self._loaded:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".jpg"):
+                st = entry.stat()
+                found.append((st.st_mtime, entry.name, st.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._bytes += size
+        self._loaded = True
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.directory / name)
+            except OSError:
+                pass
+
+    def _lookup(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            self._load()
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        path = self.directory / name
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                size = self._entries.pop(name, None)
+                if size is not None:
+                    self._bytes -= size
+            return None
+        return data
+
+    def _store(self, name: str, data: bytes) -> None:
+        path = self.directory / name
+        tmp = path.with_name(f".{name}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._bytes += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._evict()
+
+    def get(self, video_id: str, width: Optional[int] = None) -> bytes:
+        """JPEG bytes for ``video_id`` at the bucket covering ``width``
+
+        Raises ThumbnailNotFound when upstream has nothing for the video.
+        """
+        if not VIDEO_ID_RE.match(video_id or ""):
+            raise ThumbnailNotFound(video_id)
+        bucket, variant = bucket_for(width)
+        name = f"{video_id}-{bucket}.jpg"
+        data = self._lookup(name)
+        if data is not None:
+            self.hits += 1
+            return data
+        if self._missing.get(video_id):
+            raise ThumbnailNotFound(video_id)
+        self.misses += 1
+        return self._flight.do(name, lambda: self._fill(video_id, bucket, variant, name))
+
+    def _fill(self, video_id: str, bucket: int, variant: str, name: str) -> bytes:
+        fetched = None
+        for candidate in dict.fromkeys((variant, FALLBACK_VARIANT)):
+            try:
+                fetched = self.fetcher(UPSTREAM_URL.format(id=video_id, variant=candidate))
+            except Exception as e:
+                self.upstream_errors += 1
+                raise ThumbnailNotFound(video_id) from e
+            if fetched is not None:
+                break
+        if fetched is None or not fetched[1].startswith("image/"):
+            self._missing.set(video_id, True)
+            raise ThumbnailNotFound(video_id)
+        body = _resize(fetched[0], bucket) or fetched[0]
+        self._store(name, body)
+        return body
+
+    def warm(self, video_id: str, widths: Tuple[int, ...] = (POSTER_WIDTH,)) -> None:
+        """Fetch thumbnails ahead of time so library pages render offline"""
+        for width in widths:
+            try:
+                self.get(video_id, width)
+            except (ThumbnailNotFound, OSError):
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "upstream_errors": self.upstream_errors,
+                "resizing": Image is not None,
+            }
+
+
+thumbnail_cache = ThumbnailCache(
+    Path(os.environ.get("PLAYYT_THUMB_CACHE_DIR", ".playyt-cache/thumbnails")),
+    max_bytes=int(float(os.environ.get("PLAYYT_THUMB_CACHE_MB", "200")) * 1024 * 1024),
+)
+
+
+def set_fetcher(fetcher: Optional[Fetcher]) -> None:
+    """Swap the upstream fetcher, e.g. for a local stand-in in tests and benchmarks"""
+    thumbnail_cache.fetcher = fetcher or fetch_url
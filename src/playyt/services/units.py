@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+
+
+def parse_size(value: str) -> int:
+    """Byte count from strings like ``500M``, ``20G`` or ``1048576``"""
+    value = value.strip().lower().rstrip("ib").rstrip("b") if value else ""
+    if not value:
+        return 0
+    unit = value[-1] if value[-1] in _SIZE_UNITS else ""
+    number = value[:-1] if unit else value
+    return int(float(number) * _SIZE_UNITS[unit])
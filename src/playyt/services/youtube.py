@@ -1,13 +1,255 @@
 from __future__ import annotations
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable
 from datetime import timedelta
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import copy
 import os
+import re
+import threading
+import time
 from pathlib import Path
 
-try:
-    from yt_dlp import YoutubeDL
-except Exception:  # pragma: no cover - if yt-dlp missing
-    YoutubeDL = None  # type: ignore
+from playyt.services import formats
+from playyt.services.cache import SingleFlight
+from playyt.services.executor import extraction_executor
+from playyt.services.library import get_library_index
+from playyt.services.metrics import track_upstream
+from playyt.services.prefetch import Prefetcher
+from playyt.services.shared import make_cache
+
+# yt-dlp is imported on first use: importing it costs far more than the rest
+# of the app, and health checks and library pages never need it.
+_UNLOADED: Any = object()
+YoutubeDL: Any = _UNLOADED
+_yt_dlp_lock = threading.Lock()
+_timings: Dict[str, float] = {}
+
+
+def _get_ydl_class() -> Any:
+    """The YoutubeDL class, importing yt-dlp on first call; None if unavailable"""
+    global YoutubeDL
+    if YoutubeDL is _UNLOADED:
+        with _yt_dlp_lock:
+            if YoutubeDL is _UNLOADED:
+                started = time.perf_counter()
+                try:
+                    from yt_dlp import YoutubeDL as cls
+                except Exception:  # pragma: no cover - if yt-dlp missing
+                    cls = None
+                _timings["yt_dlp_import"] = time.perf_counter() - started
+                YoutubeDL = cls
+    return YoutubeDL
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+class YoutubeDLPool:
+    """Reusable YoutubeDL instances keyed by their option set
+
+    Instances are not thread-safe, so each is lent to one caller at a time.
+    Reuse skips option parsing and keeps extractor instances warm.
+    """
+
+    def __init__(self, per_key: int = 4, max_keys: int = 16):
+        self.per_key = per_key
+        self.max_keys = max_keys
+        self._idle: "OrderedDict[Any, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def _acquire(self, key: Any, opts: Dict[str, Any]) -> Any:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self._idle.move_to_end(key)
+                self.reused += 1
+                return idle.pop()
+            self.created += 1
+        # YoutubeDL mutates the params dict it is given
+        return _get_ydl_class()(copy.deepcopy(opts))
+
+    def _release(self, key: Any, ydl: Any) -> None:
+        evicted = []
+        with self._lock:
+            idle = self._idle.setdefault(key, deque())
+            self._idle.move_to_end(key)
+            if len(idle) < self.per_key:
+                idle.append(ydl)
+            else:
+                evicted.append(ydl)
+            while len(self._idle) > self.max_keys:
+                _, old = self._idle.popitem(last=False)
+                evicted.extend(old)
+        for old in evicted:
+            old.close()
+
+    @contextmanager
+    def borrow(self, opts: Dict[str, Any]):
+        key = _freeze(opts)
+        ydl = self._acquire(key, opts)
+        try:
+            yield ydl
+        except BaseException:
+            # State after a failed extraction is unknown; don't hand it out again
+            ydl.close()
+            raise
+        else:
+            self._release(key, ydl)
+
+    def clear(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, OrderedDict()
+        for instances in idle.values():
+            for ydl in instances:
+                ydl.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "keys": len(self._idle),
+                "idle": sum(len(v) for v in self._idle.values()),
+                "created": self.created,
+                "reused": self.reused,
+            }
+
+
+_ydl_pool = YoutubeDLPool(
+    per_key=int(os.environ.get("PLAYYT_YDL_POOL_PER_KEY", "4")),
+)
+
+_INFO_OPTS = {
+    "quiet": True,
+    "skip_download": True,
+    "noplaylist": True,
+}
+
+
+def yt_dlp_available() -> bool:
+    return _get_ydl_class() is not None
+
+
+def warm_up() -> Dict[str, float]:
+    """Import yt-dlp and pre-build a pooled instance so the first request is fast"""
+    started = time.perf_counter()
+    if _get_ydl_class() is not None:
+        with _ydl_pool.borrow(_INFO_OPTS):
+            pass
+    _timings["warm_up"] = time.perf_counter() - started
+    return dict(_timings)
+
+
+def startup_timings() -> Dict[str, Any]:
+    """yt-dlp import and warm-up durations plus pool reuse counters"""
+    return {"timings": dict(_timings), "ydl_pool": _ydl_pool.stats(), "yt_dlp_loaded": YoutubeDL is not _UNLOADED}
+
+
+# Raw info dicts keyed by video id, shared by the detail page, the formats
+# API and downloads so a single extraction serves the whole flow.
+# Format URLs expire upstream after a few hours, keep the TTL well below that.
+_info_cache = make_cache(
+    "info",
+    max_size=int(os.environ.get("PLAYYT_INFO_CACHE_SIZE", "256")),
+    ttl=float(os.environ.get("PLAYYT_INFO_CACHE_TTL", "600")),
+)
+_info_flight = SingleFlight()
+
+# Search results keyed by (normalized query, limit). Entries are fresh for
+# the TTL, then served stale for up to PLAYYT_SEARCH_CACHE_STALE seconds
+# while a single background refresh runs.
+_search_cache = make_cache(
+    "search",
+    max_size=int(os.environ.get("PLAYYT_SEARCH_CACHE_SIZE", "512")),
+    ttl=float(os.environ.get("PLAYYT_SEARCH_CACHE_TTL", "300")),
+    stale_ttl=float(os.environ.get("PLAYYT_SEARCH_CACHE_STALE", "1800")),
+)
+_search_flight = SingleFlight()
+
+# Normalized format tables outlive the info dicts they come from: sizes and
+# codecs do not change, only the signed stream URLs expire
+_format_cache = make_cache(
+    "formats",
+    max_size=int(os.environ.get("PLAYYT_FORMAT_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("PLAYYT_FORMAT_CACHE_TTL", "21600")),
+)
+
+MAX_SEARCH_LIMIT = 50
+
+# Per-result enrichment after a flat search runs full extractions; keep it
+# off the request threads and bounded so one search can't flood upstream
+_enrich_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("PLAYYT_ENRICH_WORKERS", "4")),
+    thread_name_prefix="playyt-enrich",
+)
+
+
+def configure_info_cache(max_size: Optional[int] = None, ttl: Optional[float] = None) -> None:
+    """Resize the metadata cache or change its TTL"""
+    _info_cache.configure(max_size=max_size, ttl=ttl)
+
+
+def invalidate_info_cache(video_id: Optional[str] = None) -> None:
+    """Forget cached metadata for one video, or for all videos"""
+    _info_cache.invalidate(video_id)
+
+
+def info_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters and occupancy of the metadata cache"""
+    return _info_cache.stats()
+
+
+def configure_search_cache(
+    max_size: Optional[int] = None,
+    ttl: Optional[float] = None,
+    stale_ttl: Optional[float] = None,
+) -> None:
+    """Resize the search cache or change its freshness windows"""
+    _search_cache.configure(max_size=max_size, ttl=ttl, stale_ttl=stale_ttl)
+
+
+def invalidate_search_cache() -> None:
+    _search_cache.invalidate()
+
+
+def search_cache_stats() -> Dict[str, Any]:
+    """Hit rate of the search cache plus request-coalescing counters"""
+    return {**_search_cache.stats(), **_search_flight.stats()}
+
+
+def _normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
+
+def _watch_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def _extract_video_info(video_id: str) -> Dict[str, Any]:
+    """Return the unprocessed yt-dlp info dict for a video, extracting at most once per TTL"""
+    info = _info_cache.get(video_id)
+    if info is not None:
+        return info
+    # Concurrent cache misses for the same video share one extraction
+    return _info_flight.do(video_id, lambda: _extract_and_cache(video_id))
+
+
+def _extract_and_cache(video_id: str) -> Dict[str, Any]:
+    with track_upstream("extract"), _ydl_pool.borrow(_INFO_OPTS) as ydl:
+        # process=False keeps the full format table without running format
+        # selection, so the same dict can later be fed to process_ie_result
+        info = ydl.extract_info(_watch_url(video_id), download=False, process=False)
+    _info_cache.set(video_id, info)
+    return info
 
 
 def _fmt_duration(seconds: Optional[int]) -> str:
@@ -40,129 +282,468 @@ def _choose_thumbnail(entry: Dict[str, Any]) -> Optional[str]:
     return None
 
 
-def youtube_search(query: str, limit: int = 12) -> List[dict]:
-    if not query:
-        return []
-    if YoutubeDL is None:
-        return []
+def _search_result(e: Dict[str, Any]) -> dict:
+    duration = _fmt_duration(e.get("duration"))
+    thumbnail = _choose_thumbnail(e)
+    channel = e.get("uploader") or e.get("channel") or ""
+    return {
+        "id": e.get("id"),
+        "title": e.get("title"),
+        "channel": channel,
+        "duration": duration,
+        "thumbnail": thumbnail,
+        # Flat entries can lack these; clients fetch them via enrich_videos
+        "partial": not (duration and thumbnail and channel),
+    }
+
+
+def _run_search(query: str, limit: int, page: int = 1, flat: bool = True) -> List[dict]:
+    start = (page - 1) * limit
     ydl_opts = {
         "quiet": True,
         "skip_download": True,
         "noplaylist": True,
-        # Avoid full nested extraction for speed; but keep enough data
-        # "extract_flat": "in_playlist",
         "default_search": "ytsearch",
+        # Only resolve the requested page of the result list
+        "playliststart": start + 1,
+        "playlistend": start + limit,
     }
+    if flat:
+        # Return the search listing as-is instead of resolving every video
+        ydl_opts["extract_flat"] = "in_playlist"
     results: List[dict] = []
-    with YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(f"ytsearch{limit}:{query}", download=False)
+    with track_upstream("search"), _ydl_pool.borrow(ydl_opts) as ydl:
+        info = ydl.extract_info(f"ytsearch{start + limit}:{query}", download=False)
         entries = info.get("entries", []) if isinstance(info, dict) else []
         for e in entries:
-            results.append(
-                {
-                    "id": e.get("id"),
-                    "title": e.get("title"),
-                    "channel": e.get("uploader") or e.get("channel") or "",
-                    "duration": _fmt_duration(e.get("duration")),
-                    "thumbnail": _choose_thumbnail(e),
-                }
-            )
+            if e:
+                results.append(_search_result(e))
+    return results
+
+
+def _search_and_cache(key: tuple) -> List[dict]:
+    results = _run_search(*key)
+    _search_cache.set(key, results)
     return results
 
 
+def _refresh_search(key: tuple) -> None:
+    try:
+        _search_flight.do(key, lambda: _search_and_cache(key))
+    except Exception:
+        # Keep serving the stale copy; the next miss will surface the error
+        pass
+
+
+def _search_key(query: str, limit: int, page: int, flat: bool) -> Optional[tuple]:
+    normalized = _normalize_query(query or "")
+    if not normalized:
+        return None
+    limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+    page = max(1, int(page))
+    return (normalized, limit, page, bool(flat))
+
+
+def _search_lookup(key: tuple, local: bool = False) -> Optional[List[dict]]:
+    """Cached results for a search key, scheduling a refresh if they are stale
+
+    ``local`` only looks in this process's memory, for callers on the event loop.
+    """
+    cached = _search_cache.get_stale_local(key) if local else _search_cache.get_stale(key)
+    if cached is None:
+        return None
+    results, fresh = cached
+    if not fresh and not _search_flight.in_flight(key):
+        # Dropped while the executor is busy; a later stale hit tries again
+        extraction_executor.submit_background(_refresh_search, key)
+    return results
+
+
+def youtube_search(query: str, limit: int = 12, page: int = 1, flat: bool = True) -> List[dict]:
+    """Search YouTube, one page of ``limit`` results at a time
+
+    ``flat`` lists results without resolving each video, which is an order of
+    magnitude faster; entries marked ``partial`` can be completed with
+    :func:`enrich_videos`.
+    """
+    if not yt_dlp_available():
+        return []
+    key = _search_key(query, limit, page, flat)
+    if key is None:
+        return []
+    results = _search_lookup(key)
+    if results is not None:
+        return results
+    # Identical concurrent searches share a single extraction
+    return _search_flight.do(key, lambda: _search_and_cache(key))
+
+
+def _enrichment(video_id: str) -> Optional[dict]:
+    video = get_video(video_id)
+    if not video:
+        return None
+    return {
+        "duration": video["duration"],
+        "thumbnail": video["thumbnail"],
+        "channel": video["channel"],
+    }
+
+
+def enrich_videos(video_ids: List[str]) -> Dict[str, dict]:
+    """Fill in duration, thumbnail and channel for flat search results
+
+    Extractions run in parallel and go through the metadata cache, so they
+    also warm the detail page for those videos.
+    """
+    if not yt_dlp_available():
+        return {}
+    ids = list(dict.fromkeys(v for v in video_ids if v))[:MAX_SEARCH_LIMIT]
+    enriched: Dict[str, dict] = {}
+    for video_id, data in zip(ids, _enrich_executor.map(_enrichment, ids)):
+        if data is not None:
+            enriched[video_id] = data
+    return enriched
+
+
 def get_video(video_id: str) -> Optional[dict]:
-    if not video_id or YoutubeDL is None:
+    if not video_id or not yt_dlp_available():
         return None
-    url = f"https://www.youtube.com/watch?v={video_id}"
-    ydl_opts = {
-        "quiet": True,
-        "skip_download": True,
-        "noplaylist": True,
+    try:
+        e = _extract_video_info(video_id)
+    except Exception:
+        return None
+    return _video_summary(video_id, e)
+
+
+def _video_summary(video_id: str, e: Dict[str, Any]) -> dict:
+    return {
+        "id": e.get("id"),
+        "title": e.get("title"),
+        "channel": e.get("uploader") or e.get("channel") or "",
+        "duration": _fmt_duration(e.get("duration")),
+        "description": e.get("description") or "",
+        "thumbnail": _choose_thumbnail(e),
+        "webpage_url": e.get("webpage_url") or _watch_url(video_id),
     }
-    with YoutubeDL(ydl_opts) as ydl:
-        try:
-            e = ydl.extract_info(url, download=False)
-        except Exception:
-            return None
-        return {
-            "id": e.get("id"),
-            "title": e.get("title"),
-            "channel": e.get("uploader") or e.get("channel") or "",
-            "duration": _fmt_duration(e.get("duration")),
-            "description": e.get("description") or "",
-            "thumbnail": _choose_thumbnail(e),
-            "webpage_url": e.get("webpage_url") or url,
-        }
+
+
+def _format_table(video_id: str) -> List[dict]:
+    table = _cached_format_table(video_id)
+    if table is None:
+        table = formats.format_table(_extract_video_info(video_id))
+        _format_cache.set(video_id, table)
+    return table
+
+
+def _cached_format_table(video_id: str, local: bool = False) -> Optional[List[dict]]:
+    """The format table if it can be had without extracting; each cache is read once
+
+    ``local`` only looks in this process's memory and leaves a table built
+    from cached info uncached, since storing it may write the shared store.
+    """
+    if local:
+        table = _format_cache.get_local(video_id)
+        if table is None:
+            info = _info_cache.get_local(video_id)
+            table = formats.format_table(info) if info is not None else None
+        return table
+    table = _format_cache.get(video_id)
+    if table is None:
+        info = _info_cache.get(video_id)
+        if info is not None:
+            table = formats.format_table(info)
+            _format_cache.set(video_id, table)
+    return table
 
 
 def get_video_formats(video_id: str) -> List[dict]:
-    """Get available download formats for a video"""
-    if not video_id or YoutubeDL is None:
+    """Downloadable formats, best first, with equivalent ones merged and missing sizes estimated"""
+    if not video_id or not yt_dlp_available():
         return []
+    try:
+        return _format_table(video_id)
+    except Exception:
+        return []
+
+
+def choose_format(video_id: str, constraints: formats.FormatConstraints) -> Optional[dict]:
+    """The format (or video+audio pair) that best fits ``constraints``; see :func:`formats.choose`"""
+    table = get_video_formats(video_id)
+    return formats.choose(table, constraints) if table else None
+
+
+_DESCRIPTION_LIMIT = 5000
+
+
+def _compact_info(info: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    """The subset of a yt-dlp info dict worth keeping next to a downloaded file"""
+    return {
+        "video_id": info.get("id"),
+        "title": info.get("title"),
+        "channel": info.get("uploader") or info.get("channel") or "",
+        "channel_id": info.get("channel_id"),
+        "duration": info.get("duration"),
+        "description": (info.get("description") or "")[:_DESCRIPTION_LIMIT],
+        "upload_date": info.get("upload_date"),
+        "webpage_url": info.get("webpage_url"),
+        "thumbnail": _choose_thumbnail(info),
+        # Format fields come from the processed result: they describe what was
+        # actually downloaded rather than what was available
+        "format_id": result.get("format_id"),
+        "ext": result.get("ext"),
+        "resolution": result.get("resolution"),
+        "width": result.get("width"),
+        "height": result.get("height"),
+        "fps": result.get("fps"),
+        "vcodec": result.get("vcodec"),
+        "acodec": result.get("acodec"),
+        "tbr": result.get("tbr"),
+    }
+
+
+MAX_BATCH_SIZE = int(os.environ.get("PLAYYT_BATCH_MAX", "500"))
+# Fragments (DASH/HLS segments) fetched in parallel within one download
+FRAGMENT_CONCURRENCY = int(os.environ.get("PLAYYT_FRAGMENT_CONCURRENCY", "4"))
+# Optional per-download bandwidth cap in bytes/s, 0 for none
+DOWNLOAD_RATELIMIT = int(os.environ.get("PLAYYT_DOWNLOAD_RATELIMIT", "0"))
 
-    url = f"https://www.youtube.com/watch?v={video_id}"
+
+def expand_playlist(url: str, limit: int = MAX_BATCH_SIZE) -> List[dict]:
+    """Video ids and titles of a playlist or channel URL, without resolving each video"""
+    if not url or not yt_dlp_available():
+        return []
     ydl_opts = {
         "quiet": True,
         "skip_download": True,
-        "noplaylist": True,
+        "extract_flat": "in_playlist",
+        "playlistend": max(1, int(limit)),
     }
+    entries: List[dict] = []
+    with track_upstream("playlist"), _ydl_pool.borrow(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+    if not isinstance(info, dict):
+        return entries
+    if info.get("_type") not in ("playlist", "multi_video"):
+        # A single video URL
+        return [{"id": info.get("id"), "title": info.get("title")}] if info.get("id") else []
+    tabs = []
+    for e in info.get("entries") or []:
+        if not e:
+            continue
+        if e.get("ie_key") == "YoutubeTab" or e.get("_type") == "playlist":
+            # Channel pages list their tabs (Videos, Shorts, ...) as nested playlists
+            tabs.append(e.get("url") or e.get("webpage_url"))
+            continue
+        if e.get("id"):
+            entries.append({"id": e["id"], "title": e.get("title")})
+        if len(entries) >= limit:
+            break
+    if not entries and tabs and tabs[0] and tabs[0] != url:
+        return expand_playlist(tabs[0], limit)
+    return entries
 
-    with YoutubeDL(ydl_opts) as ydl:
-        try:
-            info = ydl.extract_info(url, download=False)
-        except Exception:
-            return []
-
-        formats = []
-        for fmt in info.get("formats", []):
-            if fmt.get("vcodec") != "none" or fmt.get("acodec") != "none":  # Skip metadata-only formats
-                formats.append({
-                    "format_id": fmt.get("format_id"),
-                    "ext": fmt.get("ext"),
-                    "quality": fmt.get("format_note") or fmt.get("quality") or "Unknown",
-                    "filesize": fmt.get("filesize"),
-                    "vcodec": fmt.get("vcodec"),
-                    "acodec": fmt.get("acodec"),
-                    "resolution": fmt.get("resolution"),
-                })
-
-        return formats
-
-
-def download_video(video_id: str, format_id: str = "best", download_dir: str = "downloads") -> dict:
-    """Download a video with specified format"""
-    if not video_id or YoutubeDL is None:
+
+# The id and resolved format make names unique and stable, so same-titled
+# videos never collide and a retried download finds its .part file again
+DOWNLOAD_OUTTMPL = "%(title).150B [%(id)s] [%(format_id)s].%(ext)s"
+
+
+def find_existing_download(video_id: str, format_id: str = "best", download_dir: str = "downloads") -> Optional[str]:
+    """Filename of a completed download of ``video_id`` in ``format_id``, if one is on disk"""
+    index = get_library_index(Path(download_dir))
+    if index is None:
+        return None
+    filenames = index.find_by_video_id(video_id)
+    if not filenames:
+        return None
+    metadata = index.get_metadata(filenames)
+    for filename in filenames:
+        if metadata.get(filename, {}).get("requested_format") != format_id:
+            continue
+        if (Path(download_dir) / filename).is_file():
+            return filename
+        # Deleted behind our back; forget it so the next scan agrees
+        index.remove(filename)
+    return None
+
+
+def download_video(
+    video_id: str,
+    format_id: str = "best",
+    download_dir: str = "downloads",
+    progress_hook: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> dict:
+    """Download a video with specified format
+
+    Returns at once if the same video and format are already downloaded.
+    ``format_id`` is a yt-dlp selector or an ``auto`` spec (see
+    :meth:`formats.FormatConstraints.parse`) resolved against the format table.
+    ``progress_hook`` receives yt-dlp progress and postprocessor events; raising
+    from it aborts the download.
+    """
+    if not video_id or not yt_dlp_available():
         return {"success": False, "error": "yt-dlp not available"}
 
     # Create download directory if it doesn't exist
     Path(download_dir).mkdir(exist_ok=True)
 
-    url = f"https://www.youtube.com/watch?v={video_id}"
+    existing = find_existing_download(video_id, format_id, download_dir)
+    if existing:
+        metadata = get_library_index(Path(download_dir)).get_metadata([existing]).get(existing, {})
+        title = metadata.get("title") or Path(existing).stem
+        return {
+            "success": True,
+            "title": title,
+            "filename": existing,
+            "already_downloaded": True,
+            "message": f"Already downloaded: {title}"
+        }
+
+    selector = format_id
+    if formats.is_auto(format_id):
+        # Resolved per video; the spec itself stays the dedupe key
+        try:
+            choice = choose_format(video_id, formats.FormatConstraints.parse(format_id))
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+        if choice is None:
+            return {"success": False, "error": "No downloadable formats"}
+        selector = choice["format_id"]
 
     # Configure yt-dlp options
-    ydl_opts = {
-        "format": format_id,
-        "outtmpl": os.path.join(download_dir, "%(title)s.%(ext)s"),
+    ydl_opts: Dict[str, Any] = {
+        "format": selector,
+        "outtmpl": os.path.join(download_dir, DOWNLOAD_OUTTMPL),
         "noplaylist": True,
+        "quiet": True,
+        "noprogress": True,
+        # Pick up interrupted downloads from their .part files
+        "continuedl": True,
+        "nopart": False,
+        "overwrites": False,
+        "concurrent_fragment_downloads": FRAGMENT_CONCURRENCY,
     }
+    if DOWNLOAD_RATELIMIT > 0:
+        ydl_opts["ratelimit"] = DOWNLOAD_RATELIMIT
+    if progress_hook is not None:
+        ydl_opts["progress_hooks"] = [progress_hook]
+        ydl_opts["postprocessor_hooks"] = [progress_hook]
 
     try:
-        with YoutubeDL(ydl_opts) as ydl:
-            # Get video info first
-            info = ydl.extract_info(url, download=False)
-            title = info.get("title", "Unknown")
+        # Reuse the cached info dict instead of extracting again
+        info = _extract_video_info(video_id)
+        title = info.get("title", "Unknown")
 
-            # Download the video
-            ydl.download([url])
+        # Not pooled: hooks and output template are specific to this download
+        with track_upstream("download"), _get_ydl_class()(ydl_opts) as ydl:
+            # process_ie_result mutates its input, never hand it the cached copy
+            result = ydl.process_ie_result(copy.deepcopy(info), download=True)
 
-            return {
-                "success": True,
-                "title": title,
-                "message": f"Successfully downloaded: {title}"
-            }
+        filename = None
+        requested = (result or {}).get("requested_downloads") or []
+        if requested:
+            filepath = requested[-1].get("filepath") or requested[-1].get("_filename")
+            if filepath:
+                filename = Path(filepath).name
+
+        # Keep what we already extracted so library views never need yt-dlp
+        if filename:
+            index = get_library_index(Path(download_dir))
+            if index is not None:
+                meta = _compact_info(info, result or {})
+                meta["requested_format"] = format_id
+                index.set_metadata(filename, meta)
+
+        return {
+            "success": True,
+            "title": title,
+            "filename": filename,
+            "already_downloaded": False,
+            "format_id": selector,
+            "message": f"Successfully downloaded: {title}"
+        }
     except Exception as e:
+        # Stale format URLs are the usual culprit; re-extract on the next attempt
+        _info_cache.invalidate(video_id)
         return {
             "success": False,
             "error": str(e)
         }
 
+
+# Async entry points for the web app. Hits in the in-process caches are
+# answered on the event loop; anything else, including lookups in the shared
+# store with several workers, runs on the bounded extraction executor, which
+# enforces timeouts and sheds load when its queue is full.
+
+# Detail-page info for the first results of each search, fetched while the
+# user is still reading the result list. Only runs when the extraction
+# executor has no queue, so it never competes with real requests.
+PREFETCH_TOP_N = int(os.environ.get("PLAYYT_PREFETCH_TOP", "3"))
+_prefetcher = Prefetcher(
+    fetch=_extract_video_info,
+    # Called on the event loop; a shared-store hit is picked up by the fetch
+    is_cached=_info_cache.contains_local,
+    max_workers=int(os.environ.get("PLAYYT_PREFETCH_WORKERS", "2")),
+    can_run=lambda: extraction_executor.queue_depth == 0,
+)
+
+
+def prefetch_stats() -> Dict[str, Any]:
+    return {"top_n": PREFETCH_TOP_N, **_prefetcher.stats()}
+
+
+def _prefetch_results(results: List[dict]) -> None:
+    if PREFETCH_TOP_N > 0 and results:
+        _prefetcher.schedule([r["id"] for r in results[:PREFETCH_TOP_N] if r.get("id")])
+
+
+async def youtube_search_async(query: str, limit: int = 12, page: int = 1, flat: bool = True) -> List[dict]:
+    # Only bail out if yt-dlp is known to be missing; importing it here
+    # would block the event loop, so a cold import happens on the executor
+    if YoutubeDL is None:
+        return []
+    key = _search_key(query, limit, page, flat)
+    if key is None:
+        return []
+    results = _search_lookup(key, local=True)
+    if results is None:
+        results = await extraction_executor.run(youtube_search, query, limit, page, flat)
+    _prefetch_results(results)
+    return results
+
+
+async def expand_playlist_async(url: str, limit: int = MAX_BATCH_SIZE) -> List[dict]:
+    if YoutubeDL is None:
+        return []
+    return await extraction_executor.run(expand_playlist, url, limit)
+
+
+# Cache hits are read once and used as read: checking membership and then
+# reading again could find the entry expired and extract on the event loop
+
+async def get_video_async(video_id: str) -> Optional[dict]:
+    _prefetcher.note_request(video_id)
+    info = _info_cache.get_local(video_id) if video_id else None
+    if info is not None:
+        return _video_summary(video_id, info)
+    return await extraction_executor.run(get_video, video_id)
+
+
+async def get_video_formats_async(video_id: str) -> List[dict]:
+    _prefetcher.note_request(video_id)
+    table = _cached_format_table(video_id, local=True) if video_id else None
+    if table is not None:
+        return table
+    return await extraction_executor.run(get_video_formats, video_id)
+
+
+async def choose_format_async(video_id: str, constraints: formats.FormatConstraints) -> Optional[dict]:
+    table = _cached_format_table(video_id, local=True) if video_id else None
+    if table is not None:
+        return formats.choose(table, constraints) if table else None
+    return await extraction_executor.run(choose_format, video_id, constraints)
+
+
+async def enrich_videos_async(video_ids: List[str]) -> Dict[str, dict]:
+    return await extraction_executor.run(enrich_videos, video_ids)
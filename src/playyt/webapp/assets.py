@@ -0,0 +1,110 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, Optional
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from playyt.webapp.httpcache import COMPRESSIBLE_TYPES, brotli, encoded_etag, if_none_match, parse_accept_encoding
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class _Asset:
+    __slots__ = ("path", "hashed", "media_type", "etag", "bodies")
+
+    def __init__(self, path: str, hashed: str, media_type: str, etag: str, bodies: Dict[Optional[str], bytes]):
+        self.path = path
+        self.hashed = hashed
+        self.media_type = media_type
+        self.etag = etag
+        self.bodies = bodies
+
+
+class StaticAssets:
+    """Static files loaded, content-hashed and precompressed once at startup
+
+    Each file is served under its plain name (revalidated via ETag) and a
+    fingerprinted name such as ``styles.3f2a1b9c0d.css`` that is cached for
+    a year; templates link the fingerprinted name through ``url``.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._assets: Dict[str, _Asset] = {}
+        self._routes: Dict[str, _Asset] = {}
+        self.version = ""
+        self.load()
+
+    def load(self) -> None:
+        assets: Dict[str, _Asset] = {}
+        routes: Dict[str, _Asset] = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                full = Path(root) / name
+                rel = full.relative_to(self.directory).as_posix()
+                data = full.read_bytes()
+                digest = hashlib.sha256(data).hexdigest()[:10]
+                stem, dot, ext = rel.rpartition(".")
+                hashed = f"{stem}.{digest}.{ext}" if dot else f"{rel}.{digest}"
+                media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                bodies: Dict[Optional[str], bytes] = {None: data}
+                if media_type.startswith(COMPRESSIBLE_TYPES) and len(data) >= 256:
+                    # Startup-only cost, so use the strongest settings
+                    bodies["gzip"] = gzip.compress(data, compresslevel=9, mtime=0)
+                    if brotli is not None:
+                        bodies["br"] = brotli.compress(data, quality=11)
+                asset = _Asset(rel, hashed, media_type, f'"{digest}"', bodies)
+                assets[rel] = asset
+                routes[rel] = routes[hashed] = asset
+        version = hashlib.blake2b(digest_size=8)
+        for rel in sorted(assets):
+            version.update(f"{rel}:{assets[rel].etag}\n".encode())
+        self._assets, self._routes = assets, routes
+        # Changes whenever any file does; for validators of pages linking them
+        self.version = version.hexdigest()
+
+    def url(self, path: str) -> str:
+        """Fingerprinted URL for a static file, or the plain one if unknown"""
+        asset = self._assets.get(path.lstrip("/"))
+        return f"/static/{asset.hashed if asset else path.lstrip('/')}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope["path"]
+        root = scope.get("root_path", "")
+        if root and path.startswith(root):
+            path = path[len(root):]
+        asset = self._routes.get(path.lstrip("/"))
+        if scope["method"] not in ("GET", "HEAD"):
+            response: Response = PlainTextResponse("Method Not Allowed", status_code=405)
+        elif asset is None:
+            response = PlainTextResponse("Not Found", status_code=404)
+        else:
+            response = self._respond(asset, path.lstrip("/") == asset.hashed, Headers(scope=scope))
+        await response(scope, receive, send)
+
+    def _respond(self, asset: _Asset, fingerprinted: bool, request_headers: Headers) -> Response:
+        encoding = None
+        for coding in parse_accept_encoding(request_headers.get("accept-encoding", "")):
+            if coding in asset.bodies:
+                encoding = coding
+                break
+            if coding == "*" and "gzip" in asset.bodies:
+                encoding = "gzip"
+                break
+        headers = {
+            "ETag": encoded_etag(asset.etag, encoding),
+            "Cache-Control": IMMUTABLE if fingerprinted else "no-cache",
+        }
+        if len(asset.bodies) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if if_none_match(request_headers.get("if-none-match"), asset.etag):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(asset.bodies[encoding], media_type=asset.media_type, headers=headers)
@@ -0,0 +1,192 @@
+from __future__ import annotations
+from typing import List, Optional, Tuple
+import gzip
+import hashlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    brotli = None
+
+MIN_COMPRESS_SIZE = 512
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # dynamic responses: favour speed over the last few percent
+
+COMPRESSIBLE_TYPES = (
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+)
+# Bodies that get a content-hash ETag when the handler did not set one
+ETAG_TYPES = ("text/html", "application/json")
+# Never buffered: these stream for as long as the client stays connected
+STREAMING_TYPES = ("text/event-stream",)
+
+_ENCODING_SUFFIX = {"br": "-br", "gzip": "-gz"}
+
+
+def parse_accept_encoding(header: str) -> List[str]:
+    """Acceptable codings from an Accept-Encoding header, best first"""
+    weighted: List[Tuple[float, str]] = []
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            weighted.append((q, coding))
+    # Stable sort keeps the client's order among equal weights
+    weighted.sort(key=lambda x: -x[0])
+    return [coding for _, coding in weighted]
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    for coding in parse_accept_encoding(accept_encoding):
+        if coding == "br" and brotli is not None:
+            return "br"
+        if coding in ("gzip", "*"):
+            return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    """Distinct strong validator per content coding, as RFC 7232 requires"""
+    if not encoding:
+        return etag
+    weak = etag.startswith("W/")
+    opaque = etag[2:] if weak else etag
+    return ("W/" if weak else "") + opaque[:-1] + _ENCODING_SUFFIX[encoding] + '"'
+
+
+def etag_variants(etag: str) -> List[str]:
+    return [etag] + [encoded_etag(etag, e) for e in _ENCODING_SUFFIX]
+
+
+def if_none_match(header: Optional[str], etag: str) -> bool:
+    """Weak comparison of If-None-Match against ``etag`` in any content coding"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    variants = {v[2:] if v.startswith("W/") else v for v in etag_variants(etag)}
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in variants:
+            return True
+    return False
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """True when the client's cached copy for ``etag`` is still current"""
+    return if_none_match(request.headers.get("if-none-match"), etag)
+
+
+def content_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+class CachingMiddleware:
+    """ETag/304 and gzip/brotli for buffered text responses
+
+    Successful GET responses with a compressible type are buffered; HTML and
+    JSON get a content-hash ETag unless the handler set one (handlers that
+    can validate cheaply, like library pages, set theirs and answer 304
+    before rendering). File responses and event streams pass through.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = MIN_COMPRESS_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+                if (
+                    message["status"] != 200
+                    or "content-encoding" in headers
+                    or content_type in STREAMING_TYPES
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            await self._finish(start, b"".join(chunks), request_headers, send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _finish(self, start: Message, body: bytes, request_headers: Headers, send: Send) -> None:
+        headers = MutableHeaders(raw=list(start["headers"]))
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        etag = headers.get("etag")
+        if etag is None and content_type in ETAG_TYPES:
+            etag = content_etag(body)
+        if etag is not None and "cache-control" not in headers:
+            # Always revalidate; a 304 is cheap and never stale
+            headers["Cache-Control"] = "no-cache"
+
+        encoding = None
+        if len(body) >= self.minimum_size:
+            encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+        headers.append("Vary", "Accept-Encoding")
+
+        if etag is not None:
+            headers["ETag"] = encoded_etag(etag, encoding)
+            if if_none_match(request_headers.get("if-none-match"), etag):
+                for name in ("content-length", "content-type"):
+                    if name in headers:
+                        del headers[name]
+                await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        if encoding is not None:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+        headers["Content-Length"] = str(len(body))
+        await send({"type": "http.response.start", "status": start["status"], "headers": headers.raw})
+        await send({"type": "http.response.body", "body": body})
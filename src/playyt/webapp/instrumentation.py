@@ -0,0 +1,67 @@
+from __future__ import annotations
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from playyt.services.metrics import REGISTRY
+
+http_request_seconds = REGISTRY.histogram(
+    "playyt_http_request_seconds",
+    "Time to response headers by route",
+    ("method", "route"),
+)
+http_requests = REGISTRY.counter(
+    "playyt_http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+http_in_flight = REGISTRY.gauge("playyt_http_requests_in_flight", "Requests currently being handled")
+stream_bytes = REGISTRY.counter("playyt_stream_bytes_total", "Bytes sent by file and video streams")
+active_streams = REGISTRY.gauge("playyt_active_streams", "File and video streams currently sending")
+
+
+def _route_label(scope: Scope) -> str:
+    # The matched route's template keeps label cardinality bounded
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path:
+        return path
+    if scope.get("path", "").startswith("/static/"):
+        return "/static"
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency and status counts
+
+    Latency is measured to the response start: for streamed responses the
+    body can take minutes and would otherwise swamp the histogram.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        recorded = False
+
+        def record(status: int) -> None:
+            nonlocal recorded
+            recorded = True
+            route = _route_label(scope)
+            http_request_seconds.observe(time.perf_counter() - started, method=scope["method"], route=route)
+            http_requests.inc(method=scope["method"], route=route, status=str(status))
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                record(message["status"])
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            if not recorded:
+                record(500)
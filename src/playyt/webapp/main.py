@@ -1,45 +1,176 @@
-from pathlib import Path
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+from pathlib import Path  # noqa: E402
 from fastapi import FastAPI, Request, Query, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional, Tuple
+from contextlib import asynccontextmanager
+from datetime import datetime
+import anyio
+import asyncio
+import hashlib
+import json
 import os
-from pathlib import Path
-from fastapi.staticfiles import StaticFiles
+import stat
 from fastapi.templating import Jinja2Templates
 
 BASE_DIR = Path(__file__).resolve().parent
 TEMPLATES_DIR = BASE_DIR / "templates"
 STATIC_DIR = BASE_DIR / "static"
 
-app = FastAPI(title="playYT Web UI")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Opt-in: pays the yt-dlp import off the request path, on the executor
+    if warm_up and os.environ.get("PLAYYT_WARMUP", "").lower() in ("1", "true", "yes"):
+        asyncio.get_running_loop().run_in_executor(None, warm_up)
+    yield
+
+
+app = FastAPI(title="playYT Web UI", lifespan=lifespan)
 
 
 class DownloadRequest(BaseModel):
     format_id: str = "best"
+    # Any of these picks a right-sized format automatically instead
+    max_height: Optional[int] = None
+    max_size: Optional[str] = None
+    codec: Optional[str] = None
+    target_seconds: Optional[float] = None
+
+
+class BatchDownloadRequest(DownloadRequest):
+    ids: List[str] = []
+    url: Optional[str] = None
 
 # Import services lazily to keep clear boundaries
 # Prefer real YouTube search if available; fall back to in-memory demo
 try:
     from playyt.services.youtube import (
-        youtube_search as real_search,
-        get_video as real_get_video,
-        get_video_formats,
-        download_video
+        youtube_search_async as real_search,
+        get_video_async as real_get_video,
+        get_video_formats_async as get_video_formats,
+        choose_format_async as choose_format,
+        download_video,
+        info_cache_stats,
+        search_cache_stats,
+        prefetch_stats,
+        enrich_videos_async as enrich_videos,
+        expand_playlist_async as expand_playlist,
+        MAX_BATCH_SIZE,
+        startup_timings,
+        warm_up,
     )  # type: ignore
+    from playyt.services.jobs import job_manager  # type: ignore
 except Exception:  # pragma: no cover
     real_search = None
     real_get_video = None
     get_video_formats = None
+    choose_format = None
     download_video = None
+    enrich_videos = None
+    expand_playlist = None
+    MAX_BATCH_SIZE = 0
+    startup_timings = None
+    warm_up = None
+    job_manager = None
+
+from playyt.services.search import search_videos as demo_search, get_video as demo_get_video, search_library  # noqa: E402
+from playyt.services.downloads import delete_download, get_download_metadata, get_container_index, get_downloads_stats, get_downloads_directory, get_library_version, get_video_info_from_filename, query_downloads, format_file_size  # noqa: E402
+from playyt.services.executor import ServiceOverloaded, ServiceTimeout, extraction_executor  # noqa: E402
+from playyt.services.mp4 import MP4_EXTENSIONS, keyframe_span  # noqa: E402
+from playyt.webapp.streaming import RangeFileResponse, guess_video_type  # noqa: E402
+from playyt.webapp.instrumentation import MetricsMiddleware  # noqa: E402
+from playyt.webapp.httpcache import CachingMiddleware, content_etag, not_modified  # noqa: E402
+from playyt.webapp.assets import StaticAssets  # noqa: E402
+from playyt.services.thumbnails import ThumbnailNotFound, thumbnail_cache  # noqa: E402
+from playyt.services.quota import EVICTION_POLICIES, QuotaExceeded, quota_manager  # noqa: E402
+from playyt.services.units import parse_size  # noqa: E402
+from playyt.services.formats import AUTO, FormatConstraints, can_merge, is_auto, throughput  # noqa: E402
+from playyt.services.events import event_bus, watch_library, watch_shared_state  # noqa: E402
+from playyt.services.metrics import REGISTRY  # noqa: E402
+from playyt.services.profiler import profiler  # noqa: E402
+
+app.add_middleware(CachingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# Gauges read at scrape time from the components that already track them
+REGISTRY.gauge_callback(
+    "playyt_executor_queue_depth", "Extraction calls waiting for a worker",
+    lambda: extraction_executor.queue_depth,
+)
+REGISTRY.gauge_callback(
+    "playyt_executor_outstanding", "Extraction calls running or queued",
+    lambda: extraction_executor.outstanding,
+)
+if job_manager:
+    REGISTRY.gauge_callback(
+        "playyt_download_jobs", "Download jobs by state",
+        lambda: job_manager.stats()["counts"], labelnames=("state",),
+    )
+if real_search:
+    REGISTRY.gauge_callback(
+        "playyt_cache_hit_ratio", "Hit ratio by cache",
+        lambda: {
+            "info": info_cache_stats()["hit_rate"],
+            "search": search_cache_stats()["hit_rate"],
+            "prefetch": prefetch_stats()["hit_rate"],
+        },
+        labelnames=("cache",),
+    )
 
-from playyt.services.search import search_videos as demo_search, get_video as demo_get_video  # noqa: E402
-from playyt.services.downloads import scan_downloads, delete_download, get_downloads_stats, get_downloads_directory  # noqa: E402
+# Runtime profiling endpoints are only exposed when explicitly allowed
+PROFILER_ENABLED = os.environ.get("PLAYYT_PROFILER", "").lower() in ("1", "true", "yes")
 
 # Mount static files
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+static_assets = StaticAssets(STATIC_DIR)
+app.mount("/static", static_assets, name="static")
 
 # Templates
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+templates.env.filters["filesize"] = format_file_size
+templates.env.filters["timestamp"] = lambda ts: datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+templates.env.globals["static_url"] = static_assets.url
+
+
+def _render_token() -> str:
+    # Changes when templates or static assets do, so cached pages built by a
+    # previous deploy never match
+    h = hashlib.blake2b(digest_size=8)
+    for path in sorted(TEMPLATES_DIR.rglob("*")):
+        if path.is_file():
+            h.update(path.read_bytes())
+    h.update(static_assets.version.encode())
+    return h.hexdigest()
+
+
+_RENDER_TOKEN = _render_token()
+
+
+def _library_etag(request: Request) -> Optional[str]:
+    """Validator for pages rendered purely from the library and the query string"""
+    version = get_library_version()
+    if version is None:
+        return None
+    key = f"{_RENDER_TOKEN}:{version}:{request.url.path}?{request.url.query}"
+    return '"lib-' + hashlib.blake2b(key.encode(), digest_size=12).hexdigest() + '"'
+
+
+@app.exception_handler(ServiceOverloaded)
+async def service_overloaded_handler(request: Request, exc: ServiceOverloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(ServiceTimeout)
+async def service_timeout_handler(request: Request, exc: ServiceTimeout):
+    return JSONResponse(status_code=504, content={"detail": "Upstream request timed out"})
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -54,39 +185,147 @@ def home(request: Request):
     )
 
 
+SEARCH_PAGE_SIZE = 12
+
+
+async def _run_search(q: str, limit: int, page: int, mode: str) -> list:
+    if real_search:
+        return await real_search(q, limit=limit, page=page, flat=mode == "fast")
+    return demo_search(q)
+
+
 @app.get("/search", response_class=HTMLResponse)
-def search_page(request: Request, q: str | None = Query(default=None, alias="q")):
+async def search_page(
+    request: Request,
+    q: str | None = Query(default=None, alias="q"),
+    page: int = Query(default=1, ge=1),
+):
     results = None
     if q:
-        if real_search:
-            results = real_search(q)
-        else:
-            results = demo_search(q)
+        results = await _run_search(q, SEARCH_PAGE_SIZE, page, "fast")
     return templates.TemplateResponse(
         "search.html",
-        {"request": request, "title": "playYT", "query": q, "results": results},
+        {
+            "request": request,
+            "title": "playYT",
+            "query": q,
+            "results": results,
+            "page": page,
+            "has_next": bool(real_search) and results is not None and len(results) >= SEARCH_PAGE_SIZE,
+        },
     )
 
 
 @app.get("/api/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
-@app.get("/api/search", response_class=JSONResponse)
-def api_search(q: str = Query(..., alias="q")):
+def _stats() -> dict:
+    result = {
+        "extraction_executor": extraction_executor.stats(),
+        "startup": {"app_import": _APP_IMPORT_SECONDS},
+    }
+    if startup_timings:
+        result["startup"].update(startup_timings())
     if real_search:
-        results = real_search(q)
-    else:
-        results = demo_search(q)
-    return {"query": q, "results": results}
+        result["info_cache"] = info_cache_stats()
+        result["search_cache"] = search_cache_stats()
+        result["prefetch"] = prefetch_stats()
+    if job_manager:
+        result["jobs"] = job_manager.stats()
+    result["thumbnails"] = thumbnail_cache.stats()
+    result["quota"] = quota_manager.stats()
+    result["bandwidth"] = {"estimate": throughput.estimate(), "samples": throughput.samples}
+    result["events"] = event_bus.stats()
+    return result
+
+
+@app.get("/api/stats", response_class=JSONResponse)
+async def stats():
+    """Cache hit rates, executor load and job counters for tuning"""
+    # Job and quota counters are SQLite queries with several workers
+    return await anyio.to_thread.run_sync(_stats)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, upstream, streaming and scan metrics"""
+    # Gauge callbacks run at render time, some of them against SQLite
+    body = await anyio.to_thread.run_sync(REGISTRY.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+def _require_profiler() -> None:
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler disabled")
+
+
+@app.post("/api/profiler/start", response_class=JSONResponse)
+async def start_profiler(interval: float = Query(default=0.01, ge=0.001, le=1.0), reset: bool = True):
+    """Start the sampling profiler (PLAYYT_PROFILER must be set)"""
+    _require_profiler()
+    if reset:
+        profiler.reset()
+    profiler.start(interval)
+    return profiler.stats()
+
+
+@app.post("/api/profiler/stop", response_class=JSONResponse)
+async def stop_profiler():
+    _require_profiler()
+    await asyncio.get_running_loop().run_in_executor(None, profiler.stop)
+    return profiler.stats()
+
+
+@app.get("/api/profiler", response_class=PlainTextResponse)
+async def profiler_output(limit: int = Query(default=0, ge=0)):
+    """Folded stacks collected so far, for flamegraph.pl or speedscope"""
+    _require_profiler()
+    return PlainTextResponse(profiler.folded(limit or None))
+
+
+@app.get("/api/search", response_class=JSONResponse)
+async def api_search(
+    q: str = Query(..., alias="q"),
+    limit: int = Query(default=SEARCH_PAGE_SIZE, ge=1, le=50),
+    page: int = Query(default=1, ge=1),
+    mode: str = Query(default="fast", pattern="^(fast|full)$"),
+):
+    results = await _run_search(q, limit, page, mode)
+    return {"query": q, "page": page, "limit": limit, "mode": mode, "results": results}
+
+
+@app.get("/api/videos/enrich", response_class=JSONResponse)
+async def api_enrich_videos(ids: list[str] = Query(..., alias="id", max_length=50)):
+    """Duration, thumbnail and channel for partial (flat) search results"""
+    if enrich_videos is None:
+        return {"videos": {}}
+    return {"videos": await enrich_videos(ids)}
+
+
+THUMB_CACHE_CONTROL = "public, max-age=604800, stale-while-revalidate=86400"
+
+
+@app.get("/thumb/{video_id}")
+async def thumbnail(request: Request, video_id: str, w: int = Query(default=480, ge=16, le=1280)):
+    """Resized, disk-cached copy of a video's thumbnail"""
+    try:
+        body = await anyio.to_thread.run_sync(thumbnail_cache.get, video_id, w)
+    except ThumbnailNotFound:
+        raise HTTPException(status_code=404, detail="No thumbnail for this video")
+    etag = content_etag(body)
+    headers = {"ETag": etag, "Cache-Control": THUMB_CACHE_CONTROL}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="image/jpeg", headers=headers)
 
 
 @app.get("/video/{video_id}", response_class=HTMLResponse)
-def video_detail(request: Request, video_id: str):
+async def video_detail(request: Request, video_id: str):
     # Prefer real online fetch
     if real_get_video:
-        video = real_get_video(video_id)
+        video = await real_get_video(video_id)
     else:
         video = demo_get_video(video_id)
     if not video:
@@ -102,39 +341,288 @@ def video_detail(request: Request, video_id: str):
 
 
 @app.get("/api/video/{video_id}/formats", response_class=JSONResponse)
-def get_formats(video_id: str):
+async def get_formats(video_id: str):
     """Get available download formats for a video"""
     if get_video_formats:
-        formats = get_video_formats(video_id)
-        return {"video_id": video_id, "formats": formats}
+        formats = await get_video_formats(video_id)
+        # Video-only formats need ffmpeg to get their audio merged in
+        return {"video_id": video_id, "formats": formats, "can_merge": can_merge()}
     else:
         return {"video_id": video_id, "formats": [], "error": "Download functionality not available"}
 
 
-@app.post("/api/video/{video_id}/download", response_class=JSONResponse)
-def download_video_endpoint(video_id: str, request: DownloadRequest):
-    """Download a video with specified format"""
-    if download_video:
-        result = download_video(video_id, request.format_id)
-        return result
-    else:
-        return {"success": False, "error": "Download functionality not available"}
+def _constraints(
+    max_height: Optional[int], max_size: Optional[str], codec: Optional[str], target_seconds: Optional[float],
+    bandwidth: Optional[str] = None,
+) -> FormatConstraints:
+    """The server's default ``auto`` constraints with the given ones applied"""
+    constraints = FormatConstraints.parse(AUTO)
+    try:
+        if max_height is not None:
+            constraints.max_height = max_height or None
+        if max_size is not None:
+            constraints.max_bytes = parse_size(max_size) or None
+        if bandwidth is not None:
+            constraints.bandwidth = parse_size(bandwidth) or None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid size: {e}")
+    if codec:
+        constraints.codecs = tuple(c.strip().lower() for c in codec.replace("/", ",").split(",") if c.strip())
+    if target_seconds is not None:
+        constraints.target_seconds = target_seconds or None
+    return constraints
+
+
+def _format_spec(request: DownloadRequest) -> str:
+    """The request's format, as an ``auto`` spec when it carries constraints"""
+    if any(v is not None for v in (request.max_height, request.max_size, request.codec, request.target_seconds)):
+        return _constraints(request.max_height, request.max_size, request.codec, request.target_seconds).to_spec()
+    if is_auto(request.format_id):
+        try:
+            FormatConstraints.parse(request.format_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return request.format_id
+
+
+@app.get("/api/video/{video_id}/formats/choose", response_class=JSONResponse)
+async def choose_video_format(
+    video_id: str,
+    height: Optional[int] = Query(default=None, ge=1),
+    size: Optional[str] = Query(default=None, description="e.g. 500M"),
+    codec: Optional[str] = Query(default=None, description="preference order, e.g. vp9,h264"),
+    target_seconds: Optional[float] = Query(default=None, gt=0, alias="time", description="target download time in seconds"),
+    bandwidth: Optional[str] = Query(default=None, description="bytes per second, e.g. 2M; default: measured"),
+):
+    """The format an automatic download would pick under these constraints, with its size estimate"""
+    if not choose_format:
+        raise HTTPException(status_code=503, detail="Download functionality not available")
+    constraints = _constraints(height, size, codec, target_seconds, bandwidth)
+    choice = await choose_format(video_id, constraints)
+    if choice is None:
+        raise HTTPException(status_code=404, detail="No downloadable formats")
+    return {"video_id": video_id, "spec": constraints.to_spec(), **choice}
+
+
+@app.post("/api/video/{video_id}/download", response_class=JSONResponse, status_code=202)
+async def download_video_endpoint(video_id: str, request: DownloadRequest):
+    """Queue a background download and return its job id"""
+    if not (download_video and job_manager):
+        raise HTTPException(status_code=503, detail="Download functionality not available")
+    # submit touches the library index and, with several workers, the shared
+    # state database; neither may block the event loop
+    job = await anyio.to_thread.run_sync(job_manager.submit, video_id, _format_spec(request))
+    return {"success": True, "job_id": job.id, "job": job.to_dict()}
+
+
+@app.get("/api/jobs", response_class=JSONResponse)
+async def list_jobs(state: str | None = Query(default=None)):
+    """List recent download jobs, newest first"""
+    if not job_manager:
+        return {"jobs": []}
+    def listing() -> dict:
+        return {"jobs": [j.to_dict() for j in job_manager.list_jobs(state)], **job_manager.stats()}
+
+    return await anyio.to_thread.run_sync(listing)
+
+
+@app.get("/api/jobs/{job_id}", response_class=JSONResponse)
+async def get_job(job_id: str):
+    """Progress of a single download job"""
+    job = await anyio.to_thread.run_sync(job_manager.get, job_id) if job_manager else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.post("/api/jobs/{job_id}/cancel", response_class=JSONResponse)
+async def cancel_job(job_id: str):
+    """Cancel a queued or running download job"""
+    job = await anyio.to_thread.run_sync(job_manager.cancel, job_id) if job_manager else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+EVENT_TOPICS = ("jobs", "library")
+EVENTS_MAX_CLIENTS = int(os.environ.get("PLAYYT_EVENTS_MAX_CLIENTS", "100"))
+# Minimum gap between writes to one client; events arriving meanwhile coalesce
+EVENTS_FLUSH_INTERVAL = 0.25
+EVENTS_KEEPALIVE = 15.0
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+@app.get("/api/events")
+async def events(topics: str = Query(default="jobs,library")):
+    """Server-Sent Events: job progress ("job") and library changes ("library")
+
+    Each connection first receives the current state (active jobs, library
+    stats), then coalesced updates. A "resync" event means the client fell
+    too far behind and should refetch.
+    """
+    wanted = {t for t in topics.split(",") if t in EVENT_TOPICS}
+    if not wanted:
+        raise HTTPException(status_code=400, detail=f"topics must be among {', '.join(EVENT_TOPICS)}")
+    if event_bus.stats()["subscribers"] >= EVENTS_MAX_CLIENTS:
+        raise HTTPException(status_code=503, detail="Too many event subscribers")
+    if "library" in wanted:
+        await anyio.to_thread.run_sync(watch_library)
+    watch_shared_state()
+
+    async def stream():
+        # Subscribed before the snapshot so nothing falls in between
+        subscription = event_bus.subscribe(wanted)
+        try:
+            yield "retry: 3000\n\n"
+            if "jobs" in wanted and job_manager:
+                jobs = await anyio.to_thread.run_sync(job_manager.list_jobs)
+                for job in jobs:
+                    if job.state in ("queued", "running"):
+                        yield _sse("job", job.to_dict())
+            if "library" in wanted:
+                stats = await anyio.to_thread.run_sync(get_downloads_stats)
+                yield _sse("library", {"changed": [], "removed": [], "version": get_library_version(), "stats": stats})
+            while True:
+                batch = await subscription.next_batch(EVENTS_KEEPALIVE)
+                if not batch:
+                    yield ": keepalive\n\n"
+                    continue
+                # One write per batch; a slow client blocks here while newer
+                # events coalesce in its subscription
+                yield "".join(_sse(event, data) for event, data in batch)
+                await asyncio.sleep(EVENTS_FLUSH_INTERVAL)
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/batches", response_class=JSONResponse, status_code=202)
+async def create_batch(request: BatchDownloadRequest):
+    """Queue downloads for a list of ids and/or every video of a playlist or channel URL"""
+    if not (download_video and job_manager):
+        raise HTTPException(status_code=503, detail="Download functionality not available")
+    format_id = _format_spec(request)
+    video_ids = [v for v in request.ids if v]
+    if request.url:
+        entries = await expand_playlist(request.url, MAX_BATCH_SIZE)
+        video_ids.extend(e["id"] for e in entries)
+    if not video_ids:
+        raise HTTPException(status_code=400, detail="No videos to download")
+    if len(video_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} videos per batch")
+    # Up to MAX_BATCH_SIZE submits, each with index lookups and shared-state writes
+    batch = await anyio.to_thread.run_sync(
+        lambda: job_manager.submit_batch(video_ids, format_id, source=request.url)
+    )
+    return {"success": True, "batch_id": batch.id, "batch": batch.to_dict()}
+
+
+@app.get("/api/batches", response_class=JSONResponse)
+async def list_batches():
+    """Recent batches with aggregate progress, newest first"""
+    if not job_manager:
+        return {"batches": []}
+    def listing() -> dict:
+        return {"batches": [b.to_dict() for b in job_manager.list_batches()]}
+
+    return await anyio.to_thread.run_sync(listing)
+
+
+@app.get("/api/batches/{batch_id}", response_class=JSONResponse)
+async def get_batch(batch_id: str):
+    """Aggregate progress and per-job state for one batch"""
+    batch = await anyio.to_thread.run_sync(job_manager.get_batch, batch_id) if job_manager else None
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch.to_dict(include_jobs=True)
+
+
+@app.post("/api/batches/{batch_id}/cancel", response_class=JSONResponse)
+async def cancel_batch(batch_id: str):
+    """Cancel every unfinished job of a batch"""
+    # One cancel per job, each a shared-state write with several workers
+    batch = await anyio.to_thread.run_sync(job_manager.cancel_batch, batch_id) if job_manager else None
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch.to_dict()
+
+
+DOWNLOADS_PAGE_SIZE = 50
 
 
 @app.get("/downloads", response_class=HTMLResponse)
 def downloads_page(request: Request):
-    """Display downloaded videos page"""
-    downloads = scan_downloads()
+    """Display downloaded videos page; further pages load from /api/downloads"""
+    etag = _library_etag(request)
+    if etag and not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    page = query_downloads(limit=DOWNLOADS_PAGE_SIZE)
     stats = get_downloads_stats()
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "downloads.html",
         {
             "request": request,
             "title": "Downloads - playYT",
-            "downloads": downloads,
+            "downloads": page["items"],
+            "next_cursor": page["next_cursor"],
+            "page_size": DOWNLOADS_PAGE_SIZE,
             "stats": stats
         },
     )
+    if etag:
+        response.headers["ETag"] = etag
+    return response
+
+
+@app.get("/api/downloads", response_class=JSONResponse)
+def api_downloads(
+    request: Request,
+    sort: str = Query(default="mtime", pattern="^(mtime|size|title)$"),
+    order: str = Query(default="desc", pattern="^(asc|desc)$"),
+    ext: list[str] | None = Query(default=None),
+    min_size: int | None = Query(default=None, ge=0),
+    max_size: int | None = Query(default=None, ge=0),
+    since: datetime | None = Query(default=None),
+    until: datetime | None = Query(default=None),
+    limit: int = Query(default=DOWNLOADS_PAGE_SIZE, ge=1, le=500),
+    cursor: str | None = Query(default=None),
+):
+    """Paginated, sortable and filterable listing of downloaded files"""
+    etag = _library_etag(request)
+    if etag and not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    try:
+        page = query_downloads(
+            sort=sort,
+            order=order,
+            extensions=ext,
+            min_size=min_size,
+            max_size=max_size,
+            since=since.timestamp() if since else None,
+            until=until.timestamp() if until else None,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(page, headers={"ETag": etag} if etag else None)
+
+
+@app.get("/api/library/search", response_class=JSONResponse)
+def api_library_search(
+    q: str = Query(..., alias="q"),
+    limit: int = Query(default=20, ge=1, le=200),
+):
+    """Ranked full-text search over the downloaded library (typeahead friendly)"""
+    return {"query": q, "results": search_library(q, limit=limit)}
 
 
 @app.delete("/api/downloads/{filename}", response_class=JSONResponse)
@@ -144,8 +632,43 @@ def delete_download_endpoint(filename: str):
     return result
 
 
+@app.post("/api/downloads/{filename}/pin", response_class=JSONResponse)
+def pin_download(filename: str):
+    """Exempt a file from quota eviction"""
+    if not quota_manager.set_pinned(filename, True):
+        raise HTTPException(status_code=404, detail="File not found")
+    return {"filename": filename, "pinned": True}
+
+
+@app.delete("/api/downloads/{filename}/pin", response_class=JSONResponse)
+def unpin_download(filename: str):
+    if not quota_manager.set_pinned(filename, False):
+        raise HTTPException(status_code=404, detail="File not found")
+    return {"filename": filename, "pinned": False}
+
+
+@app.get("/api/quota", response_class=JSONResponse)
+def quota_report(
+    needed: int = Query(default=0, ge=0),
+    policy: Optional[str] = Query(default=None),
+):
+    """Dry run: usage, and which files would be evicted to fit ``needed`` more bytes"""
+    if policy is not None and policy not in EVICTION_POLICIES:
+        raise HTTPException(status_code=400, detail=f"Unknown eviction policy: {policy}")
+    return quota_manager.plan(needed, policy)
+
+
+@app.post("/api/quota/enforce", response_class=JSONResponse)
+def enforce_quota():
+    """Evict now until the library is back within its quota and free-space floor"""
+    try:
+        return quota_manager.ensure_space(0)
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=507, detail=str(e))
+
+
 @app.get("/api/downloads/{filename}/download")
-def download_file_endpoint(filename: str):
+def download_file_endpoint(request: Request, filename: str):
     """Download a file from the downloads directory to user's workstation"""
     downloads_dir = get_downloads_directory()
     file_path = downloads_dir / filename
@@ -161,11 +684,15 @@ def download_file_endpoint(filename: str):
         if not file_path.exists() or not file_path.is_file():
             raise HTTPException(status_code=404, detail="File not found")
 
-        return FileResponse(
-            path=str(file_path),
+        # Range-aware so interrupted browser downloads can resume
+        response = RangeFileResponse(
+            file_path,
+            request.headers,
+            media_type='application/octet-stream',
             filename=filename,
-            media_type='application/octet-stream'
         )
+        quota_manager.record_access(filename, play=bool(response.ranges) and response.ranges[0][0] == 0)
+        return response
 
     except HTTPException:
         raise
@@ -191,12 +718,12 @@ def video_player_page(request: Request, filename: str):
             raise HTTPException(status_code=404, detail="Video not found")
 
         # Get video info
-        video_info = {
+        video_info = get_video_info_from_filename(filename, get_download_metadata(filename))
+        video_info.update({
             "filename": filename,
-            "title": Path(filename).stem,
             "size": file_path.stat().st_size,
             "extension": Path(filename).suffix.lower()
-        }
+        })
 
         return templates.TemplateResponse(
             "video_player.html",
@@ -213,94 +740,87 @@ def video_player_page(request: Request, filename: str):
         raise HTTPException(status_code=500, detail=f"Error accessing video: {str(e)}")
 
 
-@app.get("/api/stream/{filename}")
-def stream_video(request: Request, filename: str):
-    """Stream video file with range support for HTML5 video player"""
+STREAM_READAHEAD_MAX = 8 * 1024 * 1024
+
+
+def _add_stream_hints(response: RangeFileResponse, index: dict) -> None:
+    """Warm the page cache for what the player needs next"""
+    start = response.ranges[0][0]
+    if start == 0 and not index.get("faststart"):
+        # The player must read moov, at the end of the file, before any frame
+        response.readahead.append((index["moov_offset"], index["moov_size"]))
+    elif start > 0:
+        # A seek: read the whole group of pictures up to the next keyframe
+        media_end = (index.get("mdat_offset") or 0) + (index.get("mdat_size") or 0)
+        span = keyframe_span(index["keyframe_offsets"], start, media_end or response.file_size)
+        if span:
+            response.readahead.append((span[0], min(span[1], STREAM_READAHEAD_MAX)))
+    if index.get("duration"):
+        response.headers["x-content-duration"] = str(index["duration"])
+
+
+@app.get("/api/stream/{filename}/index", response_class=JSONResponse)
+async def stream_index(filename: str):
+    """Container summary of an MP4 download: duration, layout and keyframe times"""
+    if Path(filename).name != filename:
+        raise HTTPException(status_code=400, detail="Invalid file path")
+    index = await anyio.to_thread.run_sync(get_container_index, filename)
+    if index is None:
+        raise HTTPException(status_code=404, detail="No container index for this file")
+    return {
+        "filename": filename,
+        "faststart": index["faststart"],
+        "duration": index["duration"],
+        "keyframes": [t for t, _ in index["keyframes"]],
+    }
+
+
+def _stat_download(filename: str) -> Tuple[Path, os.stat_result]:
+    """Resolved path and stat of a downloaded file; resolving and stat hit the disk"""
     downloads_dir = get_downloads_directory()
-    file_path = downloads_dir / filename
+    file_path = (downloads_dir / filename).resolve()
+    downloads_dir = downloads_dir.resolve()
 
     # Security check: ensure file is in downloads directory
+    if not str(file_path).startswith(str(downloads_dir)):
+        raise HTTPException(status_code=400, detail="Invalid file path")
     try:
-        file_path = file_path.resolve()
-        downloads_dir = downloads_dir.resolve()
-
-        if not str(file_path).startswith(str(downloads_dir)):
-            raise HTTPException(status_code=400, detail="Invalid file path")
+        st = file_path.stat()
+    except OSError:
+        raise HTTPException(status_code=404, detail="Video not found")
+    if not stat.S_ISREG(st.st_mode):
+        raise HTTPException(status_code=404, detail="Video not found")
+    return file_path, st
 
-        if not file_path.exists() or not file_path.is_file():
-            raise HTTPException(status_code=404, detail="Video not found")
 
-        file_size = file_path.stat().st_size
-        range_header = request.headers.get('range')
-
-        # Determine content type based on file extension
-        content_type_map = {
-            '.mp4': 'video/mp4',
-            '.webm': 'video/webm',
-            '.avi': 'video/x-msvideo',
-            '.mov': 'video/quicktime',
-            '.mkv': 'video/x-matroska',
-            '.flv': 'video/x-flv',
-            '.wmv': 'video/x-ms-wmv',
-            '.m4v': 'video/x-m4v'
-        }
-
-        file_extension = Path(filename).suffix.lower()
-        content_type = content_type_map.get(file_extension, 'video/mp4')
-
-        if range_header:
-            # Handle range requests for video seeking
-            range_match = range_header.replace('bytes=', '').split('-')
-            start = int(range_match[0]) if range_match[0] else 0
-            end = int(range_match[1]) if range_match[1] else file_size - 1
-
-            def generate_chunk():
-                with open(file_path, 'rb') as video_file:
-                    video_file.seek(start)
-                    remaining = end - start + 1
-                    while remaining:
-                        chunk_size = min(8192, remaining)
-                        chunk = video_file.read(chunk_size)
-                        if not chunk:
-                            break
-                        remaining -= len(chunk)
-                        yield chunk
-
-            headers = {
-                'Content-Range': f'bytes {start}-{end}/{file_size}',
-                'Accept-Ranges': 'bytes',
-                'Content-Length': str(end - start + 1),
-                'Content-Type': content_type,
-            }
-
-            return StreamingResponse(
-                generate_chunk(),
-                status_code=206,
-                headers=headers
-            )
-        else:
-            # Serve entire file
-            def generate_full():
-                with open(file_path, 'rb') as video_file:
-                    while True:
-                        chunk = video_file.read(8192)
-                        if not chunk:
-                            break
-                        yield chunk
-
-            headers = {
-                'Content-Length': str(file_size),
-                'Accept-Ranges': 'bytes',
-                'Content-Type': content_type,
-            }
-
-            return StreamingResponse(
-                generate_full(),
-                headers=headers
-            )
+@app.api_route("/api/stream/{filename}", methods=["GET", "HEAD"])
+async def stream_video(request: Request, filename: str):
+    """Stream video file with range support for HTML5 video player"""
+    try:
+        file_path, st = await anyio.to_thread.run_sync(_stat_download, filename)
+
+        # Ranges, If-Range and conditional GETs are all handled by the response
+        response = RangeFileResponse(
+            file_path,
+            request.headers,
+            media_type=guess_video_type(filename),
+            stat_result=st,
+        )
+        if response.ranges and file_path.suffix.lower() in MP4_EXTENSIONS:
+            index = await anyio.to_thread.run_sync(get_container_index, filename)
+            if index:
+                _add_stream_hints(response, index)
+        if request.method == "GET":
+            # Starting from byte 0 is a new viewing; seeks only refresh recency
+            new_play = bool(response.ranges) and response.ranges[0][0] == 0
+            await anyio.to_thread.run_sync(quota_manager.record_access, filename, new_play)
+        return response
 
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error streaming video: {str(e)}")
 
+
+# Measured last so it covers every import above (yt-dlp is no longer among them)
+_APP_IMPORT_SECONDS = round(time.perf_counter() - _IMPORT_STARTED, 4)
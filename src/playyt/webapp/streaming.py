@@ -0,0 +1,313 @@
+from __future__ import annotations
+from typing import List, Mapping, Optional, Tuple
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import quote
+import os
+import secrets
+
+import anyio
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from playyt.webapp.instrumentation import active_streams, stream_bytes
+
+# First block of every range is small so seeks get their first bytes quickly,
+# later blocks grow geometrically to keep per-chunk overhead low.
+MIN_BLOCK_SIZE = 64 * 1024
+MAX_BLOCK_SIZE = int(os.environ.get("PLAYYT_STREAM_MAX_BLOCK", str(1024 * 1024)))
+
+# More ranges than this in one request is almost certainly abuse
+MAX_RANGES = 16
+
+CONTENT_TYPES = {
+    '.mp4': 'video/mp4',
+    '.webm': 'video/webm',
+    '.avi': 'video/x-msvideo',
+    '.mov': 'video/quicktime',
+    '.mkv': 'video/x-matroska',
+    '.flv': 'video/x-flv',
+    '.wmv': 'video/x-ms-wmv',
+    '.m4v': 'video/x-m4v'
+}
+
+
+class RangeNotSatisfiable(Exception):
+    """The Range header is well-formed but no range overlaps the file"""
+
+
+def _pread(fd: int, size: int, offset: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(fd, size, offset)
+    # Windows has no pread; each response owns its descriptor so seek+read is safe
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
+
+
+def _advise_willneed(fd: int, spans: List[Tuple[int, int]]) -> None:
+    # Asynchronous readahead hint; a no-op where posix_fadvise is missing
+    advise = getattr(os, "posix_fadvise", None)
+    if advise is None:
+        return
+    for offset, length in spans:
+        try:
+            advise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+
+
+def guess_video_type(filename: str) -> str:
+    return CONTENT_TYPES.get(Path(filename).suffix.lower(), 'video/mp4')
+
+
+def make_etag(st: os.stat_result) -> str:
+    """Strong validator derived from size and nanosecond mtime"""
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def parse_range_header(header: str, file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a ``bytes=`` Range header into inclusive (start, end) pairs
+
+    Returns None when the header is malformed or uses another unit, in which
+    case RFC 7233 says to ignore it. Raises RangeNotSatisfiable when no range
+    overlaps the representation. Overlapping and adjacent ranges are merged.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    ranges: List[Tuple[int, int]] = []
+    parts = spec.split(",")
+    if len(parts) > MAX_RANGES:
+        return None
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+        first, dash, last = part.partition("-")
+        first, last = first.strip(), last.strip()
+        if not dash or not (first or last):
+            return None
+        if (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:
+            # Suffix range: the final N bytes
+            length = int(last)
+            # An empty file has no final bytes to serve
+            if length == 0 or file_size == 0:
+                continue
+            ranges.append((max(0, file_size - length), file_size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= file_size:
+            continue
+        end = int(last) if last else file_size - 1
+        ranges.append((start, min(end, file_size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        prev_start, prev_end = merged[-1]
+        if start <= prev_end + 1:
+            merged[-1] = (prev_start, max(prev_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _http_date_to_ts(value: str) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _etag_matches(header: str, etag: str, weak: bool) -> bool:
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if weak and candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class RangeFileResponse(Response):
+    """File response implementing RFC 7232/7233 conditionals and byte ranges
+
+    Uses the ASGI zero-copy send extension (``os.sendfile``) when the server
+    offers it, otherwise streams ``os.pread`` blocks read off the event loop.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        request_headers: Mapping[str, str],
+        media_type: Optional[str] = None,
+        filename: Optional[str] = None,
+        stat_result: Optional[os.stat_result] = None,
+        background: Optional[BackgroundTask] = None,
+    ):
+        self.path = str(path)
+        self.background = background
+        st = stat_result or os.stat(self.path)
+        self.file_size = st.st_size
+        self.media_type = media_type or guess_video_type(self.path)
+        self.etag = make_etag(st)
+        self.ranges: List[Tuple[int, int]] = []
+        self.boundary: Optional[str] = None
+        # (offset, length) spans the kernel should start reading ahead of time
+        self.readahead: List[Tuple[int, int]] = []
+        self.init_headers({})
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["etag"] = self.etag
+        self.headers["last-modified"] = formatdate(st.st_mtime, usegmt=True)
+        if filename is not None:
+            self.headers["content-disposition"] = f"attachment; filename*=utf-8''{quote(filename)}"
+        self._evaluate(request_headers, st)
+
+    def _evaluate(self, request_headers: Mapping[str, str], st: os.stat_result) -> None:
+        mtime = int(st.st_mtime)
+
+        if_none_match = request_headers.get("if-none-match")
+        if_modified_since = request_headers.get("if-modified-since")
+        not_modified = False
+        if if_none_match is not None:
+            not_modified = _etag_matches(if_none_match, self.etag, weak=True)
+        elif if_modified_since is not None:
+            ts = _http_date_to_ts(if_modified_since)
+            not_modified = ts is not None and mtime <= ts
+        if not_modified:
+            self.status_code = 304
+            del self.headers["accept-ranges"]
+            return
+
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and if_range is not None:
+            if_range = if_range.strip()
+            if if_range.startswith('"') or if_range.startswith("W/"):
+                # If-Range requires a strong comparison
+                range_valid = if_range == self.etag
+            else:
+                ts = _http_date_to_ts(if_range)
+                range_valid = ts is not None and mtime == int(ts)
+            if not range_valid:
+                range_header = None
+
+        ranges = None
+        if range_header:
+            try:
+                ranges = parse_range_header(range_header, self.file_size)
+            except RangeNotSatisfiable:
+                self.status_code = 416
+                self.headers["content-range"] = f"bytes */{self.file_size}"
+                self.headers["content-length"] = "0"
+                return
+
+        if not ranges:
+            self.status_code = 200
+            self.ranges = [(0, self.file_size - 1)] if self.file_size else []
+            self.headers["content-type"] = self.media_type
+            self.headers["content-length"] = str(self.file_size)
+            return
+
+        self.status_code = 206
+        self.ranges = ranges
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            self.headers["content-type"] = self.media_type
+            self.headers["content-range"] = f"bytes {start}-{end}/{self.file_size}"
+            self.headers["content-length"] = str(end - start + 1)
+            return
+
+        self.boundary = secrets.token_hex(16)
+        self.headers["content-type"] = f"multipart/byteranges; boundary={self.boundary}"
+        length = len(self._closing_delimiter())
+        for start, end in ranges:
+            length += len(self._part_header(start, end)) + (end - start + 1)
+        self.headers["content-length"] = str(length)
+
+    def _part_header(self, start: int, end: int) -> bytes:
+        return (
+            f"\r\n--{self.boundary}\r\n"
+            f"Content-Type: {self.media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{self.file_size}\r\n\r\n"
+        ).encode("latin-1")
+
+    def _closing_delimiter(self) -> bytes:
+        return f"\r\n--{self.boundary}--\r\n".encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if scope["method"].upper() == "HEAD" or self.status_code not in (200, 206) or not self.ranges:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+            fd = await anyio.to_thread.run_sync(os.open, self.path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+            active_streams.inc()
+            _advise_willneed(fd, self.readahead)
+            try:
+                for i, (start, end) in enumerate(self.ranges):
+                    if self.boundary:
+                        await send({"type": "http.response.body", "body": self._part_header(start, end), "more_body": True})
+                    last = i == len(self.ranges) - 1 and not self.boundary
+                    if zerocopy:
+                        await self._send_zerocopy(send, fd, start, end, last)
+                    else:
+                        await self._send_blocks(send, fd, start, end, last)
+                if self.boundary:
+                    await send({"type": "http.response.body", "body": self._closing_delimiter(), "more_body": False})
+            finally:
+                active_streams.dec()
+                os.close(fd)
+        if self.background is not None:
+            await self.background()
+
+    async def _send_zerocopy(self, send: Send, fd: int, start: int, end: int, last: bool) -> None:
+        stream_bytes.inc(end - start + 1)
+        await send(
+            {
+                "type": "http.response.zerocopysend",
+                "file": fd,
+                "offset": start,
+                "count": end - start + 1,
+                "more_body": not last,
+            }
+        )
+
+    async def _send_blocks(self, send: Send, fd: int, start: int, end: int, last: bool) -> None:
+        offset = start
+        block = MIN_BLOCK_SIZE
+        while offset <= end:
+            size = min(block, end - offset + 1)
+            chunk = await anyio.to_thread.run_sync(_pread, fd, size, offset)
+            if not chunk:
+                # File shrank underneath us; stop rather than spin
+                break
+            offset += len(chunk)
+            stream_bytes.inc(len(chunk))
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": not (last and offset > end),
+                }
+            )
+            block = min(block * 2, MAX_BLOCK_SIZE)
+        if last and offset <= end:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,68 @@
+import time
+
+from playyt.services.cache import TTLCache
+from playyt.services.shared import SharedStore, SharedTTLCache
+
+
+class CountingStore(SharedStore):
+    """Real shared store that counts the cache reads reaching SQLite"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.reads = 0
+
+    def cache_get(self, namespace, key):
+        self.reads += 1
+        return super().cache_get(namespace, key)
+
+    def cache_fresh(self, namespace, key):
+        self.reads += 1
+        return super().cache_fresh(namespace, key)
+
+
+def test_local_lookups_do_not_count_misses():
+    cache = TTLCache(ttl=60)
+    assert cache.get_local("a") is None
+    assert cache.get_stale_local("a") is None
+    cache.set("a", 1)
+    assert cache.get_local("a") == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 0
+
+
+def test_get_stale_local_serves_expired_entries_within_stale_ttl():
+    cache = TTLCache(ttl=60, stale_ttl=60)
+    cache.set("a", 1, ttl=-1)
+    assert cache.get_local("a") is None
+    assert cache.get_stale_local("a") == (1, False)
+    cache.set("b", 2, ttl=-120)
+    assert cache.get_stale_local("b") is None
+
+
+def test_shared_cache_local_lookups_never_read_the_store(tmp_path):
+    store = CountingStore(tmp_path / "state.sqlite3")
+    writer = SharedTTLCache(store, "info", ttl=60)
+    reader = SharedTTLCache(store, "info", ttl=60)
+    writer.set("abc", {"id": "abc"})
+
+    assert reader.get_local("abc") is None
+    assert reader.get_stale_local("abc") is None
+    assert not reader.contains_local("abc")
+    assert store.reads == 0
+
+    # The blocking lookup finds the other worker's entry and keeps a local copy
+    assert reader.get("abc") == {"id": "abc"}
+    assert store.reads == 1
+    assert reader.get_local("abc") == {"id": "abc"}
+    assert reader.contains_local("abc")
+    assert store.reads == 1
+
+
+def test_shared_cache_local_copy_expires_with_the_shared_entry(tmp_path):
+    store = CountingStore(tmp_path / "state.sqlite3")
+    writer = SharedTTLCache(store, "info", ttl=0.05)
+    reader = SharedTTLCache(store, "info", ttl=60)
+    writer.set("abc", 1)
+    assert reader.get("abc") == 1
+    time.sleep(0.1)
+    assert reader.get_local("abc") is None
@@ -0,0 +1,71 @@
+import threading
+
+from playyt.services import youtube
+from playyt.services.cache import TTLCache
+from playyt.services.executor import BoundedExecutor
+
+TIMEOUT = 5
+
+
+def test_background_work_runs_on_an_idle_worker():
+    executor = BoundedExecutor("test", max_workers=1, max_queue=4)
+    done = threading.Event()
+    assert executor.submit_background(done.set)
+    assert done.wait(TIMEOUT)
+
+
+def test_background_work_is_dropped_while_workers_are_busy():
+    executor = BoundedExecutor("test", max_workers=1, max_queue=4)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(TIMEOUT)
+
+    assert executor.submit_background(block)
+    assert started.wait(TIMEOUT)
+    assert not executor.submit_background(lambda: None)
+    assert executor.stats()["dropped"] == 1 and executor.outstanding == 1
+    release.set()
+
+
+class SignallingCache(TTLCache):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.updated = threading.Event()
+
+    def set(self, key, value, ttl=None):
+        super().set(key, value, ttl)
+        self.updated.set()
+
+
+def test_stale_search_refreshes_through_the_executor(monkeypatch):
+    executor = BoundedExecutor("test", max_workers=1, max_queue=4)
+    cache = SignallingCache(ttl=60, stale_ttl=600)
+    key = ("lofi", 12, 1, True)
+    cache.set(key, ["stale"], ttl=-1)
+    cache.updated.clear()
+    monkeypatch.setattr(youtube, "extraction_executor", executor)
+    monkeypatch.setattr(youtube, "_search_cache", cache)
+    monkeypatch.setattr(youtube, "_run_search", lambda *key: ["fresh"])
+
+    assert youtube._search_lookup(key) == ["stale"]
+    assert cache.updated.wait(TIMEOUT)
+    assert cache.get(key) == ["fresh"]
+
+
+def test_stale_search_refresh_is_dropped_when_the_executor_is_busy(monkeypatch):
+    executor = BoundedExecutor("test", max_workers=1, max_queue=4)
+    release = threading.Event()
+    executor.submit_background(release.wait, TIMEOUT)
+    cache = TTLCache(ttl=60, stale_ttl=600)
+    monkeypatch.setattr(youtube, "extraction_executor", executor)
+    monkeypatch.setattr(youtube, "_search_cache", cache)
+    key = ("lofi", 12, 1, True)
+    cache.set(key, ["stale"], ttl=-1)
+    try:
+        assert youtube._search_lookup(key) == ["stale"]
+        assert executor.stats()["dropped"] == 1
+    finally:
+        release.set()
@@ -0,0 +1,173 @@
+import pytest
+
+from playyt.services import formats
+from playyt.services.formats import FormatConstraints, choose, format_table
+
+GV = "https://rr3---sn-abc.googlevideo.com/videoplayback?expire=1&itag={}"
+HLS = "https://manifest.googlevideo.com/api/manifest/hls_playlist/expire/1/id/x/itag/{}/playlist/index.m3u8"
+
+
+def _https(itag, ext, vcodec, acodec, **extra):
+    # As extracted with process=False: no protocol, no dynamic_range
+    return dict(format_id=str(itag), url=GV.format(itag), ext=ext, vcodec=vcodec, acodec=acodec, **extra)
+
+
+def _hls(itag, vcodec, height, tbr):
+    return dict(
+        format_id=str(itag), url=HLS.format(itag), ext="mp4", protocol="m3u8_native",
+        vcodec=vcodec, acodec="mp4a.40.2", height=height, fps=30, tbr=tbr,
+    )
+
+
+INFO = {
+    "id": "abcdefghijk",
+    "duration": 600,
+    "formats": [
+        {"format_id": "sb0", "url": "https://i.ytimg.com/sb/x/storyboard.jpg", "ext": "mhtml",
+         "vcodec": "none", "acodec": "none", "protocol": "mhtml"},
+        _https(139, "m4a", "none", "mp4a.40.5", abr=48.8, tbr=48.8, filesize=3_700_000),
+        _https(140, "m4a", "none", "mp4a.40.2", abr=129.5, tbr=129.5, filesize=9_700_000),
+        _https(251, "webm", "none", "opus", abr=135.0, tbr=135.0, filesize=10_100_000),
+        _https(18, "mp4", "avc1.42001E", "mp4a.40.2", height=360, width=640, fps=30, tbr=500.0,
+               filesize=37_500_000),
+        _hls(93, "avc1.4D401E", 360, 720.0),
+        _https(136, "mp4", "avc1.4d401f", "none", height=720, fps=30, tbr=2000.0),
+        _hls(95, "avc1.4D401F", 720, 2600.0),
+        _https(137, "mp4", "avc1.640028", "none", height=1080, fps=30, tbr=4000.0, filesize=300_000_000),
+        _https(248, "webm", "vp9", "none", height=1080, fps=30, tbr=2500.0),
+        _https(337, "webm", "vp09.02.51.10.01.09.16.09.00", "none", height=2160, fps=60, tbr=20000.0),
+        _https(313, "webm", "vp9", "none", height=2160, fps=30, tbr=15000.0),
+        _https(401, "mp4", "av01.0.12M.10.0.110.09.16.09.0", "none", height=2160, fps=30, tbr=14000.0),
+        _https(400, "mp4", "av01.0.12M.08", "none", height=2160, fps=30, tbr=12000.0),
+        dict(_https(302, "webm", "vp9", "none", height=720, fps=60, tbr=2700.0), has_drm=True),
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def defaults(monkeypatch):
+    monkeypatch.setattr(formats, "DEFAULT_AUTO", "height=1080")
+    monkeypatch.setattr(formats.throughput, "_value", None)
+
+
+def by_id(table):
+    return {row["format_id"]: row for row in table}
+
+
+def test_protocol_and_dynamic_range_are_derived_for_unprocessed_formats():
+    rows = by_id(format_table(INFO))
+    assert rows["18"]["protocol"] == "https"
+    assert rows["137"]["dynamic_range"] == "SDR"
+    assert rows["337"]["dynamic_range"] == "HDR"
+    assert rows["401"]["dynamic_range"] == "HDR"
+    assert rows["400"]["dynamic_range"] == "SDR"
+    assert rows["140"]["dynamic_range"] is None
+
+
+def test_https_wins_over_equivalent_hls():
+    ids = set(by_id(format_table(INFO)))
+    assert "18" in ids and "93" not in ids
+    # 136 is video-only and 95 muxed, so both stay
+    assert {"136", "95"} <= ids
+
+
+def test_hdr_and_sdr_variants_are_kept_apart():
+    ids = set(by_id(format_table(INFO)))
+    assert {"313", "337", "400", "401"} <= ids
+
+
+def test_storyboards_and_drm_formats_are_dropped():
+    ids = set(by_id(format_table(INFO)))
+    assert "sb0" not in ids and "302" not in ids
+
+
+def test_missing_sizes_are_estimated_from_bitrate():
+    rows = by_id(format_table(INFO))
+    assert rows["137"]["filesize"] == 300_000_000 and not rows["137"]["filesize_estimated"]
+    assert rows["136"]["filesize"] == 2000 * 1000 // 8 * 600
+    assert rows["136"]["filesize_estimated"]
+
+
+def test_table_is_ranked_best_first_with_audio_last():
+    table = format_table(INFO)
+    heights = [row["height"] or 0 for row in table if row["kind"] != "audio"]
+    assert heights == sorted(heights, reverse=True)
+    assert all(row["kind"] == "audio" for row in table[len(heights):])
+
+
+def test_auto_takes_best_pair_within_default_height():
+    choice = choose(format_table(INFO), FormatConstraints.parse("auto"), merge=True)
+    assert choice["format_id"] == "137+140"
+    assert choice["fits"] and choice["filesize"] == 300_000_000 + 9_700_000
+
+
+def test_pairs_only_use_audio_in_a_matching_container():
+    choice = choose(format_table(INFO), FormatConstraints.parse("auto:codec=vp9/h264"), merge=True)
+    assert choice["format_id"] == "248+251"
+
+
+def test_size_limit_steps_down():
+    choice = choose(format_table(INFO), FormatConstraints.parse("auto:size=200M"), merge=True)
+    assert choice["format_id"] == "248+251"
+    assert choice["filesize"] <= 200 * 1024 * 1024
+
+
+def test_target_time_uses_bandwidth():
+    choice = choose(format_table(INFO), FormatConstraints.parse("auto:time=60,bw=2M"), merge=True)
+    assert choice["format_id"] == "18"
+    assert choice["estimated_seconds"] == pytest.approx(37_500_000 / (2 * 1024 * 1024), abs=0.1)
+
+
+def test_without_ffmpeg_only_single_files_are_candidates():
+    choice = choose(format_table(INFO), FormatConstraints.parse("auto"), merge=False)
+    assert choice["format_id"] == "95"
+    assert choice["audio"] is None and not choice["can_merge"]
+
+
+def test_known_size_beats_unknown_size_without_a_budget():
+    known = _https(22, "mp4", "avc1.64001F", "mp4a.40.2", height=720, fps=30, filesize=80_000_000)
+    unknown = _https(23, "mp4", "avc1.64001F", "mp4a.40.2", height=720, fps=30)
+    rows = [formats.format_row(fmt, None) for fmt in (unknown, known)]
+    assert rows[0]["filesize"] is None
+    choice = choose(rows, FormatConstraints.parse("auto"), merge=True)
+    assert choice["format_id"] == "22"
+
+
+def test_nothing_fits_returns_smallest_flagged():
+    choice = choose(format_table(INFO), FormatConstraints.parse("auto:size=1M"), merge=True)
+    assert choice["format_id"] == "18" and not choice["fits"]
+
+
+def test_no_formats():
+    assert choose([], FormatConstraints.parse("auto"), merge=True) is None
+
+
+@pytest.mark.parametrize("spec, height, size, codecs", [
+    ("auto", 1080, None, formats.DEFAULT_CODEC_ORDER),
+    ("auto:height=720p", 720, None, formats.DEFAULT_CODEC_ORDER),
+    ("auto:height=", None, None, formats.DEFAULT_CODEC_ORDER),
+    ("auto:size=500M", 1080, 500 * 1024 ** 2, formats.DEFAULT_CODEC_ORDER),
+    ("auto:codec=VP9/h264", 1080, None, ("vp9", "h264")),
+])
+def test_parse(spec, height, size, codecs):
+    constraints = FormatConstraints.parse(spec)
+    assert (constraints.max_height, constraints.max_bytes, constraints.codecs) == (height, size, codecs)
+
+
+@pytest.mark.parametrize("spec", ["best", "automatic", "auto:foo=1", "auto:height"])
+def test_parse_rejects(spec):
+    with pytest.raises(ValueError):
+        FormatConstraints.parse(spec)
+
+
+@pytest.mark.parametrize("spec, canonical", [
+    ("auto", "auto"),
+    ("auto:height=1080", "auto"),
+    ("auto:height=", "auto:height="),
+    ("auto:size=1K,time=30,bw=1K", "auto:size=1024,time=30,bw=1024"),
+    ("auto:codec=av1/vp9,height=480", "auto:height=480,codec=av1/vp9"),
+])
+def test_to_spec_round_trips(spec, canonical):
+    constraints = FormatConstraints.parse(spec)
+    assert constraints.to_spec() == canonical
+    assert FormatConstraints.parse(canonical).to_dict() == constraints.to_dict()
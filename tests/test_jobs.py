@@ -0,0 +1,213 @@
+import threading
+
+import pytest
+
+from playyt.services import jobs
+from playyt.services.events import EventBus
+from playyt.services.jobs import CANCELLED, FAILED, FINISHED, QUEUED, RUNNING, DownloadJobManager
+from playyt.services.quota import QuotaManager
+from playyt.services.ratelimit import HostLimiter
+from playyt.services.shared import SharedStore
+
+TIMEOUT = 5
+
+
+class StubDownloader:
+    """Reports some progress, then holds each download until released"""
+
+    def __init__(self, total=1000, result=None):
+        self.total = total
+        self.result = result or {"success": True, "title": "Title", "filename": None}
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, video_id, format_id, progress_hook=None):
+        self.calls.append((video_id, format_id))
+        try:
+            progress_hook({"status": "downloading", "downloaded_bytes": 100, "total_bytes": self.total})
+            self.started.set()
+            self.release.wait(TIMEOUT)
+            progress_hook({"status": "finished", "total_bytes": self.total})
+        except Exception as e:
+            # download_video turns hook errors (cancel, quota) into a failed result
+            return {"success": False, "error": str(e)}
+        if isinstance(self.result, Exception):
+            raise self.result
+        return dict(self.result)
+
+
+@pytest.fixture
+def downloads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "downloads").mkdir()
+    return tmp_path / "downloads"
+
+
+def make_manager(downloader, existing=None, store=None, max_workers=2, quota=None):
+    return DownloadJobManager(
+        max_workers=max_workers,
+        download_func=downloader,
+        existing_func=existing or (lambda video_id, format_id: None),
+        host_limiter=HostLimiter(max_per_host=max_workers),
+        quota=quota or QuotaManager(),
+        events=EventBus(),
+        store=store,
+    )
+
+
+def wait_done(job):
+    job.future.result(TIMEOUT)
+    return job
+
+
+def test_same_video_and_format_share_a_job(downloads):
+    downloader = StubDownloader()
+    manager = make_manager(downloader)
+    first = manager.submit("abc", "best")
+    assert downloader.started.wait(TIMEOUT)
+    assert manager.submit("abc", "best") is first
+    other_format = manager.submit("abc", "18")
+    assert other_format is not first
+    downloader.release.set()
+    wait_done(first)
+    wait_done(other_format)
+    assert first.state == FINISHED and first.title == "Title"
+    assert sorted(downloader.calls) == [("abc", "18"), ("abc", "best")]
+    # Finished jobs are not shared; a new submit downloads again
+    again = manager.submit("abc", "best")
+    assert again is not first
+    wait_done(again)
+
+
+def test_batch_dedupes_within_and_across_batches(downloads):
+    downloader = StubDownloader()
+    manager = make_manager(downloader)
+    batch = manager.submit_batch(["a", "b", "a", ""])
+    assert [j.video_id for j in batch.jobs] == ["a", "b"]
+    second = manager.submit_batch(["b", "c"])
+    assert second.jobs[0] is batch.jobs[1]
+    downloader.release.set()
+    for job in batch.jobs + second.jobs:
+        wait_done(job)
+    assert batch.to_dict()["done"]
+
+
+def test_file_already_on_disk_finishes_without_a_worker(downloads):
+    downloader = StubDownloader()
+    manager = make_manager(downloader, existing=lambda video_id, format_id: "video.mp4")
+    job = manager.submit("abc", "best")
+    assert job.state == FINISHED and job.already_downloaded and job.filename == "video.mp4"
+    assert job.future is None and downloader.calls == []
+
+
+def test_cancel_then_retry_starts_a_fresh_job(downloads):
+    downloader = StubDownloader()
+    manager = make_manager(downloader)
+    job = manager.submit("abc", "best")
+    assert downloader.started.wait(TIMEOUT)
+    manager.cancel(job.id)
+    retry = manager.submit("abc", "best")
+    assert retry is not job
+    downloader.release.set()
+    wait_done(job)
+    wait_done(retry)
+    assert job.state == CANCELLED
+    assert retry.state == FINISHED
+
+
+def test_cancelling_a_queued_job_never_runs_it(downloads):
+    downloader = StubDownloader()
+    manager = make_manager(downloader, max_workers=1)
+    running = manager.submit("a", "best")
+    assert downloader.started.wait(TIMEOUT)
+    queued = manager.submit("b", "best")
+    assert queued.state == QUEUED
+    manager.cancel(queued.id)
+    assert queued.state == CANCELLED
+    downloader.release.set()
+    wait_done(running)
+    assert downloader.calls == [("a", "best")]
+
+
+def test_cancel_then_retry_across_workers(downloads, tmp_path):
+    store = SharedStore(tmp_path / "state.sqlite3")
+    downloader = StubDownloader()
+    owner = make_manager(downloader, store=store)
+    other_downloader = StubDownloader()
+    other_downloader.release.set()
+    other = make_manager(other_downloader, store=store)
+
+    job = owner.submit("abc", "best")
+    assert downloader.started.wait(TIMEOUT)
+    # Another worker reuses the running download instead of starting its own
+    shared = other.submit("abc", "best")
+    assert shared.remote and shared.id == job.id
+
+    other.cancel(shared.id)
+    retry = other.submit("abc", "best")
+    assert not retry.remote and retry.id != job.id
+    # The owner sees the cancel on its next progress update
+    downloader.release.set()
+    wait_done(job)
+    wait_done(retry)
+    assert job.state == CANCELLED
+    assert retry.state == FINISHED
+    assert other.get(job.id).state == CANCELLED
+
+
+def test_quota_reservation_is_released_after_success(downloads):
+    downloader = StubDownloader()
+    quota = QuotaManager(max_bytes=10 ** 6)
+    manager = make_manager(downloader, quota=quota)
+    job = manager.submit("abc", "best")
+    assert downloader.started.wait(TIMEOUT)
+    assert quota.usage()["in_flight_bytes"] == 1000
+    downloader.release.set()
+    wait_done(job)
+    assert quota.stats()["in_flight"] == 0
+
+
+def test_quota_reservation_is_released_after_failure(downloads):
+    downloader = StubDownloader(result=RuntimeError("boom"))
+    quota = QuotaManager(max_bytes=10 ** 6)
+    manager = make_manager(downloader, quota=quota)
+    downloader.release.set()
+    job = wait_done(manager.submit("abc", "best"))
+    assert job.state == FAILED and job.error == "boom"
+    assert quota.stats()["in_flight"] == 0
+    # The failed job no longer blocks a retry
+    assert manager.submit("abc", "best") is not job
+
+
+def test_download_over_quota_fails(downloads):
+    downloader = StubDownloader(total=2000)
+    manager = make_manager(downloader, quota=QuotaManager(max_bytes=1000))
+    job = wait_done(manager.submit("abc", "best"))
+    assert job.state == FAILED and "disk space" in job.error
+    assert manager.quota.stats()["in_flight"] == 0
+
+
+def test_postprocessing_error_fails_the_job(downloads, monkeypatch):
+    def broken(filename):
+        raise OSError("database is locked")
+
+    monkeypatch.setattr(jobs, "prepare_for_streaming", broken)
+    downloader = StubDownloader(result={"success": True, "title": "Title", "filename": "video.mp4"})
+    manager = make_manager(downloader)
+    downloader.release.set()
+    job = wait_done(manager.submit("abc", "best"))
+    assert job.state == FAILED and job.error == "database is locked"
+    assert job.stage is None and job.finished is not None
+    assert manager.submit("abc", "best") is not job
+
+
+def test_stats_count_jobs_by_state(downloads):
+    downloader = StubDownloader()
+    manager = make_manager(downloader)
+    job = manager.submit("abc", "best")
+    assert downloader.started.wait(TIMEOUT)
+    assert manager.stats()["counts"] == {RUNNING: 1}
+    downloader.release.set()
+    wait_done(job)
+    assert manager.stats()["counts"] == {FINISHED: 1}
@@ -0,0 +1,175 @@
+import pytest
+
+from playyt.services import library
+from playyt.services.library import LibraryIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LibraryIndex(tmp_path)
+    yield index
+    index.close()
+
+
+def write(directory, name, size=10):
+    path = directory / name
+    path.write_bytes(b"\0" * size)
+    return path
+
+
+def test_lookups_by_name_are_chunked(tmp_path, index, monkeypatch):
+    monkeypatch.setattr(library, "QUERY_CHUNK_SIZE", 3)
+    names = [f"{i:02}.mp4" for i in range(8)]
+    for name in names:
+        write(tmp_path, name)
+        index.add(name)
+        index.set_metadata(name, {"video_id": name})
+        index.record_access(name, play=True)
+    wanted = names + ["missing.mp4"]
+    assert sorted(row[0] for row in index.get(wanted)) == names
+    assert sorted(index.get_metadata(wanted)) == names
+    assert sorted(index.get_access(wanted)) == names
+    assert index.get([]) == [] and index.get_metadata([]) == {} and index.get_access([]) == {}
+
+
+def names(rows):
+    return [row[0] for row in rows]
+
+
+def test_rescan_diffs_against_the_directory(tmp_path, index):
+    changes = []
+    index.add_listener(lambda changed, removed: changes.append((sorted(changed), sorted(removed))))
+    write(tmp_path, "a.mp4", 10)
+    write(tmp_path, "b.webm", 20)
+    write(tmp_path, "notes.txt")
+    assert index.refresh(force=True)
+    assert sorted(names(index.page())) == ["a.mp4", "b.webm"]
+    assert index.totals()["total_files"] == 2 and index.totals()["total_size"] == 30
+    assert changes == [(["a.mp4", "b.webm"], [])]
+
+    # Nothing changed: no writes, no notifications
+    version = index.version()
+    assert index.refresh(force=True)
+    assert index.version() == version and len(changes) == 1
+
+    write(tmp_path, "a.mp4", 15)
+    (tmp_path / "b.webm").unlink()
+    write(tmp_path, "c.mkv", 5)
+    index.refresh(force=True)
+    assert sorted(names(index.page())) == ["a.mp4", "c.mkv"]
+    assert index.totals()["total_size"] == 20
+    assert changes[-1] == (["a.mp4", "c.mkv"], ["b.webm"])
+
+
+def test_refresh_skips_an_unchanged_directory(tmp_path, index):
+    write(tmp_path, "a.mp4")
+    assert index.refresh()
+    assert not index.refresh()
+
+
+def test_removing_a_file_drops_its_metadata_and_access(tmp_path, index):
+    write(tmp_path, "a.mp4")
+    index.add("a.mp4")
+    index.set_metadata("a.mp4", {"video_id": "abc"})
+    index.record_access("a.mp4", play=True)
+    assert index.find_by_video_id("abc") == ["a.mp4"]
+    index.remove("a.mp4")
+    assert index.get_metadata(["a.mp4"]) == {} and index.get_access(["a.mp4"]) == {}
+    assert index.totals()["total_files"] == 0
+
+
+@pytest.fixture
+def populated(tmp_path, index):
+    # Sizes repeat so the filename tie-breaker decides page boundaries
+    for i in range(7):
+        write(tmp_path, f"f{i}.mp4" if i % 2 else f"F{i}.webm", size=10 * (i // 2 + 1))
+    index.refresh(force=True)
+    return index
+
+
+def walk(index, sort, descending, limit, **filters):
+    """Every row, page by page, using the last row of a page as the cursor"""
+    pages = []
+    after = None
+    column = {"size": 1, "mtime": 2}.get(sort)
+    while True:
+        rows = index.query(sort=sort, descending=descending, limit=limit, after=after, **filters)
+        if not rows:
+            return pages
+        pages.append(names(rows))
+        last = rows[-1]
+        after = (last[column] if column else last[0].lower(), last[0])
+
+
+@pytest.mark.parametrize("sort", ["size", "mtime", "title"])
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("limit", [1, 2, 3, 7, 8])
+def test_keyset_pages_cover_every_row_once_in_order(populated, sort, descending, limit):
+    everything = names(populated.query(sort=sort, descending=descending, limit=100))
+    pages = walk(populated, sort, descending, limit)
+    assert [name for page in pages for name in page] == everything
+    assert len(everything) == 7
+    assert all(len(page) == limit for page in pages[:-1])
+
+
+def test_keyset_pages_with_filters(populated):
+    pages = walk(populated, "size", False, 2, extensions=["webm"], min_size=20)
+    assert [name for page in pages for name in page] == ["F2.webm", "F4.webm", "F6.webm"]
+
+
+def test_unknown_sort_key(populated):
+    with pytest.raises(ValueError):
+        populated.query(sort="plays")
+
+
+def test_version_bumps_on_file_and_metadata_writes_only(tmp_path, index):
+    versions = [index.version()]
+    write(tmp_path, "a.mp4")
+    index.add("a.mp4")
+    versions.append(index.version())
+    index.set_metadata("a.mp4", {"video_id": "abc"})
+    versions.append(index.version())
+    index.record_access("a.mp4", play=True)
+    index.set_pinned("a.mp4", True)
+    index.set_container("a.mp4", 10, 0.0, {})
+    versions.append(index.version())
+    index.remove("a.mp4")
+    versions.append(index.version())
+    assert len(set(versions)) == 4 and versions[2] == versions[3]
+    # Counters restart with a recreated database; the nonce keeps tokens distinct
+    nonce = versions[-1].split("-")[0]
+    index.close()
+    (tmp_path / library.INDEX_FILENAME).unlink()
+    recreated = LibraryIndex(tmp_path)
+    assert not recreated.version().startswith(nonce)
+    recreated.close()
+
+
+def changelog_rows(index):
+    return index._conn.execute("SELECT COUNT(*) FROM changelog").fetchone()[0]
+
+
+def test_changelog_is_trimmed_without_listeners(tmp_path, index, monkeypatch):
+    monkeypatch.setattr(library, "CHANGELOG_KEEP", 5)
+    write(tmp_path, "a.mp4")
+    for i in range(20):
+        index.add("a.mp4")
+        index.set_metadata("a.mp4", {"n": i})
+    assert changelog_rows(index) <= 5
+    for i in range(20):
+        write(tmp_path, f"{i}.mp4")
+    index.refresh(force=True)
+    assert changelog_rows(index) <= 5
+
+
+def test_other_processes_changes_reach_listeners(tmp_path, index):
+    other = LibraryIndex(tmp_path)
+    changes = []
+    index.add_listener(lambda changed, removed: changes.append((changed, removed)))
+    write(tmp_path, "a.mp4")
+    other.add("a.mp4")
+    other.remove("a.mp4")
+    other.close()
+    index.poll_changes()
+    # The last entry per file wins
+    assert changes == [([], ["a.mp4"])]
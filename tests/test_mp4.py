@@ -0,0 +1,185 @@
+import struct
+
+import pytest
+
+from playyt.services.mp4 import Mp4Error, container_index, faststart, keyframe_span, top_level_boxes
+
+# Four video samples in two chunks of two; samples 1 and 3 are keyframes
+SAMPLE_SIZES = (10, 20, 30, 40)
+SAMPLES = [bytes([i + 1]) * size for i, size in enumerate(SAMPLE_SIZES)]
+CHUNKS = [SAMPLES[0] + SAMPLES[1], SAMPLES[2] + SAMPLES[3]]
+TIMESCALE = 1000
+SAMPLE_DELTA = 500
+
+
+def box(kind, *payload):
+    body = b"".join(payload)
+    return struct.pack(">I4s", 8 + len(body), kind) + body
+
+
+def large_box(kind, *payload):
+    # 64-bit size form: size field 1, then the real size
+    body = b"".join(payload)
+    return struct.pack(">I4sQ", 1, kind, 16 + len(body)) + body
+
+
+def full_box(kind, *payload, version=0):
+    return box(kind, bytes([version, 0, 0, 0]), *payload)
+
+
+def moov(chunk_offsets, co64=False):
+    header = struct.pack(">IIII", 0, 0, TIMESCALE, SAMPLE_DELTA * len(SAMPLES)) + b"\0" * 80
+    table = full_box(
+        b"co64" if co64 else b"stco",
+        struct.pack(">I%d%s" % (len(chunk_offsets), "Q" if co64 else "I"), len(chunk_offsets), *chunk_offsets),
+    )
+    stbl = box(
+        b"stbl",
+        full_box(b"stts", struct.pack(">III", 1, len(SAMPLES), SAMPLE_DELTA)),
+        full_box(b"stsz", struct.pack(">II%dI" % len(SAMPLES), 0, len(SAMPLES), *SAMPLE_SIZES)),
+        full_box(b"stsc", struct.pack(">IIII", 1, 1, 2, 1)),
+        table,
+        full_box(b"stss", struct.pack(">III", 2, 1, 3)),
+    )
+    mdia = box(
+        b"mdia",
+        full_box(b"mdhd", struct.pack(">IIII", 0, 0, TIMESCALE, SAMPLE_DELTA * len(SAMPLES)), b"\0" * 4),
+        full_box(b"hdlr", b"\0" * 4, b"vide", b"\0" * 12, b"video\0"),
+        box(b"minf", stbl),
+    )
+    return box(b"moov", full_box(b"mvhd", header), box(b"trak", mdia))
+
+
+FTYP = box(b"ftyp", b"isom", b"\0\0\0\0", b"isomiso2mp41")
+
+
+def write_tail_moov(path, large_mdat=False, co64=False, offsets=None):
+    """ftyp, mdat, moov: the layout downloads arrive in"""
+    make_mdat = large_box if large_mdat else box
+    header = 16 if large_mdat else 8
+    first = len(FTYP) + header
+    if offsets is None:
+        offsets = [first, first + len(CHUNKS[0])]
+    path.write_bytes(FTYP + make_mdat(b"mdat", *CHUNKS) + moov(offsets, co64=co64))
+    return path
+
+
+def chunk_offsets(path):
+    return [offset for _, offset in container_index(path)["keyframes"]]
+
+
+def assert_chunks_readable(path):
+    data = path.read_bytes()
+    for offset, chunk in zip(chunk_offsets(path), CHUNKS):
+        assert data[offset:offset + len(chunk)] == chunk
+
+
+def test_index_of_tail_moov_file(tmp_path):
+    path = write_tail_moov(tmp_path / "a.mp4")
+    index = container_index(path)
+    assert not index["faststart"] and not index["fragmented"]
+    assert index["duration"] == 2.0
+    assert [t for t, _ in index["keyframes"]] == [0.0, 1.0]
+    assert index["mdat_offset"] == len(FTYP)
+    assert_chunks_readable(path)
+
+
+def test_faststart_moves_moov_and_shifts_offsets(tmp_path):
+    path = write_tail_moov(tmp_path / "a.mp4")
+    size = path.stat().st_size
+    assert faststart(path)
+    assert [b.type for b in top_level_boxes(path)] == [b"ftyp", b"moov", b"mdat"]
+    assert path.stat().st_size == size
+    assert container_index(path)["faststart"]
+    assert_chunks_readable(path)
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_faststart_leaves_faststart_files_untouched(tmp_path):
+    path = write_tail_moov(tmp_path / "a.mp4")
+    faststart(path)
+    before = path.read_bytes()
+    mtime = path.stat().st_mtime_ns
+    assert not faststart(path)
+    assert path.read_bytes() == before
+    assert path.stat().st_mtime_ns == mtime
+
+
+def test_faststart_leaves_fragmented_files_untouched(tmp_path):
+    path = tmp_path / "a.mp4"
+    path.write_bytes(FTYP + box(b"mdat", *CHUNKS) + moov([0, 0]) + box(b"moof", b"\0" * 8))
+    before = path.read_bytes()
+    assert not faststart(path)
+    assert path.read_bytes() == before
+
+
+def test_large_mdat_header(tmp_path):
+    path = write_tail_moov(tmp_path / "a.mp4", large_mdat=True)
+    mdat = top_level_boxes(path)[1]
+    assert (mdat.type, mdat.header, mdat.size) == (b"mdat", 16, 16 + sum(SAMPLE_SIZES))
+    assert_chunks_readable(path)
+    assert faststart(path)
+    assert [b.type for b in top_level_boxes(path)] == [b"ftyp", b"moov", b"mdat"]
+    assert top_level_boxes(path)[2].header == 16
+    assert_chunks_readable(path)
+
+
+def test_co64_stays_co64(tmp_path):
+    path = write_tail_moov(tmp_path / "a.mp4", co64=True)
+    assert faststart(path)
+    assert b"co64" in path.read_bytes() and b"stco" not in path.read_bytes()
+    assert_chunks_readable(path)
+
+
+def test_stco_is_promoted_when_shifted_offsets_overflow(tmp_path):
+    # Offsets only need to be near the 32-bit limit, the table is not checked
+    # against the file; this one lies past the old moov, like a trailing mdat
+    high = 0xFFFFFFFF - 16
+    path = write_tail_moov(tmp_path / "a.mp4", offsets=[len(FTYP) + 8, high])
+    moov_size = top_level_boxes(path)[2].size
+    assert faststart(path)
+    data = path.read_bytes()
+    assert b"co64" in data and b"stco" not in data
+    # Each 4-byte entry became 8 bytes
+    new_moov = top_level_boxes(path)[1]
+    assert new_moov.size == moov_size + 4 * 2
+    assert chunk_offsets(path) == [len(FTYP) + new_moov.size + 8, high + new_moov.size - moov_size]
+
+
+def test_mdat_after_moov_only_moves_by_the_size_change(tmp_path):
+    # ftyp, mdat (chunk 1), moov, mdat (chunk 2)
+    first = len(FTYP) + 8
+    mdat1 = box(b"mdat", CHUNKS[0])
+    moov_size = len(moov([0, 0]))
+    second = len(FTYP) + len(mdat1) + moov_size + 8
+    path = tmp_path / "a.mp4"
+    path.write_bytes(FTYP + mdat1 + moov([first, second]) + box(b"mdat", CHUNKS[1]))
+    assert_chunks_readable(path)
+    assert faststart(path)
+    assert [b.type for b in top_level_boxes(path)] == [b"ftyp", b"moov", b"mdat", b"mdat"]
+    assert chunk_offsets(path) == [first + moov_size, second]
+    assert_chunks_readable(path)
+
+
+def test_truncated_box_is_rejected(tmp_path):
+    path = write_tail_moov(tmp_path / "a.mp4")
+    data = path.read_bytes()
+    path.write_bytes(data[:-10])
+    with pytest.raises(Mp4Error):
+        faststart(path)
+    assert path.read_bytes() == data[:-10]
+
+
+@pytest.mark.parametrize("offset, expected", [
+    (0, (0, 100)),
+    (100, (100, 100)),
+    (150, (150, 50)),
+    (250, (250, 50)),
+    (300, None),
+])
+def test_keyframe_span(offset, expected):
+    assert keyframe_span([100, 200], offset, 300) == expected
+
+
+def test_keyframe_span_without_keyframes():
+    assert keyframe_span([], 0, 300) is None
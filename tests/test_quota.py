@@ -0,0 +1,148 @@
+import os
+import time
+
+import pytest
+
+from playyt.services import quota
+from playyt.services.library import get_library_index
+from playyt.services.quota import QuotaExceeded, QuotaManager
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def downloads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    directory = tmp_path / "downloads"
+    directory.mkdir()
+    return directory
+
+
+def add_files(directory, *files):
+    """(name, size, age in days) per file; older files are less recently used"""
+    now = time.time()
+    for name, size, age in files:
+        path = directory / name
+        path.write_bytes(b"\0" * size)
+        os.utime(path, (now - age * DAY, now - age * DAY))
+    index = get_library_index(directory)
+    index.refresh(force=True)
+    return index
+
+
+def remaining(directory):
+    return sorted(p.name for p in directory.iterdir() if not p.name.startswith("."))
+
+
+def test_reserve_and_release_track_in_flight_bytes(downloads):
+    manager = QuotaManager(max_bytes=1000)
+    manager.reserve("job1", 300)
+    manager.reserve("job2", 200, written=50)
+    usage = manager.usage()
+    assert usage["in_flight_bytes"] == 500
+    assert usage["pending_bytes"] == 450
+    # Progress only updates the written count
+    manager.reserve("job1", 300, written=100)
+    assert manager.usage()["pending_bytes"] == 350
+    manager.release("job1")
+    manager.release("job1")
+    assert manager.usage()["in_flight_bytes"] == 200
+    assert manager.stats()["in_flight"] == 1
+
+
+def test_reservations_count_against_the_quota(downloads):
+    manager = QuotaManager(max_bytes=1000)
+    manager.reserve("job1", 600)
+    with pytest.raises(QuotaExceeded):
+        manager.reserve("job2", 600)
+    assert manager.refusals == 1
+    manager.release("job1")
+    manager.reserve("job2", 600)
+
+
+def test_grown_estimate_only_asks_for_the_difference(downloads):
+    manager = QuotaManager(max_bytes=1000)
+    manager.reserve("job1", 600)
+    manager.reserve("job1", 900, written=100)
+    assert manager.usage()["in_flight_bytes"] == 900
+    # Only unwritten bytes count: 1200 - 200 fits exactly, 1300 - 200 does not
+    manager.reserve("job1", 1200, written=200)
+    with pytest.raises(QuotaExceeded):
+        manager.reserve("job1", 1300, written=200)
+
+
+def test_eviction_deletes_least_recently_used_first_and_keeps_pinned(downloads):
+    index = add_files(downloads, ("old.mp4", 300, 30), ("older.mp4", 300, 40), ("oldest.mp4", 300, 50))
+    assert index.set_pinned("oldest.mp4", True)
+    manager = QuotaManager(max_bytes=1000)
+    plan = manager.plan(200)
+    assert [item["filename"] for item in plan["evict"]] == ["older.mp4"]
+    assert remaining(downloads) == ["old.mp4", "older.mp4", "oldest.mp4"]
+
+    manager.reserve("job1", 200)
+    assert remaining(downloads) == ["old.mp4", "oldest.mp4"]
+    assert manager.evictions == 1
+    assert index.totals()["total_size"] == 600
+
+
+def test_plays_change_the_order(downloads):
+    add_files(downloads, ("a.mp4", 300, 30), ("b.mp4", 300, 40), ("c.mp4", 300, 50))
+    manager = QuotaManager(max_bytes=1000, min_idle=0)
+    manager.record_access("c.mp4", play=True)
+    # Played just now, so c is the most recently used
+    assert [i["filename"] for i in manager.plan(500)["evict"]] == ["b.mp4", "a.mp4"]
+    # Least often played first: a and b were never played
+    assert [i["filename"] for i in manager.plan(500, policy="lfu")["evict"]] == ["b.mp4", "a.mp4"]
+
+
+def test_recently_played_files_are_not_evicted(downloads):
+    add_files(downloads, ("a.mp4", 300, 30), ("b.mp4", 300, 40), ("c.mp4", 300, 50))
+    manager = QuotaManager(max_bytes=1000, min_idle=3600)
+    manager.record_access("c.mp4", play=True)
+    assert [i["filename"] for i in manager.plan(500)["evict"]] == ["b.mp4", "a.mp4"]
+
+
+def test_nothing_is_deleted_when_eviction_cannot_make_room(downloads):
+    index = add_files(downloads, ("a.mp4", 400, 30), ("b.mp4", 400, 40))
+    index.set_pinned("a.mp4", True)
+    manager = QuotaManager(max_bytes=1000)
+    with pytest.raises(QuotaExceeded):
+        manager.reserve("job1", 700)
+    assert remaining(downloads) == ["a.mp4", "b.mp4"]
+    assert manager.evictions == 0 and manager.stats()["in_flight"] == 0
+
+
+def test_no_quota_never_evicts(downloads):
+    add_files(downloads, ("a.mp4", 400, 30))
+    manager = QuotaManager(max_bytes=0, min_free=0)
+    manager.reserve("job1", 10 ** 12)
+    assert remaining(downloads) == ["a.mp4"]
+
+
+def test_a_play_is_counted_once_per_session(downloads):
+    index = add_files(downloads, ("a.mp4", 10, 1))
+    manager = QuotaManager()
+    manager.record_access("a.mp4", play=True)
+    manager.record_access("a.mp4", play=True)
+    manager.record_access("a.mp4")
+    assert index.get_access(["a.mp4"])["a.mp4"]["plays"] == 1
+
+
+def test_access_tracking_is_bounded(downloads, monkeypatch):
+    monkeypatch.setattr(quota, "ACCESS_TRACKED_FILES", 8)
+    manager = QuotaManager()
+    for i in range(50):
+        manager.record_access(f"{i}.mp4", play=True)
+    assert len(manager._last_play) <= 8
+    assert len(manager._last_write) <= 8
+
+
+def test_evicted_files_are_forgotten_by_access_tracking(downloads):
+    index = add_files(downloads, ("a.mp4", 600, 30), ("b.mp4", 300, 1))
+    index.set_pinned("b.mp4", True)
+    manager = QuotaManager(max_bytes=1000, min_idle=0)
+    manager.record_access("a.mp4", play=True)
+    assert "a.mp4" in manager._last_write and "a.mp4" in manager._last_play
+    manager.reserve("job1", 500)
+    assert remaining(downloads) == ["b.mp4"]
+    assert "a.mp4" not in manager._last_write and "a.mp4" not in manager._last_play
@@ -0,0 +1,33 @@
+import pytest
+
+from playyt.webapp.streaming import RangeNotSatisfiable, parse_range_header
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", [(0, 99)]),
+    ("bytes=100-", [(100, 999)]),
+    ("bytes=-100", [(900, 999)]),
+    ("bytes=-5000", [(0, 999)]),
+    ("bytes=900-5000", [(900, 999)]),
+    ("bytes=0-9, 5-20, 21-30", [(0, 30)]),
+    ("bytes=500-599, 0-9", [(0, 9), (500, 599)]),
+])
+def test_satisfiable_ranges(header, expected):
+    assert parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["items=0-1", "bytes=", "bytes=abc", "bytes=5-1", "bytes=-", "bytes=0-1-2"])
+def test_malformed_headers_are_ignored(header):
+    assert parse_range_header(header, 1000) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=2000-3000", "bytes=-0"])
+def test_ranges_past_the_end_are_not_satisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(header, 1000)
+
+
+@pytest.mark.parametrize("header", ["bytes=-1", "bytes=-500", "bytes=0-", "bytes=0-0"])
+def test_empty_file_is_never_satisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(header, 0)
@@ -0,0 +1,166 @@
+import io
+import os
+
+import pytest
+
+from playyt.services.thumbnails import ThumbnailCache, ThumbnailNotFound, bucket_for
+
+VIDEO_ID = "abcdefghijk"
+
+
+class StubFetcher:
+    """Serves fixed-size fake JPEGs for the listed variants, 404 for the rest"""
+
+    def __init__(self, variants=("default", "mqdefault", "hqdefault", "sddefault", "maxresdefault"), size=100):
+        self.variants = set(variants)
+        self.size = size
+        self.urls = []
+
+    def __call__(self, url):
+        self.urls.append(url)
+        variant = url.rsplit("/", 1)[1].split(".")[0]
+        if variant not in self.variants:
+            return None
+        return variant.encode().ljust(self.size, b"\0"), "image/jpeg"
+
+
+@pytest.mark.parametrize("width, expected", [
+    (None, (480, "hqdefault")),
+    (0, (480, "hqdefault")),
+    (16, (120, "default")),
+    (120, (120, "default")),
+    (121, (320, "mqdefault")),
+    (640, (640, "sddefault")),
+    (1280, (1280, "maxresdefault")),
+    (4000, (1280, "maxresdefault")),
+])
+def test_bucket_for(width, expected):
+    assert bucket_for(width) == expected
+
+
+def test_miss_fetches_the_bucket_variant_then_hits_disk(tmp_path):
+    fetcher = StubFetcher()
+    cache = ThumbnailCache(tmp_path, max_bytes=10_000, fetcher=fetcher)
+    body = cache.get(VIDEO_ID, 300)
+    assert body.startswith(b"mqdefault")
+    assert fetcher.urls == [f"https://i.ytimg.com/vi/{VIDEO_ID}/mqdefault.jpg"]
+    assert cache.get(VIDEO_ID, 300) == body
+    assert len(fetcher.urls) == 1
+    assert (tmp_path / f"{VIDEO_ID}-320.jpg").read_bytes() == body
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_missing_variant_falls_back_to_hqdefault(tmp_path):
+    fetcher = StubFetcher(variants=("hqdefault",))
+    cache = ThumbnailCache(tmp_path, max_bytes=10_000, fetcher=fetcher)
+    assert cache.get(VIDEO_ID, 1280).startswith(b"hqdefault")
+    assert [u.rsplit("/", 1)[1] for u in fetcher.urls] == ["maxresdefault.jpg", "hqdefault.jpg"]
+
+
+def test_evicts_least_recently_used_beyond_byte_budget(tmp_path):
+    cache = ThumbnailCache(tmp_path, max_bytes=250, fetcher=StubFetcher(size=100))
+    cache.get("aaaaaaaaaaa", 120)
+    cache.get("bbbbbbbbbbb", 120)
+    cache.get("aaaaaaaaaaa", 120)  # now the most recently used
+    cache.get("ccccccccccc", 120)
+    names = sorted(p.name for p in tmp_path.glob("*.jpg"))
+    assert names == ["aaaaaaaaaaa-120.jpg", "ccccccccccc-120.jpg"]
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["bytes"] == 200
+
+
+def test_recency_survives_a_restart(tmp_path):
+    first = ThumbnailCache(tmp_path, max_bytes=10_000, fetcher=StubFetcher(size=100))
+    first.get("aaaaaaaaaaa", 120)
+    first.get("bbbbbbbbbbb", 120)
+    os.utime(tmp_path / "aaaaaaaaaaa-120.jpg", (2_000_000_000, 2_000_000_000))
+    fetcher = StubFetcher(size=100)
+    second = ThumbnailCache(tmp_path, max_bytes=150, fetcher=fetcher)
+    # Loading trims to the budget, oldest mtime first
+    second.get("aaaaaaaaaaa", 120)
+    assert fetcher.urls == []
+    assert sorted(p.name for p in tmp_path.glob("*.jpg")) == ["aaaaaaaaaaa-120.jpg"]
+
+
+def test_not_found_is_cached(tmp_path):
+    fetcher = StubFetcher(variants=())
+    cache = ThumbnailCache(tmp_path, max_bytes=10_000, fetcher=fetcher)
+    with pytest.raises(ThumbnailNotFound):
+        cache.get(VIDEO_ID, 480)
+    calls = len(fetcher.urls)
+    with pytest.raises(ThumbnailNotFound):
+        cache.get(VIDEO_ID, 120)
+    assert len(fetcher.urls) == calls
+
+
+def test_non_image_responses_are_not_stored(tmp_path):
+    cache = ThumbnailCache(tmp_path, max_bytes=10_000, fetcher=lambda url: (b"<html>", "text/html"))
+    with pytest.raises(ThumbnailNotFound):
+        cache.get(VIDEO_ID, 480)
+    assert not list(tmp_path.glob("*.jpg"))
+
+
+def test_upstream_errors_are_not_cached_as_missing(tmp_path):
+    attempts = []
+
+    def flaky(url):
+        attempts.append(url)
+        if len(attempts) == 1:
+            raise OSError("timed out")
+        return b"x" * 10, "image/jpeg"
+
+    cache = ThumbnailCache(tmp_path, max_bytes=10_000, fetcher=flaky)
+    with pytest.raises(ThumbnailNotFound):
+        cache.get(VIDEO_ID, 480)
+    assert cache.get(VIDEO_ID, 480) == b"x" * 10
+    assert cache.stats()["upstream_errors"] == 1
+
+
+def test_invalid_ids_never_reach_upstream(tmp_path):
+    fetcher = StubFetcher()
+    cache = ThumbnailCache(tmp_path, max_bytes=10_000, fetcher=fetcher)
+    with pytest.raises(ThumbnailNotFound):
+        cache.get("../etc/passwd", 480)
+    assert fetcher.urls == []
+
+
+def jpeg(width, height):
+    Image = pytest.importorskip("PIL.Image")
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(out, "JPEG")
+    return out.getvalue()
+
+
+def image_size(body):
+    Image = pytest.importorskip("PIL.Image")
+    with Image.open(io.BytesIO(body)) as img:
+        return img.size
+
+
+class ImageFetcher:
+    """Real JPEGs of the given sizes by variant"""
+
+    def __init__(self, sizes):
+        self.bodies = {variant: jpeg(*size) for variant, size in sizes.items()}
+
+    def __call__(self, url):
+        body = self.bodies.get(url.rsplit("/", 1)[1].split(".")[0])
+        return None if body is None else (body, "image/jpeg")
+
+
+def test_fallback_variant_is_resized_down_to_the_bucket(tmp_path):
+    cache = ThumbnailCache(tmp_path, max_bytes=100_000, fetcher=ImageFetcher({"hqdefault": (480, 360)}))
+    assert image_size(cache.get(VIDEO_ID, 100)) == (120, 90)
+    assert image_size((tmp_path / f"{VIDEO_ID}-120.jpg").read_bytes()) == (120, 90)
+    assert cache.stats()["resizing"]
+
+
+def test_oversized_variant_is_resized_keeping_the_aspect_ratio(tmp_path):
+    cache = ThumbnailCache(tmp_path, max_bytes=100_000, fetcher=ImageFetcher({"mqdefault": (640, 360)}))
+    assert image_size(cache.get(VIDEO_ID, 300)) == (320, 180)
+
+
+def test_variants_no_wider_than_the_bucket_are_served_as_is(tmp_path):
+    fetcher = ImageFetcher({"hqdefault": (480, 360)})
+    cache = ThumbnailCache(tmp_path, max_bytes=100_000, fetcher=fetcher)
+    assert cache.get(VIDEO_ID, 1280) == fetcher.bodies["hqdefault"]